@@ -7,6 +7,8 @@ Nuance technique :
 - Gestion des flux binaires via `io.BytesIO` (l'image n'est jamais sauvegardée sur le disque,
   elle reste en RAM avant d'être injectée dans le XML du PPTX).
 - Robustesse : Si l'image ne charge pas (timeout/404), le script ne plante pas.
+- Cache disque (`image_cache`) : une image déjà téléchargée n'est pas
+  re-téléchargée aux runs suivants (revalidation ETag/Last-Modified).
 """
 
 import requests
@@ -14,13 +16,15 @@ from io import BytesIO
 from pptx import Presentation
 from pptx.util import Inches, Pt
 
+from image_cache import get_web_cache
+
 
 def telecharger_image(url_image):
     try:
         # Timeout court pour éviter de bloquer le script
-        r = requests.get(url_image, timeout=5)
-        if r.status_code == 200:
-            return BytesIO(r.content)
+        contenu = get_web_cache().fetch(requests, url_image, timeout=5)
+        if contenu is not None:
+            return BytesIO(contenu)
     except Exception as e:
         print(f"Erreur téléchargement : {e}")
     return None
@@ -80,6 +84,11 @@ def main():
 
     for s in slides:
         ajouter_slide_web(pres, s["titre"], s["points"], s["url"])
+    # Index du cache écrit une fois, après toutes les images
+    try:
+        get_web_cache().flush()
+    except Exception as e:
+        print(f"Cache web : index non enregistré ({e})")
 
     pres.save("2_Presentation_Web.pptx")
     print("Génération terminée : 2_Presentation_Web.pptx")
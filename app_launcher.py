@@ -1,40 +1,162 @@
+import json
+import threading
+from io import BytesIO
+
 import streamlit as st
 import backend_engines as engine
+import profiling
+from job_queue import JobQueue
+from slide_parser import parse_slides
+from slide_preview import DeckPreview
 
 # Configuration de la page
 st.set_page_config(page_title="HEC Slide Generator", layout="wide")
 
 
-# --- FONCTION DE PARSING (TEXTE -> DONNÉES) ---
-def parse_input_text(raw_text):
-    """Transforme le texte copié-collé en structure de données"""
-    slides = []
-    current_slide = {}
+# Préchauffage du modèle IA en tâche de fond (une seule fois par processus),
+# uniquement si le mode IA est activé (PPTX_AI_ENABLED=1)
+@st.cache_resource
+def prechauffer_ia():
+    return engine.warm_up_ai_pipeline()
+
+
+if engine.AI_ENABLED:
+    prechauffer_ia()
+
+
+# --- FILE DE TRAVAUX ---
+@st.cache_resource
+def get_job_queue():
+    """File partagée par toutes les sessions du processus (un seul travail IA à la fois)."""
+    return JobQueue()
+
+
+def copier_uploads(fichiers):
+    """Copie indépendante des uploads : le travail les lit après la fin du script."""
+    copies = []
+    for f in fichiers or []:
+        copie = BytesIO(f.getvalue())
+        copie.name = f.name
+        copies.append(copie)
+    return copies
+
 
-    # On découpe par blocs de slides (séparateur double saut de ligne ou mot clé)
-    lines = raw_text.split('\n')
+# Un seul lecteur à la fois par fichier résultat (position de lecture partagée)
+_verrou_lecture = threading.Lock()
 
-    for line in lines:
-        line = line.strip()
-        if not line: continue
 
-        if line.upper().startswith("TITRE:"):
-            if current_slide: slides.append(current_slide)  # Save previous
-            current_slide = {"titre": line.replace("TITRE:", "").strip(), "points": [], "visuel": ""}
+def contenu_resultat(job):
+    """Lecture différée du .pptx d'un travail (BytesIO ou fichier spooled) pour st.download_button.
 
-        elif line.upper().startswith("POINTS:"):
-            pass  # Juste un marqueur
+    Le fichier n'est lu qu'au clic sur le bouton (données "callable") : les
+    reruns, dont le rafraîchissement du panneau chaque seconde, ne copient
+    pas le deck, et il ne reste en mémoire qu'une fois, dans la file.
+    """
+    resultat = job.result
 
-        elif line.startswith("-") or line.startswith("•"):
-            if "points" in current_slide:
-                current_slide["points"].append(line.lstrip("-• ").strip())
+    def lire():
+        with _verrou_lecture:
+            resultat.seek(0)
+            return resultat.read()
+    return lire
 
-        elif line.upper().startswith("VISUEL:"):
-            # Peut être une URL ou un Prompt selon le mode
-            current_slide["visuel"] = line.replace("VISUEL:", "").strip()
 
-    if current_slide: slides.append(current_slide)  # Save last
-    return slides
+def travaux_session():
+    """Travaux de la session, plus celui de l'URL (reconnexion depuis un autre onglet)."""
+    ids = list(st.session_state.get("hec_jobs", []))
+    if st.query_params.get("job") and st.query_params["job"] not in ids:
+        ids.append(st.query_params["job"])
+    return ids, get_job_queue().jobs(ids)
+
+
+def panneau_travaux():
+    ids, travaux = travaux_session()
+    if not travaux:
+        if ids:
+            st.info("Ce travail n'est plus disponible (résultat expiré) : relancez la génération.")
+        return
+    # Rafraîchissement automatique seulement tant qu'un travail est en cours
+    if any(not job.done for job in travaux):
+        _panneau_travaux_actif()
+    else:
+        _afficher_travaux(travaux)
+
+
+@st.fragment(run_every=1.0)
+def _panneau_travaux_actif():
+    _afficher_travaux(travaux_session()[1])
+
+
+def _afficher_travaux(travaux):
+    for job in travaux:
+        st.markdown(f"**Travail `{job.id}`** – {job.label} – {job.message}")
+        if job.status in ("queued", "running"):
+            st.progress(job.progress)
+            if st.button("Annuler", key=f"annuler_{job.id}"):
+                job.cancel()
+            if job.result is not None:
+                # Mode progressif : le deck est déjà utilisable, les images arrivent ensuite
+                st.download_button(
+                    label=f"📥 Télécharger la version provisoire n°{job.version}",
+                    data=contenu_resultat(job),
+                    file_name="Presentation_HEC_Gen_provisoire.pptx",
+                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                    key=f"provisoire_{job.id}_{job.version}",
+                )
+        elif job.status == "error":
+            st.error(f"Échec de la génération : {job.error}")
+        elif job.status == "done" and job.result is not None:
+            if not st.session_state.get(f"hec_fete_{job.id}"):
+                st.session_state[f"hec_fete_{job.id}"] = True
+                st.balloons()
+            # BOUTON TELECHARGEMENT FINAL
+            st.download_button(
+                label=f"📥 Télécharger le Powerpoint (.pptx) – {job.elapsed():.1f}s",
+                data=contenu_resultat(job),
+                file_name="Presentation_HEC_Gen.pptx",
+                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                key=f"telecharger_{job.id}",
+            )
+        if job.trace is not None and job.done:
+            panneau_profilage(job)
+
+
+def panneau_profilage(job):
+    """Durées par étape et compteurs d'un travail profilé, plus la trace Chrome."""
+    with st.expander(f"⏱️ Profilage du travail `{job.id}`"):
+        st.table([
+            {"étape": nom, "appels": s["count"], "total (s)": round(s["total_s"], 3),
+             "max (s)": round(s["max_s"], 3)}
+            for nom, s in job.trace.summary().items()
+        ])
+        if job.trace.counters:
+            st.json(dict(job.trace.counters))
+        st.download_button(
+            label="Télécharger la trace (Chrome trace JSON)",
+            data=json.dumps(job.trace.to_chrome()),
+            file_name=f"trace_{job.id}.json",
+            mime="application/json",
+            key=f"trace_{job.id}",
+        )
+
+
+# --- APERÇU ---
+APERCU_PAR_PAGE = 9
+
+
+@st.fragment
+def apercu_slides(slides, images):
+    """Vignettes des slides, page par page : changer de page ne relance que ce bloc
+    et seules les vignettes de la page affichée sont dessinées (cache par contenu)."""
+    deck = DeckPreview(slides, images)
+    pages = -(-len(deck) // APERCU_PAR_PAGE)
+    page = st.number_input(f"Page (sur {pages})", min_value=1, max_value=pages, value=1,
+                           key="hec_apercu_page") if pages > 1 else 1
+    debut = (page - 1) * APERCU_PAR_PAGE
+    colonnes = st.columns(3)
+    for k, i in enumerate(range(debut, min(debut + APERCU_PAR_PAGE, len(deck)))):
+        with colonnes[k % 3]:
+            st.image(deck.thumbnail(i), caption=f"Slide {i + 1} – {deck.slides[i]['titre'][:40]}")
 
 
 # --- INTERFACE UTILISATEUR ---
@@ -74,7 +196,7 @@ with col_config:
     with st.expander("Images en mode Texte Seul (fichiers locaux)"):
         st.markdown("""
         - Uploadez une ou plusieurs images dans la zone **"Photos pour les slides"**.
-        - Le positionnement se fait **par numéro au début du nom du fichier** (1 à 99) :
+        - Le positionnement se fait **par numéro au début du nom du fichier** (1, 2, … sans limite) :
           - `1 campus.jpg` ou `01 campus.jpg` → image pour le **slide 1**
           - `2 amphi.png` → image pour le **slide 2**
           - `10 salle.png` → image pour le **slide 10**
@@ -96,6 +218,19 @@ with col_config:
         Plus la description est précise (type d'image, sujet, style, ambiance), plus le résultat sera pertinent.
         """)
 
+    # Mode IA progressif, seulement si le modèle est activé sur ce serveur
+    ia_progressive = engine.AI_ENABLED and st.checkbox(
+        "Images IA (Stable Diffusion), deck livré tout de suite",
+        help="Le deck texte (avec vos photos) est téléchargeable immédiatement ; les images IA "
+             "décrites par VISUEL remplacent ensuite les emplacements provisoires, une version à la fois.",
+    )
+
+    profiler = st.checkbox(
+        "Mesurer le temps de chaque étape (profilage)",
+        help="Affiche les durées par étape et permet de télécharger une trace Chrome "
+             "(chrome://tracing ou ui.perfetto.dev).",
+    )
+
 with col_content:
     st.header("2. Contenu")
 
@@ -146,26 +281,70 @@ with col_content:
         ),
     )
 
+    uploaded_outline = st.file_uploader(
+        "... ou importez un fichier texte au même format (.txt, .md)",
+        type=["txt", "md"],
+        help="Pratique pour les gros exports : le fichier est lu ligne à ligne.",
+    )
+
+    # Comptage en direct : le parsing est mémoïsé par hash du texte, les reruns
+    # déclenchés par les autres widgets ne coûtent rien
+    if raw_input:
+        apercu, diagnostics = parse_slides(raw_input)
+        st.caption(f"{len(apercu)} slides détectées.")
+        if diagnostics:
+            with st.expander(f"⚠️ {len(diagnostics)} ligne(s) ignorée(s) ou à vérifier"):
+                st.text("\n".join(str(d) for d in diagnostics[:200]))
+        # Aperçu sans générer le .pptx : mêmes tailles de police et découpages que la génération
+        if apercu and st.toggle("👁️ Aperçu des slides", key="hec_apercu"):
+            apercu_slides(apercu, uploaded_images)
+
     if st.button("Lancer la génération", type="primary"):
-        if not raw_input:
+        if not raw_input and uploaded_outline is None:
             st.error("Veuillez coller du texte.")
         else:
-            data = parse_input_text(raw_input)
+            if uploaded_outline is not None:
+                uploaded_outline.seek(0)
+                data, diagnostics = parse_slides(uploaded_outline)
+                if diagnostics:
+                    st.warning(f"{len(diagnostics)} ligne(s) ignorée(s) dans le fichier, "
+                               f"ex. {diagnostics[0]}")
+            else:
+                data, _ = parse_slides(raw_input)
             st.success(f"{len(data)} slides détectées.")
 
-            resultat_pptx = None
-            # Mode unique : Texte Seul
-            resultat_pptx = engine.generate_text_only(data, image_files=uploaded_images)
-
-            # BOUTON TELECHARGEMENT FINAL
-            if resultat_pptx:
-                st.balloons()
-                st.download_button(
-                    label="📥 Télécharger le Powerpoint (.pptx)",
-                    data=resultat_pptx,
-                    file_name="Presentation_HEC_Gen.pptx",
-                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                )
+            # La génération part dans la file de travaux : la session reste
+            # libre et l'identifiant (dans l'URL) permet de revenir au résultat
+            images = copier_uploads(uploaded_images)
+
+            def generer(job):
+                # Sortie "spooled" : au-delà de quelques dizaines de Mo, le .pptx passe
+                # sur le disque au lieu d'occuper la RAM en plus de la copie Streamlit
+                return engine.generate_text_only(data, image_files=images, output="spooled",
+                                                 progress_callback=job.report_progress)
+
+            if ia_progressive:
+                def generer(job):
+                    def publier(version, faites, total):
+                        job.publish(version, f"Version provisoire : {faites}/{total} images IA")
+                    return engine.generate_local_ai_progressive(
+                        data, version_callback=publier, progress_callback=job.report_progress,
+                        per_slide_images=True, image_files=images, output="spooled",
+                    )
+
+            def generer_profile(job):
+                with profiling.tracing() as trace:
+                    job.trace = trace
+                    return generer(job)
+
+            job_id = get_job_queue().submit(
+                "ai_progressive" if ia_progressive else "text", generer_profile if profiler else generer,
+                label=f"{len(data)} slides" + (" + images IA" if ia_progressive else ""),
+            )
+            st.session_state.setdefault("hec_jobs", []).append(job_id)
+            st.query_params["job"] = job_id
+
+    panneau_travaux()
 
     # Mention auteur / date
     st.markdown("---")
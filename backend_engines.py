@@ -1,12 +1,38 @@
+import gc
+import hashlib
+import mmap
+import os
 import re
-import requests
-import torch
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from copy import deepcopy
 from io import BytesIO
 from pptx import Presentation
 from pptx.util import Inches, Pt
-from diffusers import StableDiffusionPipeline
+
+import profiling
+
+# Les dépendances lourdes (requests, torch, diffusers) sont importées à la
+# première utilisation de chaque moteur : le mode Texte Seul démarre sans elles
+# et peut être déployé sans torch installé.
 
 # --- UTILITAIRES ---
+# Emplacement de l'image dans add_slide_layout (pouces) : colonne de droite,
+# largeur fixe, hauteur libre (proportions conservées)
+IMAGE_LEFT_IN = 5.8
+IMAGE_TOP_IN = 1.8
+IMAGE_WIDTH_IN = 3.8
+
+# Tailles de police par défaut (pt) ; text_fit les réduit quand le texte déborde
+TAILLE_TITRE = 32
+TAILLE_POINTS = 16
+
 def init_presentation(titre_doc, sous_titre):
     """Crée la base de la présentation"""
     pres = Presentation()
@@ -15,22 +41,19 @@ def init_presentation(titre_doc, sous_titre):
     slide0.placeholders[1].text = sous_titre
     return pres
 
-def add_slide_layout(pres, titre, points, image_stream=None):
-    """Ajoute une slide standardisée (Titre + Liste + Image optionnelle)"""
-    layout_vide = pres.slide_layouts[6]
-    slide = pres.slides.add_slide(layout_vide)
-
+def _add_text_shapes(slide, titre, points, avec_image, taille=TAILLE_POINTS, taille_titre=TAILLE_TITRE):
+    """Zones de texte d'une slide standardisée (Titre + Liste)."""
     # Titre
     box_titre = slide.shapes.add_textbox(Inches(0.5), Inches(0.4), Inches(9), Inches(1))
     tf = box_titre.text_frame
     tf.text = titre
     p = tf.paragraphs[0]
-    p.font.size = Pt(32)
+    p.font.size = Pt(taille_titre)
     p.font.bold = True
     p.font.name = 'Arial'
 
     # Texte : largeur différente selon la présence d'une image
-    if image_stream:
+    if avec_image:
         # Mode texte + image : colonne gauche plus étroite
         box_txt = slide.shapes.add_textbox(Inches(0.5), Inches(1.5), Inches(5), Inches(5))
     else:
@@ -41,109 +64,1086 @@ def add_slide_layout(pres, titre, points, image_stream=None):
     for point in points:
         p = tf_txt.add_paragraph()
         p.text = f"• {point}"
-        p.font.size = Pt(16)
-        p.space_after = Pt(14)
+        p.font.size = Pt(taille)
+        # Espacement proportionnel : 14 pt à la taille par défaut
+        p.space_after = Pt(round(taille * 14 / TAILLE_POINTS, 1))
         p.font.name = 'Arial'
 
+def add_slide_layout(pres, titre, points, image_stream=None, taille=None, taille_titre=None):
+    """Ajoute une slide standardisée (Titre + Liste + Image optionnelle)
+
+    `taille`, `taille_titre` : tailles de police des puces et du titre (pt),
+    par défaut TAILLE_POINTS et TAILLE_TITRE (voir text_fit.fit_slides).
+    """
+    layout_vide = pres.slide_layouts[6]
+    slide = pres.slides.add_slide(layout_vide)
+
+    _add_text_shapes(slide, titre, points, avec_image=bool(image_stream),
+                     taille=taille or TAILLE_POINTS, taille_titre=taille_titre or TAILLE_TITRE)
+
     # Image (Droite)
     if image_stream:
-        slide.shapes.add_picture(image_stream, Inches(5.8), Inches(1.8), width=Inches(3.8))
+        slide.shapes.add_picture(image_stream, Inches(IMAGE_LEFT_IN), Inches(IMAGE_TOP_IN), width=Inches(IMAGE_WIDTH_IN))
+    return slide
+
+def _texte_simple(texte):
+    # Texte que le modèle cloné reproduit à l'identique : non vide, sans
+    # retour à la ligne ni caractère de contrôle (traités à part par python-pptx)
+    return bool(texte) and not any(c < " " for c in texte)
+
+class SlideStamper:
+    """Chemin rapide pour l'assemblage en masse : même rendu qu'add_slide_layout.
+
+    Le XML des deux zones de texte est construit une seule fois par variante
+    (avec / sans image, tailles de police) via add_slide_layout sur une présentation brouillon,
+    puis chaque slide est produite en clonant ce modèle et en remplaçant les
+    textes, au lieu de passer par l'API objet de python-pptx paragraphe par
+    paragraphe. La slide elle-même est créée sans la recherche de relation
+    existante de python-pptx (linéaire en nombre de slides). Les textes
+    atypiques (vides, multi-lignes) repassent par add_slide_layout.
+    """
+
+    def __init__(self, pres):
+        self.pres = pres
+        self.layout = pres.slide_layouts[6]
+        self._modeles = {}
+        self._placeholders = bool(list(self.layout.iter_cloneable_placeholders()))
+        self._next_id = None
+        self._images = None
+
+    def _modele(self, avec_image, taille=TAILLE_POINTS, taille_titre=TAILLE_TITRE):
+        variante = (avec_image, taille, taille_titre)
+        if variante not in self._modeles:
+            brouillon = Presentation()
+            slide = brouillon.slides.add_slide(brouillon.slide_layouts[6])
+            _add_text_shapes(slide, "T", ["P"], avec_image, taille, taille_titre)
+            sp_titre, sp_corps = [deepcopy(sp) for sp in slide.shapes._spTree.iter_shape_elms()]
+            # Le corps garde son paragraphe vide initial ; le paragraphe de puce sert de modèle
+            p_point = sp_corps.txBody.p_lst[-1]
+            sp_corps.txBody.remove(p_point)
+            self._modeles[variante] = (sp_titre, sp_corps, p_point)
+        return self._modeles[variante]
+
+    def _register_slide(self, slide_part):
+        """Ajoute `slide_part` à la liste des slides de la présentation."""
+        from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+        pres_part = self.pres.part
+        sld_id_lst = pres_part._element.get_or_add_sldIdLst()
+        if self._next_id is None:
+            self._next_id = sld_id_lst._next_id
+        # Part toute neuve : inutile de chercher une relation existante vers elle
+        rId = pres_part.rels._add_relationship(RT.SLIDE, slide_part)
+        sld_id_lst._add_sldId(id=self._next_id, rId=rId)
+        self._next_id += 1
+
+    def _new_slide(self):
+        """Équivalent de pres.slides.add_slide(layout), en temps constant."""
+        from pptx.parts.slide import SlidePart
+
+        pres_part = self.pres.part
+        slide_part = SlidePart.new(pres_part._next_slide_partname, pres_part.package, self.layout.part)
+        slide = slide_part.slide
+        if self._placeholders:
+            slide.shapes.clone_layout_placeholders(self.layout)
+        self._register_slide(slide_part)
+        return slide
+
+    def add_built_slide(self, slide_xml, image_bytes=None):
+        """Ajoute une slide déjà construite ailleurs (ex. processus de travail).
+
+        `slide_xml` est le XML sérialisé d'une slide produite par add_slide
+        sur une présentation du même modèle, `image_bytes` son image éventuelle.
+        Les relations sont recréées dans le même ordre (rId1 = layout,
+        rId2 = image) et l'image est dédupliquée avec celles du deck.
+        """
+        from pptx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+        from pptx.parts.image import Image as PptxImage
+        from pptx.parts.slide import SlidePart
+
+        pres_part = self.pres.part
+        slide_part = SlidePart.load(pres_part._next_slide_partname, CT.PML_SLIDE, pres_part.package, slide_xml)
+        slide_part.relate_to(self.layout.part, RT.SLIDE_LAYOUT)
+        if image_bytes is not None:
+            slide_part.relate_to(self._image_part(PptxImage.from_blob(image_bytes)), RT.IMAGE)
+        self._register_slide(slide_part)
+
+    def _image_part(self, image):
+        """Équivalent de package.get_or_add_image_part, sans reparcourir le package.
+
+        Les images déjà présentes sont indexées une fois par SHA-1 (même
+        déduplication que python-pptx), puis l'index est tenu à jour.
+        """
+        from pptx.opc.packuri import PackURI
+        from pptx.parts.image import ImagePart
+
+        package = self.pres.part.package
+        if self._images is None:
+            self._images = {}
+            self._image_idxs = set()
+            for part in package.iter_parts():
+                if isinstance(part, ImagePart):
+                    self._images.setdefault(part.sha1, part)
+                if part.partname.startswith("/ppt/media/image") and part.partname.idx is not None:
+                    self._image_idxs.add(part.partname.idx)
+            self._next_image_idx = 1
+
+        part = self._images.get(image.sha1)
+        if part is None:
+            # Premier numéro libre, comme package.next_image_partname
+            while self._next_image_idx in self._image_idxs:
+                self._next_image_idx += 1
+            partname = PackURI(f"/ppt/media/image{self._next_image_idx}.{image.ext}")
+            part = ImagePart(partname, image.content_type, package, image.blob, image.filename)
+            self._image_idxs.add(self._next_image_idx)
+            self._images[image.sha1] = part
+        return part
+
+    def add_slide(self, titre, points, image_stream=None, taille=None, taille_titre=None):
+        if not _texte_simple(titre) or not all(_texte_simple(p) for p in points):
+            slide = add_slide_layout(self.pres, titre, points, image_stream, taille, taille_titre)
+            # La slide ajoutée par python-pptx invalide nos compteurs : ils seront recalculés
+            self._next_id = None
+            self._images = None
+            return slide
+
+        slide = self._new_slide()
+        sp_titre, sp_corps, p_point = self._modele(bool(image_stream), taille or TAILLE_POINTS,
+                                                   taille_titre or TAILLE_TITRE)
+
+        titre_el = deepcopy(sp_titre)
+        titre_el.txBody.p_lst[0].r_lst[0].t.text = titre
+        corps = deepcopy(sp_corps)
+        for point in points:
+            p = deepcopy(p_point)
+            p.r_lst[0].t.text = f"• {point}"
+            corps.txBody.append(p)
+
+        sp_tree = slide.shapes._spTree
+        sp_tree.append(titre_el)
+        sp_tree.append(corps)
+
+        # Image (Droite) : équivalent de slide.shapes.add_picture
+        if image_stream:
+            from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+            from pptx.parts.image import Image as PptxImage
+
+            image_part = self._image_part(PptxImage.from_file(image_stream))
+            rId = slide.part.relate_to(image_part, RT.IMAGE)
+            slide.shapes._add_pic_from_image_part(image_part, rId, Inches(IMAGE_LEFT_IN), Inches(IMAGE_TOP_IN),
+                                                  Inches(IMAGE_WIDTH_IN), None)
+        return slide
+
+    def replace_picture(self, picture, image_bytes):
+        """Remplace l'image d'une photo déjà placée (ex. emplacement provisoire).
+
+        Même position et même largeur ; la hauteur suit les proportions de la
+        nouvelle image. L'ancienne image n'est plus sauvegardée si plus aucune
+        slide ne l'utilise.
+        """
+        from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+        from pptx.parts.image import Image as PptxImage
+
+        image = PptxImage.from_blob(image_bytes)
+        slide_part = picture.part
+        blip = picture._element.blipFill.blip
+        ancien = blip.rEmbed
+        blip.rEmbed = slide_part.relate_to(self._image_part(image), RT.IMAGE)
+        self._drop_unused_rel(slide_part, ancien)
+        largeur, hauteur = image.size
+        picture.height = round(picture.width * hauteur / largeur)
+
+    def remove_picture(self, picture):
+        """Retire une photo de sa slide (et sa relation si elle n'est plus utilisée)."""
+        slide_part = picture.part
+        rId = picture._element.blipFill.blip.rEmbed
+        picture._element.getparent().remove(picture._element)
+        self._drop_unused_rel(slide_part, rId)
+
+    @staticmethod
+    def _drop_unused_rel(slide_part, rId):
+        # XmlPart.drop_rel ne compte que les r:id, pas les r:embed des images
+        if rId and not slide_part._element.xpath(f'//@r:embed[.="{rId}"] | //@r:id[.="{rId}"]'):
+            slide_part.rels.pop(rId)
+
+def _tailles(s):
+    """Tailles de police choisies par text_fit pour la slide `s` (absentes : défaut)."""
+    return {"taille": s.get('taille'), "taille_titre": s.get('taille_titre')}
+
+def fit_deck(data_slides, avec_image, autofit=True):
+    """Ajuste les tailles de police et découpe les slides qui débordent (text_fit).
+
+    Retourne (slides, origines) : `origines[i]` est le numéro (1..n) de la
+    slide d'entrée dont provient la slide i, ou None pour une slide "(suite)"
+    (qui ne reçoit pas d'image). Sans numpy, ou avec `autofit=False`, les
+    slides sont retournées telles quelles.
+    """
+    identite = list(range(1, len(data_slides) + 1))
+    if not autofit or not data_slides:
+        return data_slides, identite
+    try:
+        from text_fit import fit_slides
+    except ImportError:
+        print("Ajustement du texte indisponible (pip install numpy) : tailles par défaut")
+        return data_slides, identite
+    with profiling.span("text.fit", slides=len(data_slides)):
+        slides, origines = fit_slides(data_slides, avec_image)
+    profiling.count("text.fit.split_slides", len(slides) - len(data_slides))
+    return slides, [None if s.get('suite') else o for s, o in zip(slides, origines)]
+
+# --- SORTIE (MÉMOIRE, FICHIER TEMPORAIRE OU CHEMIN) ---
+# Au-delà de cette taille, la sortie "spooled" bascule de la RAM vers le disque
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+# Médias déjà compressés : les recompresser en deflate coûte du temps pour rien
+_MEDIAS_COMPRESSES = ("image/jpeg", "image/png", "image/gif")
+
+def _peak_rss_mb():
+    """Pic de mémoire résidente du processus (Mo), None si indisponible."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : Ko ; macOS : octets
+    return pic / (1024 * 1024) if os.uname().sysname == "Darwin" else pic / 1024
+
+def open_output(output=None):
+    """Ouvre la destination du .pptx.
+
+    - None / "memory" : BytesIO (comportement historique) ;
+    - "spooled" : fichier temporaire gardé en RAM jusqu'à SPOOL_MAX_BYTES,
+      puis transféré sur le disque ;
+    - chemin (str / PathLike) : fichier ouvert en écriture ;
+    - objet fichier déjà ouvert : utilisé tel quel.
+    Retourne (flux, doit_fermer).
+    """
+    if output is None or output == "memory":
+        return BytesIO(), False
+    if output == "spooled":
+        return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, suffix=".pptx"), False
+    if isinstance(output, (str, os.PathLike)):
+        return open(output, "wb"), True
+    return output, False
+
+def save_presentation(pres, output=None, compresslevel=6, store_media=True):
+    """Écrit la présentation dans `output` (voir open_output) et retourne (résultat, rapport).
+
+    Équivalent de pres.save, avec le niveau deflate `compresslevel` (0-9) et,
+    si `store_media`, les images JPEG/PNG/GIF stockées sans recompression.
+    Le résultat est le chemin pour une sortie fichier, sinon le flux rembobiné.
+    Le rapport donne la taille écrite, la durée et le pic de mémoire du processus.
+    """
+    from pptx.opc.oxml import serialize_part_xml
+    from pptx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+    from pptx.opc.serialized import _ContentTypesItem
+
+    t0 = time.perf_counter()
+    flux, doit_fermer = open_output(output)
+    package = pres.part.package
+    parts = tuple(package.iter_parts())
+    try:
+        with profiling.span("save", parts=len(parts), compresslevel=compresslevel), zipfile.ZipFile(flux, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel,
+                             strict_timestamps=False) as z:
+            z.writestr(CONTENT_TYPES_URI.membername, serialize_part_xml(_ContentTypesItem.xml_for(parts)))
+            z.writestr(PACKAGE_URI.rels_uri.membername, package._rels.xml)
+            for part in parts:
+                if store_media and part.content_type in _MEDIAS_COMPRESSES:
+                    z.writestr(part.partname.membername, part.blob, compress_type=zipfile.ZIP_STORED)
+                else:
+                    z.writestr(part.partname.membername, part.blob)
+                if part._rels:
+                    z.writestr(part.partname.rels_uri.membername, part.rels.xml)
+        taille = flux.tell()
+    finally:
+        if doit_fermer:
+            flux.close()
+
+    rapport = {"octets": taille, "secondes": time.perf_counter() - t0, "pic_rss_mo": _peak_rss_mb()}
+    profiling.count("output.bytes", taille)
+    if doit_fermer:
+        return os.fspath(output), rapport
+    flux.seek(0)
+    return flux, rapport
+
+def _finish(pres, output=None, compresslevel=6, store_media=True, save_callback=None):
+    """Sauvegarde commune aux moteurs ; le rapport va à `save_callback`."""
+    resultat, rapport = save_presentation(pres, output, compresslevel, store_media)
+    if save_callback:
+        save_callback(rapport)
+    return resultat
+
+# --- NORMALISATION DES IMAGES ---
+def normalize_image(data, dpi=150, quality=85):
+    """Réduit une image à la résolution utile pour son emplacement dans la slide.
+
+    L'image est décodée une seule fois, redressée selon son orientation EXIF,
+    réduite à IMAGE_WIDTH_IN pouces à `dpi` points par pouce (jamais agrandie),
+    puis ré-encodée sans métadonnées : JPEG (`quality`), ou PNG si elle a de
+    la transparence. Les octets d'origine sont conservés si l'image est
+    illisible, ou si elle n'a pas besoin d'être réduite et que le
+    ré-encodage ne la rend pas plus légère.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(BytesIO(data)) as im:
+            im = ImageOps.exif_transpose(im)
+            largeur_max = int(IMAGE_WIDTH_IN * dpi)
+            reduite = im.width > largeur_max
+            if reduite:
+                hauteur = max(1, round(im.height * largeur_max / im.width))
+                im = im.resize((largeur_max, hauteur), Image.LANCZOS)
+
+            transparente = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+            buf = BytesIO()
+            if transparente:
+                im.save(buf, format="PNG", optimize=True)
+            else:
+                im.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True)
+    except Exception as e:
+        print(f"Image non normalisée (conservée telle quelle) : {e}")
+        return data
+
+    out = buf.getvalue()
+    if not reduite and len(out) >= len(data):
+        return data
+    return out
+
+class ImageSourceIndex:
+    """Index numero_de_slide -> source d'image, lue seulement quand la slide est construite.
+
+    Les sources sont des fichiers uploadés (objets avec `.name`, `.seek`, `.read`)
+    ou des chemins sur le disque. Le numéro de slide est lu au tout début du nom
+    de fichier ("1 campus.jpg", "01 campus.jpg", "120 annexe.png" ...) ; pour un
+    même numéro, la première source gagne.
+    """
+
+    def __init__(self, sources=None):
+        self._sources = {}
+        for source in sources or []:
+            self.add(source)
+
+    def add(self, source):
+        try:
+            if isinstance(source, (str, os.PathLike)):
+                name = os.path.basename(os.fspath(source))
+            else:
+                name = getattr(source, "name", "") or ""
+            m = re.match(r"^(\d+)", name.strip())
+            if not m:
+                return
+            numero = int(m.group(1))
+            if numero >= 1 and numero not in self._sources:
+                self._sources[numero] = source
+        except Exception as e:
+            print(f"Erreur préparation image '{getattr(source, 'name', source)}' : {e}")
+
+    def __contains__(self, numero):
+        return numero in self._sources
+
+    def __len__(self):
+        return len(self._sources)
+
+    def numbers(self):
+        return sorted(self._sources)
+
+    def open(self, numero):
+        """Flux lisible de l'image du slide `numero` (None si absente).
+
+        Un fichier sur le disque est projeté en mémoire (mmap) : rien n'est
+        copié tant que le flux n'est pas lu.
+        """
+        source = self._sources.get(numero)
+        if source is None:
+            return None
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return BytesIO(b"")
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        source.seek(0)
+        return source
+
+    def portable(self, numero):
+        """Source transmissible à un autre processus : chemin, ou octets pour un upload."""
+        source = self._sources.get(numero)
+        if isinstance(source, (str, os.PathLike)):
+            return os.fspath(source)
+        return self.read(numero)
+
+    def remap(self, numeros):
+        """Nouvel index où la slide i+1 reprend l'image de la slide `numeros[i]`."""
+        sous = ImageSourceIndex()
+        sous._sources = {i: self._sources[n] for i, n in enumerate(numeros, 1) if n in self._sources}
+        return sous
+
+    def digest(self, numero):
+        """SHA-256 (hex) des octets de l'image du slide `numero`, sans la décoder."""
+        try:
+            flux = self.open(numero)
+            if flux is None:
+                return None
+            try:
+                if isinstance(flux, mmap.mmap):
+                    return hashlib.sha256(flux).hexdigest()
+                h = hashlib.sha256()
+                for bloc in iter(lambda: flux.read(1024 * 1024), b""):
+                    h.update(bloc)
+                return h.hexdigest()
+            finally:
+                if isinstance(flux, mmap.mmap):
+                    flux.close()
+        except Exception as e:
+            print(f"Erreur lecture image pour le slide {numero}: {e}")
+            return None
+
+    def read(self, numero):
+        """Octets de l'image du slide `numero` (None si absente ou illisible)."""
+        try:
+            flux = self.open(numero)
+            if flux is None:
+                return None
+            try:
+                return flux.read()
+            finally:
+                if isinstance(flux, mmap.mmap):
+                    flux.close()
+        except Exception as e:
+            print(f"Erreur lecture image pour le slide {numero}: {e}")
+            return None
+
+# En dessous de ce nombre d'images, la normalisation se fait dans le thread
+# appelant : démarrer des processus coûte plus que ce qu'ils font gagner
+NORMALIZE_POOL_MIN_IMAGES = 8
+
+_normalize_pools = {}   # max_workers -> ProcessPoolExecutor partagé par le processus
+_normalize_pools_lock = threading.Lock()
+
+def _normalize_pool(max_workers=None):
+    """Pool de processus de normalisation, créé au premier usage puis réutilisé.
+
+    None dans un processus de travail (batch_cli -j, service HTTP) : les decks
+    y sont déjà rendus en parallèle, un pool imbriqué surchargerait les cœurs.
+    """
+    import multiprocessing
+
+    if multiprocessing.parent_process() is not None:
+        return None
+    with _normalize_pools_lock:
+        pool = _normalize_pools.get(max_workers)
+        if pool is None:
+            pool = _normalize_pools[max_workers] = ProcessPoolExecutor(max_workers=max_workers)
+        return pool
+
+def _drop_normalize_pool(pool):
+    """Oublie un pool cassé (processus tué) : le prochain appel en recrée un."""
+    with _normalize_pools_lock:
+        for cle, existant in list(_normalize_pools.items()):
+            if existant is pool:
+                del _normalize_pools[cle]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_slide_images(index, total, normalize=True, dpi=150, max_workers=None, report=None):
+    """Génère (slide_num, octets ou None) pour les slides 1..total, dans l'ordre.
+
+    Chaque image n'est lue qu'à l'approche de sa slide : au plus une fenêtre
+    de quelques images est en mémoire, quel que soit le nombre d'uploads.
+    Avec `normalize`, les images sont réduites (normalize_image) : en ligne
+    pour moins de NORMALIZE_POOL_MIN_IMAGES images, sinon en avance de phase
+    sur le pool de processus partagé (_normalize_pool) ; les images
+    identiques (même SHA-256) ne sont traitées qu'une fois. `report` (dict)
+    reçoit le nombre d'images, les octets avant / après et la durée.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    numeros = [n for n in index.numbers() if n <= total]
+    if report is not None:
+        report.update({"images": 0, "uniques": 0, "octets_avant": 0, "octets_apres": 0, "secondes": 0.0})
+    t0 = time.perf_counter()
+
+    pool = None
+    if normalize and len(numeros) >= NORMALIZE_POOL_MIN_IMAGES:
+        pool = _normalize_pool(max_workers)
+    etat = {"pool": pool}
+    fenetre = 2 * (max_workers or os.cpu_count() or 1) if pool else 1
+    traitees = {}   # sha256 -> octets (ou Future) normalisés, pour la déduplication
+    sources = {}    # sha256 -> octets d'origine tant que la normalisation est en cours
+    en_cours = deque()
+    a_lire = iter(numeros)
+
+    def _pool_casse():
+        if etat["pool"] is not None:
+            print("Pool de normalisation interrompu : normalisation dans le processus courant")
+            _drop_normalize_pool(etat["pool"])
+            etat["pool"] = None
+
+    def _remplir():
+        while len(en_cours) < fenetre:
+            numero = next(a_lire, None)
+            if numero is None:
+                return
+            with profiling.span("images.read", slide=numero):
+                data = index.read(numero)
+            if data is None:
+                continue
+            profiling.count("images.bytes_in", len(data))
+            if report is not None:
+                report["images"] += 1
+                report["octets_avant"] += len(data)
+            if not normalize:
+                en_cours.append((numero, data))
+                continue
+            h = hashlib.sha256(data).hexdigest()
+            if h not in traitees:
+                if report is not None:
+                    report["uniques"] += 1
+                if etat["pool"] is not None:
+                    try:
+                        traitees[h] = etat["pool"].submit(normalize_image, data, dpi)
+                        sources[h] = data
+                    except BrokenProcessPool:
+                        _pool_casse()
+                if h not in traitees:
+                    with profiling.span("images.normalize", slide=numero):
+                        traitees[h] = normalize_image(data, dpi)
+            else:
+                profiling.count("images.dedup_hits")
+            en_cours.append((numero, h))
+
+    try:
+        _remplir()
+        for slide_num in range(1, total + 1):
+            data = None
+            if en_cours and en_cours[0][0] == slide_num:
+                _, data = en_cours.popleft()
+                if normalize:
+                    h = data
+                    if isinstance(traitees[h], Future):
+                        # Normalisation dans un autre processus : on mesure l'attente
+                        with profiling.span("images.normalize_wait", slide=slide_num):
+                            try:
+                                traitees[h] = traitees[h].result()
+                            except BrokenProcessPool:
+                                _pool_casse()
+                                traitees[h] = normalize_image(sources[h], dpi)
+                        del sources[h]
+                    data = traitees[h]
+                profiling.count("images.bytes_out", len(data))
+                if report is not None:
+                    report["octets_apres"] += len(data)
+                _remplir()
+            yield slide_num, data
+    finally:
+        # Le pool est partagé : seules les normalisations de ce deck sont annulées
+        for resultat in traitees.values():
+            if isinstance(resultat, Future):
+                resultat.cancel()
+        if report is not None:
+            if not normalize:
+                report["uniques"] = report["images"]
+            report["secondes"] = time.perf_counter() - t0
+            report["octets_economises"] = report["octets_avant"] - report["octets_apres"]
+
+def _report_images(rapport, normalized, report_callback=None):
+    """Rapport de normalisation : à `report_callback`, sinon dans les compteurs de profilage."""
+    if not normalized or not rapport.get("images"):
+        # Pas de normalisation, ou toutes les slides venaient du cache : rien à rapporter
+        return
+    if report_callback:
+        report_callback(rapport)
+    else:
+        profiling.count("images.normalized", rapport["images"])
+        profiling.count("images.bytes_saved", rapport["octets_economises"])
+
+# --- GÉNÉRATION PARALLÈLE (GROS DECKS) ---
+def _build_shard(slides, sources, normalize=True, dpi=150):
+    """Construit un lot de slides dans un processus de travail.
+
+    `sources` : pour chaque slide, chemin d'image, octets ou None.
+    Retourne (slides, rapport) : pour chaque slide, son XML sérialisé et les
+    octets de son image (ou None), à fusionner par SlideStamper.add_built_slide.
+    """
+    stamper = SlideStamper(Presentation())
+    rapport = {"images": 0, "uniques": 0, "octets_avant": 0, "octets_apres": 0}
+    normalisees = {}
+    resultats = []
+    for s, source in zip(slides, sources):
+        data = None
+        if source is not None:
+            if isinstance(source, str):
+                with open(source, "rb") as f:
+                    data = f.read()
+            else:
+                data = source
+            rapport["images"] += 1
+            rapport["octets_avant"] += len(data)
+            if normalize:
+                h = hashlib.sha256(data).hexdigest()
+                if h not in normalisees:
+                    rapport["uniques"] += 1
+                    normalisees[h] = normalize_image(data, dpi)
+                data = normalisees[h]
+            rapport["octets_apres"] += len(data)
+        slide = stamper.add_slide(s['titre'], s['points'], BytesIO(data) if data is not None else None,
+                                  **_tailles(s))
+        resultats.append((slide.part.blob, data))
+    return resultats, rapport
+
+def iter_shards(data_slides, index, processes=None, chunk_size=None, normalize=True, dpi=150):
+    """Construit les slides par lots sur un pool de processus.
+
+    Génère, dans l'ordre des slides, les résultats de _build_shard. Au plus
+    2 lots par processus sont en cours à la fois : les images d'un lot ne sont
+    lues qu'au moment de le soumettre.
+    """
+    processes = processes or os.cpu_count() or 1
+    total = len(data_slides)
+    if not chunk_size:
+        # ~4 lots par processus : bon équilibrage sans multiplier les échanges
+        chunk_size = max(1, -(-total // (processes * 4)))
+    debuts = iter(range(0, total, chunk_size))
+    en_cours = deque()
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        def _soumettre():
+            while len(en_cours) < 2 * processes:
+                debut = next(debuts, None)
+                if debut is None:
+                    return
+                lot = data_slides[debut:debut + chunk_size]
+                sources = [index.portable(n) if n in index else None
+                           for n in range(debut + 1, debut + len(lot) + 1)]
+                en_cours.append(pool.submit(_build_shard, lot, sources, normalize, dpi))
+
+        _soumettre()
+        while en_cours:
+            resultat = en_cours.popleft().result()
+            _soumettre()
+            yield resultat
 
 # --- MOTEUR 1 : TEXTE SEUL ---
-def generate_text_only(data_slides, filename="Sortie_Texte.pptx", image_files=None):
+@profiling.traced("generate_text_only")
+def generate_text_only(data_slides, filename="Sortie_Texte.pptx", image_files=None,
+                       normalize_images=True, image_dpi=150, report_callback=None,
+                       processes=1, chunk_size=None, slide_cache=True, progress_callback=None,
+                       autofit=True, output=None, compresslevel=6, store_media=True, save_callback=None):
     """Génère une présentation texte seul.
 
     image_files : liste optionnelle de fichiers Streamlit uploadés.
-    - Les images sont appliquées en fonction du numéro au début du nom du fichier (1 à 99).
+    - Les images sont appliquées en fonction du numéro au début du nom du fichier (voir ImageSourceIndex).
       Exemple : "01 campus.jpg" ou "1 campus.jpg" -> slide 1 ; "10 salle.png" -> slide 10.
+    - Des chemins de fichiers sur le disque sont aussi acceptés.
     - Si aucune image n'est trouvée pour un numéro de slide donné, la slide reste en texte seul.
+    - `normalize_images` : réduit les photos à `image_dpi` pour leur emplacement
+      (iter_slide_images) ; le rapport est passé à `report_callback` (sinon aux
+      compteurs de profilage).
+    - `processes` : au-delà de 1 (ou None = tous les cœurs), les slides sont
+      construites par lots de `chunk_size` sur un pool de processus puis
+      fusionnées dans un seul package (médias dédupliqués, relations
+      renumérotées) ; le résultat est identique au mode séquentiel.
+    - `slide_cache` : True pour le cache mémoire partagé des slides rendues
+      (image_cache.SlideRenderCache), False pour tout reconstruire, ou une
+      instance. Seules les slides dont le titre, les points, le visuel ou
+      l'image ont changé sont reconstruites ; les autres sont réassemblées.
+    - `progress_callback(fraction, texte)` : avancement (tous les 1 %) ; une
+      exception levée par le callback interrompt la génération (annulation).
+    - `autofit` : réduit la police des slides trop chargées, ou les découpe en
+      slides "(suite)" (voir fit_deck) ; l'image reste sur la première partie.
+    - `output`, `compresslevel`, `store_media`, `save_callback` : destination
+      et compression du .pptx (voir save_presentation). Par défaut un BytesIO
+      est retourné ; avec un chemin, c'est le chemin.
     """
     pres = init_presentation("Présentation Texte", "Mode Rapide - HEC")
+    stamper = SlideStamper(pres)
 
-    image_files = image_files or []
+    # Index numero_de_slide -> fichier : les octets ne sont lus qu'au moment
+    # de construire la slide correspondante
+    index = ImageSourceIndex(image_files)
+    rapport = {}
 
-    # Construction d'un mapping numero_de_slide -> contenu d'image
-    # On lit 1 ou 2 chiffres au tout début du nom de fichier : 1..99
-    image_map = {}
-    for f in image_files:
-        try:
-            name = getattr(f, "name", "") or ""
-            m = re.match(r"^(\d{1,2})", name.strip())
-            if not m:
-                continue
-            numero = int(m.group(1))
-            if 1 <= numero <= 99 and numero not in image_map:
-                img_bytes = f.read()
-                image_map[numero] = img_bytes
-        except Exception as e:
-            print(f"Erreur préparation image '{getattr(f, 'name', '?')}' : {e}")
+    data_slides, origines = fit_deck(data_slides, [n in index for n in range(1, len(data_slides) + 1)], autofit)
+    if origines != list(range(1, len(data_slides) + 1)):
+        index = index.remap(origines)
 
-    for idx, s in enumerate(data_slides):
-        titre_brut = s['titre']
-        image_stream = None
+    # Slides déjà rendues lors d'une génération précédente (même texte, même
+    # image) : réassemblées telles quelles, seules les autres sont reconstruites
+    cache = slide_cache or None
+    if slide_cache is True:
+        from image_cache import get_slide_cache
+        cache = get_slide_cache()
+    cles = [None] * len(data_slides)
+    rendues = [None] * len(data_slides)
+    if cache is not None:
+        reglages = {"normalize": normalize_images, "dpi": image_dpi if normalize_images else None}
+        with profiling.span("slide_cache.lookup", slides=len(data_slides)):
+            for i, s in enumerate(data_slides):
+                image_sha = index.digest(i + 1) if i + 1 in index else None
+                cles[i] = cache.key_for(s['titre'], s['points'], s.get('visuel'), image_sha,
+                                        **_tailles(s), **reglages)
+                rendues[i] = cache.get(cles[i])
+    manquantes = [i + 1 for i, r in enumerate(rendues) if r is None]
+    if cache is not None:
+        profiling.count("slide_cache.hits", len(data_slides) - len(manquantes))
+        profiling.count("slide_cache.misses", len(manquantes))
 
-        # Numéro de slide logique (1-based)
-        slide_num = idx + 1
-        img_bytes = image_map.get(slide_num)
-        if img_bytes is not None:
-            try:
-                image_stream = BytesIO(img_bytes)
-            except Exception as e:
-                print(f"Erreur lecture image pour le slide {slide_num}: {e}")
+    # Progression par pas de 1 % : l'appel reste négligeable même sur 10 000 slides
+    pas = max(1, len(data_slides) // 100)
 
-        add_slide_layout(pres, titre_brut, s['points'], image_stream=image_stream)
-    
-    buffer = BytesIO()
-    pres.save(buffer)
-    buffer.seek(0)
-    return buffer
+    def _avancer(fait):
+        if progress_callback and (fait % pas == 0 or fait == len(data_slides)):
+            progress_callback(fait / len(data_slides), f"Slide {fait}/{len(data_slides)}")
+
+    a_construire = [data_slides[n - 1] for n in manquantes]
+    sources = index if len(manquantes) == len(data_slides) else index.remap(manquantes)
+    rapport["slides_en_cache"] = len(data_slides) - len(manquantes)
+
+    if processes != 1 and a_construire:
+        t0 = time.perf_counter()
+        rapport.update({"images": 0, "uniques": 0, "octets_avant": 0, "octets_apres": 0})
+
+        def _construites():
+            for resultats, rapport_lot in iter_shards(a_construire, sources, processes, chunk_size,
+                                                      normalize_images, image_dpi):
+                for cle in ("images", "uniques", "octets_avant", "octets_apres"):
+                    rapport[cle] += rapport_lot[cle]
+                yield from resultats
+
+        construites = _construites()
+        for i in range(len(data_slides)):
+            if rendues[i] is not None:
+                with profiling.span("slide.reuse", slide=i + 1):
+                    stamper.add_built_slide(*rendues[i])
+            else:
+                with profiling.span("shards.wait", slide=i + 1):
+                    slide_xml, img_bytes = next(construites)
+                with profiling.span("slide.merge", slide=i + 1):
+                    stamper.add_built_slide(slide_xml, img_bytes)
+                if cache is not None:
+                    cache.put(cles[i], slide_xml, img_bytes)
+            _avancer(i + 1)
+        construites.close()
+        rapport["secondes"] = time.perf_counter() - t0
+        rapport["octets_economises"] = rapport["octets_avant"] - rapport["octets_apres"]
+    else:
+        images = iter_slide_images(sources, len(a_construire), normalize_images, image_dpi, report=rapport)
+        for i, s in enumerate(data_slides):
+            if rendues[i] is not None:
+                with profiling.span("slide.reuse", slide=i + 1):
+                    stamper.add_built_slide(*rendues[i])
+            else:
+                _, img_bytes = next(images)
+                image_stream = BytesIO(img_bytes) if img_bytes is not None else None
+                with profiling.span("slide.add", slide=i + 1):
+                    slide = stamper.add_slide(s['titre'], s['points'], image_stream=image_stream, **_tailles(s))
+                if cache is not None:
+                    cache.put(cles[i], slide.part.blob, img_bytes)
+            _avancer(i + 1)
+        images.close()
+
+    if len(index):
+        _report_images(rapport, normalize_images, report_callback)
+
+    if progress_callback:
+        progress_callback(1.0, "Enregistrement du fichier...")
+    return _finish(pres, output, compresslevel, store_media, save_callback)
 
 # --- MOTEUR 2 : WEB IMAGES ---
-def generate_web_images(data_slides, filename="Sortie_Web.pptx"):
+def _fetch_one(session, url, timeout, cache=None, max_bytes=None, arret=None):
+    """Télécharge une image (web_download) ; None en cas d'erreur, de refus ou de statut != 200.
+
+    Ne lève jamais d'exception : une URL en échec donne une slide sans image,
+    sans interrompre le téléchargement des autres. `arret` (threading.Event)
+    est levé à la deadline : le téléchargement n'écrit plus dans le cache.
+    """
+    from web_download import WEB_IMAGE_MAX_BYTES, download_image
+
+    if arret is not None and arret.is_set():
+        return None
+    max_bytes = max_bytes or WEB_IMAGE_MAX_BYTES
+    try:
+        with profiling.span("web.fetch", url=url[:120]):
+            if cache is not None:
+                data = cache.fetch(session, url, timeout=timeout, max_bytes=max_bytes, cancel=arret)
+            else:
+                data = download_image(session, url, timeout=timeout, max_bytes=max_bytes).data
+    except Exception as e:
+        print(f"Erreur téléchargement image '{url[:120]}' : {type(e).__name__}: {e}")
+        return None
+    profiling.count("web.bytes", len(data) if data else 0)
+    return data
+
+def _flush_disk_cache(cache):
+    """Écrit l'index d'un cache disque (une fois par deck) ; une erreur disque n'empêche pas
+    de livrer le deck."""
+    try:
+        cache.flush()
+    except Exception as e:
+        print(f"Cache disque : index non enregistré ({type(e).__name__}: {e})")
+
+def fetch_web_images(urls, max_workers=8, timeout=4, deadline=30, cache=True, max_bytes=None):
+    """Télécharge toutes les URLs d'un deck en parallèle.
+
+    - Pool de threads borné (`max_workers`) et Session partagée : les
+      connexions HTTP restent ouvertes par hôte (keep-alive).
+    - `timeout` : délai par requête ; `deadline` : délai global pour le deck.
+    - `max_bytes` : taille maximale d'une image (web_download.WEB_IMAGE_MAX_BYTES
+      par défaut). Le corps est lu en flux et validé au premier bloc : une
+      ressource trop grosse, qui n'est pas une image ou aux dimensions hors
+      norme est abandonnée sans être chargée en mémoire.
+    - `cache` : True pour le cache disque partagé (image_cache), False pour
+      le désactiver, ou une instance de WebImageCache. Les images encore
+      fraîches sont servies sans aucun accès réseau.
+    Retourne une liste alignée sur `urls` : bytes de l'image, ou None si l'URL
+    n'est pas HTTP, en erreur, ou pas terminée avant la deadline.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    results = [None] * len(urls)
+    # Une même URL présente sur plusieurs slides n'est téléchargée qu'une fois
+    uniques = list(dict.fromkeys(u for u in urls if u.startswith("http")))
+
+    if cache is True:
+        from image_cache import get_web_cache
+        cache = get_web_cache()
+    elif cache is False:
+        cache = None
+
+    contenus = {}
+    if cache is not None:
+        with profiling.span("web.cache_lookup", urls=len(uniques)):
+            for url in uniques:
+                data = cache.get_fresh(url)
+                if data is not None:
+                    contenus[url] = data
+        profiling.count("web.cache_hits", len(contenus))
+        uniques = [u for u in uniques if u not in contenus]
+
+    if not uniques:
+        if cache is not None:
+            _flush_disk_cache(cache)
+        for i, url in enumerate(urls):
+            results[i] = contenus.get(url)
+        return results
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    arret = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(uniques)))
+    try:
+        futures = {profiling.submit(pool, _fetch_one, session, url, timeout, cache, max_bytes, arret): url
+                   for url in uniques}
+        with profiling.span("web.wait", urls=len(uniques)):
+            done, pending = wait(futures, timeout=deadline)
+        profiling.count("web.timeouts", len(pending))
+    finally:
+        # Les téléchargements hors délai sont abandonnés (slide sans image) : ils
+        # n'écrivent plus dans le cache, dont l'index est écrit juste après, et
+        # la session fermée coupe leurs connexions
+        arret.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        session.close()
+
+    contenus.update({futures[f]: f.result() for f in done})
+    if cache is not None:
+        _flush_disk_cache(cache)
+    for i, url in enumerate(urls):
+        results[i] = contenus.get(url)
+    return results
+
+@profiling.traced("generate_web_images")
+def generate_web_images(data_slides, filename="Sortie_Web.pptx", max_workers=8, deadline=30,
+                        max_image_bytes=None, autofit=True, output=None, compresslevel=6, store_media=True,
+                        save_callback=None):
+    """Génère une présentation illustrée par les images des URLs `visuel`.
+
+    `max_image_bytes` : taille maximale d'une image téléchargée (voir fetch_web_images).
+    `autofit`, `output`, `compresslevel`, `store_media`, `save_callback` : voir generate_text_only.
+    """
     pres = init_presentation("Présentation Web", "Mode Connecté - HEC")
-    
-    for s in data_slides:
-        url = s.get('visuel', '') # Ici 'visuel' contient l'URL
-        img_stream = None
-        if url.startswith("http"):
-            try:
-                r = requests.get(url, timeout=4)
-                if r.status_code == 200:
-                    img_stream = BytesIO(r.content)
-            except:
-                pass
-        
-        add_slide_layout(pres, s['titre'], s['points'], img_stream)
-
-    buffer = BytesIO()
-    pres.save(buffer)
-    buffer.seek(0)
-    return buffer
+    stamper = SlideStamper(pres)
+    # Zone de texte étroite prévue pour chaque URL (une image qui échoue laisse de la marge)
+    data_slides, _ = fit_deck(data_slides, [(s.get('visuel') or '').startswith("http") for s in data_slides],
+                              autofit)
+
+    # Ici 'visuel' contient l'URL : tout est téléchargé en amont, en parallèle
+    urls = [s.get('visuel', '') for s in data_slides]
+    contenus = fetch_web_images(urls, max_workers=max_workers, deadline=deadline, max_bytes=max_image_bytes)
+
+    for i, (s, contenu) in enumerate(zip(data_slides, contenus), 1):
+        img_stream = BytesIO(contenu) if contenu is not None else None
+        with profiling.span("slide.add", slide=i):
+            stamper.add_slide(s['titre'], s['points'], img_stream, **_tailles(s))
+
+    return _finish(pres, output, compresslevel, store_media, save_callback)
 
 # --- MOTEUR 3 : LOCAL AI (MAC SILICON) ---
 # On prépare le chargement du modèle mais on ne l'exécute que si nécessaire
+AI_MODEL_ID = "runwayml/stable-diffusion-v1-5"
+
+# Backend d'inférence, choisi par la variable d'environnement PPTX_AI_BACKEND :
+# - "default" : chargeur historique (MPS float16, sinon CPU float32)
+# - "bf16"    : CPU, pipeline complet en bfloat16
+# - "int8"    : CPU, UNet quantifié dynamiquement en int8 (couches Linear)
+# - "compile" : CPU, UNet en channels_last compilé par torch.compile
+# - "onnx"    : ONNX Runtime via optimum (pip install optimum[onnxruntime]), exporté une fois dans le cache
+AI_BACKENDS = ("default", "bf16", "int8", "compile", "onnx")
+AI_BACKEND = os.environ.get("PPTX_AI_BACKEND", "default")
+
+# Cycle de vie du modèle :
+# - PPTX_AI_ENABLED=1        : mode IA actif, le modèle est préchauffé au lancement de l'app
+# - PPTX_AI_IDLE_TIMEOUT     : secondes d'inactivité avant déchargement (0 = jamais)
+# - PPTX_AI_LOW_MEMORY=1     : budget mémoire réduit (VAE tiling/slicing, offload séquentiel)
+AI_ENABLED = os.environ.get("PPTX_AI_ENABLED") == "1"
+AI_IDLE_TIMEOUT = float(os.environ.get("PPTX_AI_IDLE_TIMEOUT", 900))
+AI_LOW_MEMORY = os.environ.get("PPTX_AI_LOW_MEMORY") == "1"
+
 _pipe_cache = None
+_pipe_backend = None        # backend réellement chargé ("default" après un repli)
+_pipe_requested = None      # backend demandé pour _pipe_cache
+_pipe_lock = threading.RLock()
+# Un seul appel au pipeline à la fois dans le processus (un seul modèle en mémoire)
+_inference_lock = threading.Lock()
+_pipe_last_used = 0.0
+_pipe_users = 0
+_reaper_thread = None
+_warmup_thread = None
+
+def _onnx_export_dir(model_id):
+    """Répertoire du modèle exporté en ONNX, dans le cache disque (PPTX_CACHE_DIR)."""
+    from image_cache import DEFAULT_CACHE_DIR
+    return os.path.join(DEFAULT_CACHE_DIR, "onnx", model_id.replace("/", "--"))
 
-def get_ai_pipeline():
-    global _pipe_cache
-    if _pipe_cache is not None:
+def _load_cpu_backend(backend, model_id, torch, StableDiffusionPipeline):
+    """Charge le pipeline pour un backend CPU accéléré (hors "default")."""
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTStableDiffusionPipeline
+        # L'export ONNX (plusieurs minutes) n'est fait qu'une fois : les
+        # chargements suivants, y compris après un déchargement, relisent le modèle exporté
+        export_dir = _onnx_export_dir(model_id)
+        if os.path.isdir(export_dir):
+            print(">>> Chargement Modèle IA (ONNX Runtime, modèle exporté)...")
+            return ORTStableDiffusionPipeline.from_pretrained(export_dir)
+        print(">>> Chargement Modèle IA (ONNX Runtime, export initial)...")
+        pipe = ORTStableDiffusionPipeline.from_pretrained(model_id, export=True)
+        tmp = f"{export_dir}.{os.getpid()}.tmp"
+        try:
+            pipe.save_pretrained(tmp)
+            # Renommage atomique : un export incomplet n'est jamais relu
+            os.replace(tmp, export_dir)
+        except OSError as e:
+            print(f"Export ONNX non enregistré (refait au prochain chargement) : {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+        return pipe
+
+    dtype = torch.bfloat16 if backend == "bf16" else torch.float32
+    print(f">>> Chargement Modèle IA (CPU, backend {backend})...")
+    pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=dtype)
+    pipe = pipe.to("cpu")
+
+    if backend == "int8":
+        torch.ao.quantization.quantize_dynamic(pipe.unet, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    elif backend == "compile":
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.unet = torch.compile(pipe.unet)
+    return pipe
+
+def _apply_memory_budget(pipe, device):
+    """Mode mémoire réduite : pic plus bas au prix d'une génération plus lente.
+
+    Retourne True si l'offload séquentiel gère désormais le placement des
+    poids sur `device` ; sinon c'est à l'appelant de déplacer le pipeline.
+    """
+    for option in ("enable_vae_slicing", "enable_vae_tiling"):
+        try:
+            getattr(pipe, option)()
+        except Exception as e:
+            print(f"Option mémoire {option} indisponible : {e}")
+    # L'offload séquentiel ne sert que si le modèle vit sur un accélérateur
+    if device != "cpu":
+        try:
+            pipe.enable_sequential_cpu_offload(device=device)
+            return True
+        except Exception as e:
+            print(f"Offload séquentiel indisponible ({type(e).__name__}: {e}) : modèle entier sur {device}")
+    return False
+
+def get_ai_pipeline(backend=None):
+    """Pipeline Stable Diffusion partagé, chargé au premier appel.
+
+    `backend` : un des AI_BACKENDS (par défaut AI_BACKEND). Un backend
+    accéléré qui échoue au chargement retombe sur le chargeur par défaut.
+    Le chargement est protégé par un verrou : une requête arrivant pendant le
+    préchauffage attend la fin de celui-ci au lieu de charger une 2e copie.
+    """
+    return _get_ai_pipeline(backend)[0]
+
+def _get_ai_pipeline(backend=None):
+    """(pipeline, backend réellement chargé), lus ensemble sous le verrou ; (None, None) si indisponible."""
+    global _pipe_last_used
+    with _pipe_lock, profiling.span("ai.load_pipeline"):
+        pipe = _load_ai_pipeline(backend)
+        if pipe is None:
+            return None, None
+        _pipe_last_used = time.monotonic()
+        _start_idle_reaper()
+        return pipe, _pipe_backend
+
+def _load_ai_pipeline(backend=None):
+    global _pipe_cache, _pipe_backend, _pipe_requested
+    backend = backend or AI_BACKEND
+    if backend not in AI_BACKENDS:
+        raise ValueError(f"Backend IA inconnu : {backend!r} (attendu : {', '.join(AI_BACKENDS)})")
+    if _pipe_cache is not None and _pipe_requested == backend:
         return _pipe_cache
-    
-    model_id = "runwayml/stable-diffusion-v1-5"
+    # Changement de backend : on libère l'ancien pipeline avant de charger
+    _pipe_cache = None
+
+    try:
+        import torch
+        from diffusers import StableDiffusionPipeline
+    except ImportError as e:
+        print(f"Mode IA indisponible (torch/diffusers non installés) : {e}")
+        return None
+
+    model_id = AI_MODEL_ID
+
+    # 0) Backend CPU accéléré demandé explicitement
+    if backend != "default":
+        try:
+            pipe = _load_cpu_backend(backend, model_id, torch, StableDiffusionPipeline)
+            if hasattr(pipe, "enable_attention_slicing"):
+                pipe.enable_attention_slicing()
+            if hasattr(pipe, "safety_checker"):
+                pipe.safety_checker = None
+            if AI_LOW_MEMORY:
+                _apply_memory_budget(pipe, "cpu")
+
+            _pipe_cache, _pipe_backend, _pipe_requested = pipe, backend, backend
+            return pipe
+        except Exception as e:
+            print(f"Erreur chargement IA (backend {backend}), retour au chargeur par défaut: {e}")
 
     # 1) Tentative MPS float16 (préférée sur Apple Silicon)
     if torch.backends.mps.is_available():
         try:
             print(">>> Chargement Modèle IA (MPS, float16)...")
             pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=torch.float16)
-            pipe = pipe.to("mps")
+            # L'offload séquentiel place lui-même les poids sur le device ; s'il
+            # échoue, le pipeline float16 ne doit pas rester sur le CPU
+            if not (AI_LOW_MEMORY and _apply_memory_budget(pipe, "mps")):
+                pipe = pipe.to("mps")
 
             pipe.enable_attention_slicing()
 
             if hasattr(pipe, "safety_checker"):
                 pipe.safety_checker = None
 
-            _pipe_cache = pipe
+            _pipe_cache, _pipe_backend, _pipe_requested = pipe, "default", backend
             return pipe
         except Exception as e:
             print(f"Erreur chargement IA sur MPS, bascule sur CPU: {e}")
@@ -158,75 +1158,647 @@ def get_ai_pipeline():
 
         if hasattr(pipe, "safety_checker"):
             pipe.safety_checker = None
+        if AI_LOW_MEMORY:
+            _apply_memory_budget(pipe, "cpu")
 
-        _pipe_cache = pipe
+        _pipe_cache, _pipe_backend, _pipe_requested = pipe, "default", backend
         return pipe
     except Exception as e:
         print(f"Erreur chargement IA (CPU): {e}")
         return None
 
-def generate_local_ai(data_slides, progress_callback=None, num_steps=30, per_slide_images=False, image_files=None, test_single=False):
-    pipe = get_ai_pipeline()
-    if not pipe:
+def unload_ai_pipeline():
+    """Décharge le modèle et rend la mémoire (rechargé au prochain usage)."""
+    global _pipe_cache, _pipe_backend, _pipe_requested
+    with _pipe_lock:
+        if _pipe_cache is None:
+            return
+        print(">>> Déchargement Modèle IA (inactif)...")
+        _pipe_cache, _pipe_backend, _pipe_requested = None, None, None
+        gc.collect()
+        try:
+            import torch
+            if torch.backends.mps.is_available():
+                torch.mps.empty_cache()
+        except Exception:
+            pass
+
+@contextmanager
+def _pipeline_in_use():
+    """Marque le pipeline comme occupé : il n'est jamais déchargé en pleine génération."""
+    global _pipe_users, _pipe_last_used
+    with _pipe_lock:
+        _pipe_users += 1
+        _pipe_last_used = time.monotonic()
+    try:
+        yield
+    finally:
+        with _pipe_lock:
+            _pipe_users -= 1
+            _pipe_last_used = time.monotonic()
+
+@contextmanager
+def _ai_pipeline(backend=None):
+    """(pipeline, backend réellement chargé) réservés pour la durée du bloc.
+
+    Chargement et prise de la référence se font sous le même verrou : le
+    déchargement pour inactivité ne peut pas passer entre les deux.
+    (None, None) si le pipeline est indisponible.
+    """
+    global _pipe_users, _pipe_last_used
+    with _pipe_lock:
+        pipe, charge = _get_ai_pipeline(backend)
+        if pipe is not None:
+            _pipe_users += 1
+    try:
+        yield pipe, charge
+    finally:
+        if pipe is not None:
+            with _pipe_lock:
+                _pipe_users -= 1
+                _pipe_last_used = time.monotonic()
+
+def _unload_if_idle():
+    with _pipe_lock:
+        inactif = time.monotonic() - _pipe_last_used > AI_IDLE_TIMEOUT
+        if _pipe_cache is not None and _pipe_users == 0 and inactif:
+            unload_ai_pipeline()
+
+def _idle_reaper():
+    while True:
+        time.sleep(max(1.0, min(60.0, AI_IDLE_TIMEOUT / 4)))
+        _unload_if_idle()
+
+def _start_idle_reaper():
+    global _reaper_thread
+    if AI_IDLE_TIMEOUT <= 0 or _reaper_thread is not None:
+        return
+    _reaper_thread = threading.Thread(target=_idle_reaper, name="ai-idle-reaper", daemon=True)
+    _reaper_thread.start()
+
+def warm_up_ai_pipeline(backend=None):
+    """Charge le modèle en tâche de fond (à appeler au lancement de l'app).
+
+    Retourne le thread de préchauffage ; plusieurs appels n'en lancent qu'un.
+    """
+    global _warmup_thread
+    with _pipe_lock:
+        if _warmup_thread is None or not _warmup_thread.is_alive():
+            _warmup_thread = threading.Thread(target=get_ai_pipeline, args=(backend,),
+                                              name="ai-warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+# Estimation (prudente) de la mémoire d'activation par image 512x512 en
+# float32, guidance incluse ; sert à choisir la taille de batch automatique.
+AI_MB_PER_IMAGE_512 = 1500
+
+def _available_memory_mb():
+    """Mémoire physique disponible (Mo), 4 Go si le système ne la fournit pas."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 4096
+
+def auto_batch_size(width=512, height=512, memory_budget_mb=None, max_batch=8):
+    """Plus grand batch d'inférence qui tient dans `memory_budget_mb`.
+
+    Par défaut le budget est la moitié de la mémoire disponible.
+    """
+    if memory_budget_mb is None:
+        memory_budget_mb = _available_memory_mb() / 2
+    par_image = AI_MB_PER_IMAGE_512 * (width * height) / (512 * 512)
+    return max(1, min(max_batch, int(memory_budget_mb // par_image)))
+
+# Profils de génération : "final" pour l'export (paramètres tels quels),
+# "draft" pour itérer vite sur un deck : scheduler DPM-Solver++ en peu de pas,
+# rendu en basse résolution puis agrandi à la taille finale pour le placement.
+AI_PROFILES = {
+    "final": {"scheduler": None, "max_steps": None, "resolution": None},
+    "draft": {"scheduler": "dpmsolver++", "max_steps": 8, "resolution": 256},
+}
+
+def resolve_ai_profile(profile, num_steps=30, width=512, height=512):
+    """Paramètres de génération effectifs pour un profil d'AI_PROFILES."""
+    if profile not in AI_PROFILES:
+        raise ValueError(f"Profil IA inconnu : {profile!r} (attendu : {', '.join(AI_PROFILES)})")
+    conf = AI_PROFILES[profile]
+    params = {"num_steps": num_steps, "width": width, "height": height,
+              "scheduler": conf["scheduler"], "output_size": None}
+    if conf["max_steps"]:
+        params["num_steps"] = min(num_steps, conf["max_steps"])
+    if conf["resolution"]:
+        # Résolution réduite (multiple de 8, proportions conservées)
+        ratio = conf["resolution"] / max(width, height)
+        if ratio < 1:
+            params["width"] = max(64, int(width * ratio) // 8 * 8)
+            params["height"] = max(64, int(height * ratio) // 8 * 8)
+            params["output_size"] = (width, height)
+    return params
+
+def _apply_scheduler(pipe, name):
+    """Installe le scheduler `name` sur le pipeline (None = scheduler d'origine)."""
+    if not hasattr(pipe, "scheduler"):
+        return
+    schedulers = getattr(pipe, "_pptx_schedulers", None)
+    if schedulers is None:
+        schedulers = {None: pipe.scheduler}
+        pipe._pptx_schedulers = schedulers
+    if name not in schedulers:
+        if name == "dpmsolver++":
+            from diffusers import DPMSolverMultistepScheduler
+            schedulers[name] = DPMSolverMultistepScheduler.from_config(
+                schedulers[None].config, algorithm_type="dpmsolver++", use_karras_sigmas=True)
+        else:
+            raise ValueError(f"Scheduler inconnu : {name!r}")
+    pipe.scheduler = schedulers[name]
+
+def encode_image(image, image_format="auto"):
+    """Encode une image PIL pour insertion dans le PPTX.
+
+    "png" (optimisé), "jpeg" (qualité 90) ou "auto" : le plus compact des
+    deux, PNG imposé si l'image a de la transparence.
+    """
+    def _png():
+        buf = BytesIO()
+        image.save(buf, format="PNG", optimize=True)
+        return buf.getvalue()
+
+    def _jpeg():
+        buf = BytesIO()
+        image.convert("RGB").save(buf, format="JPEG", quality=90, optimize=True)
+        return buf.getvalue()
+
+    if image_format == "png":
+        return _png()
+    if image_format == "jpeg":
+        return _jpeg()
+    if image.mode in ("RGBA", "LA", "P") and (image.mode != "P" or "transparency" in image.info):
+        return _png()
+    return min(_png(), _jpeg(), key=len)
+
+def _expected_ai_backend():
+    """Backend sous lequel relire le cache avant de charger le modèle : celui du pipeline
+    déjà chargé pour AI_BACKEND (repli éventuel compris), sinon AI_BACKEND."""
+    pipe, backend, demande = _pipe_cache, _pipe_backend, _pipe_requested
+    if pipe is not None and demande == AI_BACKEND:
+        return backend
+    return AI_BACKEND
+
+def _ai_cache_key(cache, prompt, num_steps, seed, width, height, scheduler=None, output_size=None, image_format="png",
+                  backend=None):
+    # `backend` : celui du pipeline qui a produit l'image (_ai_pipeline) pour
+    # une écriture ; par défaut celui attendu, pour une lecture
+    backend = backend or _expected_ai_backend()
+    # Les options de profil n'entrent dans la clé que si elles sont utilisées
+    extra = {}
+    if scheduler:
+        extra["scheduler"] = scheduler
+    if output_size:
+        extra["output_size"] = list(output_size)
+    if image_format != "png":
+        extra["format"] = image_format
+    if backend != "default":
+        # Les backends quantifiés / bf16 ne donnent pas exactement les mêmes pixels
+        extra["backend"] = backend
+    return cache.key_for(AI_MODEL_ID, prompt, num_steps, seed, width, height, **extra)
+
+def render_ai_images(prompts, num_steps=30, seed=0, width=512, height=512, pipe=None,
+                     scheduler=None, output_size=None):
+    """Inférence seule : images PIL pour `prompts` en un appel pipe([...]).
+
+    Chaque prompt a son propre générateur initialisé avec `seed` : un même
+    quadruplet (modèle, prompt, pas, seed, résolution) donne la même image
+    quel que soit le batch. `scheduler` et `output_size` (agrandissement
+    après génération) viennent du profil choisi (resolve_ai_profile).
+    Retourne None si le pipeline est indisponible.
+    """
+    if pipe is None:
+        # Pipeline partagé, réservé du chargement jusqu'à la fin de l'inférence
+        with _ai_pipeline() as (pipe, _):
+            if not pipe:
+                return None
+            return render_ai_images(prompts, num_steps, seed, width, height, pipe, scheduler, output_size)
+
+    import torch
+
+    with _pipeline_in_use():
+        # Générateurs CPU : reproductibles quel que soit le device (MPS ou CPU)
+        generators = [torch.Generator("cpu").manual_seed(seed) for _ in prompts]
+        with _inference_lock, profiling.span("ai.inference", batch=len(prompts), steps=num_steps,
+                                             width=width, height=height):
+            # Sous le verrou : brouillon et version finale (travaux concurrents)
+            # partagent le pipeline, chacun doit tourner avec son scheduler
+            _apply_scheduler(pipe, scheduler)
+            images = pipe(list(prompts), num_inference_steps=num_steps,
+                          generator=generators, width=width, height=height).images
+        profiling.count("ai.images", len(prompts))
+
+    if output_size:
+        from PIL import Image
+        with profiling.span("ai.upscale", images=len(images)):
+            images = [im if im.size == tuple(output_size) else im.resize(tuple(output_size), Image.LANCZOS)
+                      for im in images]
+    return images
+
+def generate_ai_batch(prompts, num_steps=30, seed=0, width=512, height=512, cache=None, pipe=None,
+                      scheduler=None, output_size=None, image_format="png"):
+    """Génère les images IA encodées d'une liste de prompts (voir render_ai_images).
+
+    La génération étant déterministe, les résultats sont mémorisés dans
+    `cache` (AIImageCache) entre les runs. Sans `pipe` explicite, le pipeline
+    n'est chargé (get_ai_pipeline) que si un prompt manque dans le cache.
+    Retourne la liste des octets d'image, ou None si le pipeline est indisponible.
+    """
+    results = [None] * len(prompts)
+    keys = [None] * len(prompts)
+    if cache is not None:
+        for i, prompt in enumerate(prompts):
+            keys[i] = _ai_cache_key(cache, prompt, num_steps, seed, width, height,
+                                    scheduler, output_size, image_format)
+            results[i] = cache.get(keys[i])
+
+    manquants = [i for i, data in enumerate(results) if data is None]
+    if cache is not None:
+        profiling.count("ai.cache_hits", len(prompts) - len(manquants))
+    if not manquants:
+        return results
+
+    reserve = _ai_pipeline() if pipe is None else nullcontext((pipe, _expected_ai_backend()))
+    with reserve as (pipe, backend):
+        if not pipe:
+            return None
+        images = render_ai_images([prompts[i] for i in manquants], num_steps, seed, width, height,
+                                  pipe, scheduler, output_size)
+
+    for i, image in zip(manquants, images):
+        with profiling.span("ai.encode"):
+            results[i] = encode_image(image, image_format)
+        if cache is not None:
+            # Clé du backend réellement chargé (un repli sur "default" ne se mélange pas)
+            cle = _ai_cache_key(cache, prompts[i], num_steps, seed, width, height,
+                                scheduler, output_size, image_format, backend)
+            cache.put(cle, results[i], meta={"prompt": prompts[i][:200]})
+    if cache is not None:
+        _flush_disk_cache(cache)
+    return results
+
+def generate_ai_png(prompt, num_steps=30, seed=0, width=512, height=512, cache=None, pipe=None,
+                    scheduler=None, output_size=None):
+    """Génère une seule image IA (PNG) ; voir generate_ai_batch."""
+    results = generate_ai_batch([prompt], num_steps, seed, width, height, cache, pipe,
+                                scheduler, output_size)
+    return results[0] if results else None
+
+@profiling.traced("generate_local_ai")
+def generate_local_ai(data_slides, progress_callback=None, num_steps=30, per_slide_images=False, image_files=None, test_single=False,
+                      seed=0, width=512, height=512, cache=True, batch_size=1, memory_budget_mb=None,
+                      profile="final", image_format="auto", stage_callback=None,
+                      normalize_images=True, image_dpi=150, report_callback=None, autofit=True,
+                      output=None, compresslevel=6, store_media=True, save_callback=None):
+    """Génère une présentation illustrée par Stable Diffusion.
+
+    - `seed` : graine de génération (images déterministes).
+    - `cache` : True pour le cache disque partagé des images IA (image_cache),
+      False pour le désactiver, ou une instance d'AIImageCache.
+    - `batch_size` : nombre de prompts par appel au pipeline, ou "auto" pour
+      le plus grand batch qui tient dans `memory_budget_mb` (auto_batch_size).
+    - `profile` : "final" (export, paramètres tels quels) ou "draft" (scheduler
+      rapide, peu de pas, basse résolution agrandie) ; voir AI_PROFILES.
+    - `image_format` : encodage des images générées (voir encode_image).
+    - `stage_callback(slide_num, etape, secondes)` : durée de chaque étape
+      ("inference", "encodage", "assemblage") pour chaque slide.
+    - `normalize_images`, `image_dpi`, `report_callback` : comme generate_text_only,
+      pour les images uploadées.
+    - `autofit`, `output`, `compresslevel`, `store_media`, `save_callback` : comme generate_text_only.
+    Un même prompt présent sur plusieurs slides n'est généré qu'une fois, et le
+    modèle n'est chargé que si au moins une image manque dans le cache.
+
+    Traitement en pipeline : l'inférence tourne dans un thread producteur,
+    l'encodage sur un pool de threads, et l'assemblage python-pptx dans le
+    thread appelant (qui reçoit aussi les callbacks, comme l'exige Streamlit)
+    au fur et à mesure que les images de chaque slide sont prêtes.
+    """
+    if cache is True:
+        from image_cache import get_ai_cache
+        cache = get_ai_cache()
+    elif cache is False:
+        cache = None
+
+    params = resolve_ai_profile(profile, num_steps, width, height)
+
+    # Sans cache, le modèle sera forcément nécessaire : on le charge tout de suite
+    if cache is None and not get_ai_pipeline():
         return None
 
+    if batch_size == "auto":
+        batch_size = auto_batch_size(params["width"], params["height"], memory_budget_mb)
+    batch_size = max(1, batch_size)
+
     pres = init_presentation("Présentation AI", "Génération Locale Mac Silicon")
+    stamper = SlideStamper(pres)
 
-    # Prépare un mapping numero_de_slide -> image uploadée (1..99) si des fichiers sont fournis
-    image_files = image_files or []
-    image_map = {}
-    for f in image_files:
+    # Index numero_de_slide -> image uploadée, lue seulement à l'assemblage
+    index = ImageSourceIndex(image_files)
+
+    avec_image = [(i + 1) in index or (bool(s.get('visuel')) and (per_slide_images or i == 0))
+                  for i, s in enumerate(data_slides)]
+    data_slides, origines = fit_deck(data_slides, avec_image, autofit)
+    if origines != list(range(1, len(data_slides) + 1)):
+        index = index.remap(origines)
+
+    # 1) Plan : prompt à générer pour chaque slide (un prompt n'est généré qu'une fois)
+    total = len(data_slides)
+    prompts_slides = [None] * total
+    a_generer = {}
+    for i, s in enumerate(data_slides):
+        prompt = s.get('visuel', '') # Ici 'visuel' contient le prompt
+        # Priorité à une image uploadée ; sinon IA selon la config
+        if (i + 1) not in index and prompt and (per_slide_images or i == 0):
+            prompts_slides[i] = prompt
+            a_generer.setdefault(prompt, Future())
+
+    gen = {"num_steps": params["num_steps"], "seed": seed, "width": params["width"], "height": params["height"],
+           "scheduler": params["scheduler"], "output_size": params["output_size"]}
+    timings = {prompt: {"inference": 0.0, "encodage": 0.0} for prompt in a_generer}
+    keys = {}
+    manquants = []
+    with profiling.span("ai.cache_lookup", prompts=len(a_generer)):
+        for prompt, fut in a_generer.items():
+            data = None
+            if cache is not None:
+                keys[prompt] = _ai_cache_key(cache, prompt, image_format=image_format, **gen)
+                data = cache.get(keys[prompt])
+            if data is not None:
+                fut.set_result(data)
+            else:
+                manquants.append(prompt)
+    if cache is not None:
+        profiling.count("ai.cache_hits", len(a_generer) - len(manquants))
+
+    # 2) Étages encodage (pool) et inférence (thread producteur)
+    encodeur = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai-encode")
+    indisponible = threading.Event()
+    # Levé quand l'assemblage s'arrête (fin, annulation, erreur) : le producteur
+    # ne lance plus de lot, l'attente se limite au lot en cours
+    arret = threading.Event()
+
+    def _encoder(prompt, image, backend):
+        t0 = time.perf_counter()
         try:
-            name = getattr(f, "name", "") or ""
-            m = re.match(r"^(\d{1,2})", name.strip())
-            if not m:
-                continue
-            numero = int(m.group(1))
-            if 1 <= numero <= 99 and numero not in image_map:
-                img_bytes = f.read()
-                image_map[numero] = img_bytes
+            with profiling.span("ai.encode", format=image_format):
+                data = encode_image(image, image_format)
+            profiling.count("ai.encoded_bytes", len(data))
+            if cache is not None:
+                # Clé du backend qui a produit l'image (un repli sur "default" ne se mélange pas)
+                cle = _ai_cache_key(cache, prompt, image_format=image_format, backend=backend, **gen)
+                cache.put(cle, data, meta={"prompt": prompt[:200]})
         except Exception as e:
-            print(f"Erreur préparation image IA-upload '{getattr(f, 'name', '?')}' : {e}")
-    
+            print(f"Erreur encodage image IA '{prompt[:30]}' : {e}")
+            data = None
+        timings[prompt]["encodage"] = time.perf_counter() - t0
+        a_generer[prompt].set_result(data)
+
+    def _producteur():
+        for debut in range(0, len(manquants), batch_size):
+            if arret.is_set():
+                return
+            lot = manquants[debut:debut + batch_size]
+            t0 = time.perf_counter()
+            backend = None
+            try:
+                with _ai_pipeline() as (pipe, backend):
+                    images = render_ai_images(lot, gen["num_steps"], seed, gen["width"], gen["height"],
+                                              pipe=pipe, scheduler=gen["scheduler"],
+                                              output_size=gen["output_size"]) if pipe else None
+            except Exception as e:
+                print(f"Erreur génération images IA ({len(lot)} prompts) : {e}")
+                images = [None] * len(lot)
+            if images is None:
+                # Pipeline indisponible : on débloque toutes les slides restantes
+                indisponible.set()
+                for prompt in manquants[debut:]:
+                    a_generer[prompt].set_result(None)
+                return
+            duree = (time.perf_counter() - t0) / len(lot)
+            for prompt, image in zip(lot, images):
+                timings[prompt]["inference"] = duree
+                if image is None:
+                    a_generer[prompt].set_result(None)
+                else:
+                    profiling.submit(encodeur, _encoder, prompt, image, backend)
+
+    # Le producteur et l'encodage écrivent dans la trace de l'appelant (profiling.bind / submit)
+    producteur = threading.Thread(target=profiling.bind(_producteur), name="ai-inference", daemon=True)
+    producteur.start()
+
+    # 3) Assemblage dans l'ordre des slides, dès que chaque image est prête
+    rapport = {}
+    uploads = iter_slide_images(index, total, normalize_images, image_dpi, report=rapport)
+    try:
+        for i, (s, (slide_num, img_bytes)) in enumerate(zip(data_slides, uploads)):
+            prompt = prompts_slides[i]
+            if prompt is not None:
+                with profiling.span("ai.wait_image", slide=slide_num):
+                    img_bytes = a_generer[prompt].result()
+            if indisponible.is_set():
+                return None
+
+            t0 = time.perf_counter()
+            img_stream = BytesIO(img_bytes) if img_bytes is not None else None
+            with profiling.span("slide.add", slide=slide_num):
+                stamper.add_slide(s['titre'], s['points'], image_stream=img_stream, **_tailles(s))
+            t_assemblage = time.perf_counter() - t0
+
+            etapes = dict(timings.get(prompt, {}), assemblage=t_assemblage)
+            if stage_callback:
+                for etape, secondes in etapes.items():
+                    stage_callback(slide_num, etape, secondes)
+            # Mise à jour barre de progression UI (une fois par slide)
+            if progress_callback:
+                detail = ", ".join(f"{etape} {secondes:.2f}s" for etape, secondes in etapes.items())
+                texte = f"Traitement visuel {slide_num}/{total} : {(s.get('visuel') or '')[:30]}... ({detail})"
+                progress_callback(slide_num / total, texte)
+    finally:
+        uploads.close()
+        arret.set()
+        producteur.join()
+        encodeur.shutdown(wait=True, cancel_futures=True)
+        # Index du cache écrit une fois par deck (aussi en cas d'annulation)
+        if cache is not None:
+            _flush_disk_cache(cache)
+
+    if len(index):
+        _report_images(rapport, normalize_images, report_callback)
+
+    return _finish(pres, output, compresslevel, store_media, save_callback)
+
+# --- MOTEUR 3 bis : IA PROGRESSIVE ---
+_placeholders = {}
+
+def _ai_placeholder(width, height):
+    """PNG gris « image IA en cours » aux proportions de l'image attendue."""
+    if (width, height) not in _placeholders:
+        from PIL import Image, ImageDraw
+
+        largeur = 384
+        hauteur = max(1, round(largeur * height / width))
+        im = Image.new("RGB", (largeur, hauteur), (225, 228, 232))
+        dessin = ImageDraw.Draw(im)
+        texte = "Image IA en cours..."
+        x0, y0, x1, y1 = dessin.textbbox((0, 0), texte)
+        dessin.text(((largeur - (x1 - x0)) / 2, (hauteur - (y1 - y0)) / 2), texte, fill=(110, 115, 125))
+        buf = BytesIO()
+        im.save(buf, format="PNG", optimize=True)
+        _placeholders[(width, height)] = buf.getvalue()
+    return _placeholders[(width, height)]
+
+@profiling.traced("generate_local_ai_progressive")
+def generate_local_ai_progressive(data_slides, version_callback=None, progress_callback=None, num_steps=30,
+                                  per_slide_images=False, image_files=None, seed=0, width=512, height=512,
+                                  cache=True, batch_size=1, memory_budget_mb=None, profile="final",
+                                  image_format="auto", normalize_images=True, image_dpi=150,
+                                  report_callback=None, autofit=True, min_interval=5.0,
+                                  output=None, compresslevel=6, store_media=True, save_callback=None):
+    """Variante progressive de generate_local_ai : le deck est utilisable tout de suite.
+
+    1. Le deck complet (texte, images uploadées, images IA déjà en cache) est
+       construit sans charger le modèle ; chaque image IA manquante y est
+       remplacée par un emplacement provisoire aux bonnes proportions. Cette
+       première version est passée à `version_callback(pptx, faites, total)`
+       (même délai que le mode Texte Seul).
+    2. Les images manquantes sont ensuite générées par lots et remplacent
+       leurs emplacements (SlideStamper.replace_picture) ; une nouvelle
+       version est publiée au plus toutes les `min_interval` secondes.
+    3. Le deck final est retourné (comme generate_local_ai). Si le pipeline
+       est indisponible, les emplacements restants sont retirés.
+
+    Les autres paramètres sont ceux de generate_local_ai ; `progress_callback`
+    suit la génération des images (et sert de point d'annulation).
+    """
+    if cache is True:
+        from image_cache import get_ai_cache
+        cache = get_ai_cache()
+    elif cache is False:
+        cache = None
+
+    params = resolve_ai_profile(profile, num_steps, width, height)
+    if batch_size == "auto":
+        batch_size = auto_batch_size(params["width"], params["height"], memory_budget_mb)
+    batch_size = max(1, batch_size)
+
+    pres = init_presentation("Présentation AI", "Génération Locale Mac Silicon")
+    stamper = SlideStamper(pres)
+    index = ImageSourceIndex(image_files)
+
+    avec_image = [(i + 1) in index or (bool(s.get('visuel')) and (per_slide_images or i == 0))
+                  for i, s in enumerate(data_slides)]
+    data_slides, origines = fit_deck(data_slides, avec_image, autofit)
+    if origines != list(range(1, len(data_slides) + 1)):
+        index = index.remap(origines)
+
+    # Plan et images déjà en cache (comme generate_local_ai)
     total = len(data_slides)
+    prompts_slides = [None] * total
     for i, s in enumerate(data_slides):
-        prompt = s.get('visuel', '') # Ici 'visuel' contient le prompt
-        slide_num = i + 1
+        prompt = s.get('visuel', '')
+        if (i + 1) not in index and prompt and (per_slide_images or i == 0):
+            prompts_slides[i] = prompt
+    gen = {"num_steps": params["num_steps"], "seed": seed, "width": params["width"], "height": params["height"],
+           "scheduler": params["scheduler"], "output_size": params["output_size"]}
+    keys, pretes = {}, {}
+    with profiling.span("ai.cache_lookup"):
+        for prompt in dict.fromkeys(p for p in prompts_slides if p):
+            if cache is not None:
+                keys[prompt] = _ai_cache_key(cache, prompt, image_format=image_format, **gen)
+                data = cache.get(keys[prompt])
+                if data is not None:
+                    pretes[prompt] = data
+    manquants = [p for p in dict.fromkeys(p for p in prompts_slides if p) if p not in pretes]
+    a_remplacer = set(manquants)
+    profiling.count("ai.cache_hits", len(pretes))
+
+    # 1) Deck immédiat, avec un emplacement provisoire par image IA manquante
+    attente = _ai_placeholder(*(params["output_size"] or (params["width"], params["height"])))
+    emplacements = {}   # prompt -> photos provisoires à remplacer
+    rapport = {}
+    uploads = iter_slide_images(index, total, normalize_images, image_dpi, report=rapport)
+    try:
+        for i, (s, (slide_num, img_bytes)) in enumerate(zip(data_slides, uploads)):
+            prompt = prompts_slides[i]
+            if prompt is not None:
+                img_bytes = pretes.get(prompt, attente)
+            img_stream = BytesIO(img_bytes) if img_bytes is not None else None
+            with profiling.span("slide.add", slide=slide_num):
+                slide = stamper.add_slide(s['titre'], s['points'], image_stream=img_stream, **_tailles(s))
+            if prompt in a_remplacer:
+                emplacements.setdefault(prompt, []).append(slide.shapes[-1])
+    finally:
+        uploads.close()
+    if len(index):
+        _report_images(rapport, normalize_images, report_callback)
+
+    publication = {"derniere": 0.0}
 
-        # Mise à jour barre de progression UI
-        if progress_callback:
-            progress_callback(i / total, f"Traitement visuel {i+1}/{total} : {prompt[:30]}...")
+    def _publier(faites):
+        if version_callback is None:
+            return
+        with profiling.span("ai.publish", images=faites):
+            version, _ = save_presentation(pres, None, compresslevel, store_media)
+        version_callback(version, faites, len(manquants))
+        publication["derniere"] = time.monotonic()
 
-        img_stream = None
+    _publier(0)
+    if progress_callback:
+        progress_callback(0.0, f"Deck texte prêt ; {len(manquants)} image(s) IA à générer")
 
-        # 1) Priorité à une image uploadée pour ce numéro de slide
-        img_bytes = image_map.get(slide_num)
-        if img_bytes is not None:
+    # 2) Images manquantes, lot par lot, dans leurs emplacements
+    faites = 0
+    try:
+        for debut in range(0, len(manquants), batch_size):
+            lot = manquants[debut:debut + batch_size]
+            backend = None
             try:
-                img_stream = BytesIO(img_bytes)
+                with _ai_pipeline() as (pipe, backend):
+                    images = render_ai_images(lot, gen["num_steps"], seed, gen["width"], gen["height"],
+                                              pipe=pipe, scheduler=gen["scheduler"],
+                                              output_size=gen["output_size"]) if pipe else None
             except Exception as e:
-                print(f"Erreur lecture image uploadée pour la slide {slide_num}: {e}")
-
-        # 2) Sinon, on génère via IA selon la config
-        elif prompt:
-            doit_generer = False
-            if per_slide_images:
-                doit_generer = True
-            elif (not per_slide_images) and i == 0:
-                doit_generer = True
-
-            if doit_generer:
-                try:
-                    image = pipe(prompt, num_inference_steps=num_steps).images[0]
-                    img_stream = BytesIO()
-                    image.save(img_stream, format="PNG")
-                    img_stream.seek(0)
-                except Exception as e:
-                    print(f"Erreur génération image IA pour la slide {slide_num}: {e}")
-
-        add_slide_layout(pres, s['titre'], s['points'], image_stream=img_stream)
-
-    buffer = BytesIO()
-    pres.save(buffer)
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+                print(f"Erreur génération images IA ({len(lot)} prompts) : {e}")
+                images = [None] * len(lot)
+            if images is None:
+                print("Pipeline IA indisponible : le deck est livré sans les images IA manquantes")
+                break
+            for prompt, image in zip(lot, images):
+                data = None
+                if image is not None:
+                    try:
+                        with profiling.span("ai.encode", format=image_format):
+                            data = encode_image(image, image_format)
+                        if cache is not None:
+                            cle = _ai_cache_key(cache, prompt, image_format=image_format,
+                                                backend=backend, **gen)
+                            cache.put(cle, data, meta={"prompt": prompt[:200]})
+                    except Exception as e:
+                        print(f"Erreur encodage image IA '{prompt[:30]}' : {e}")
+                with profiling.span("ai.patch", slides=len(emplacements[prompt])):
+                    for photo in emplacements.pop(prompt):
+                        if data is not None:
+                            stamper.replace_picture(photo, data)
+                        else:
+                            stamper.remove_picture(photo)
+            faites += len(lot)
+            if progress_callback:
+                progress_callback(faites / len(manquants), f"Images IA {faites}/{len(manquants)}")
+            if faites < len(manquants) and time.monotonic() - publication["derniere"] >= min_interval:
+                _publier(faites)
+    finally:
+        # Index du cache écrit une fois par deck (aussi en cas d'annulation)
+        if cache is not None:
+            _flush_disk_cache(cache)
+
+    # 3) Emplacements jamais remplis (pipeline indisponible) : retirés du deck final
+    for photos in emplacements.values():
+        for photo in photos:
+            stamper.remove_picture(photo)
+    return _finish(pres, output, compresslevel, store_media, save_callback)
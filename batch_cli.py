@@ -0,0 +1,272 @@
+"""
+Génération en lot (sans interface)
+----------------------------------
+Rend tous les decks d'un dossier ou d'un manifeste avec backend_engines,
+sur un pool de processus.
+
+    python batch_cli.py decks/ -o sorties/ -j 4
+    python batch_cli.py manifeste.json --summary resume.json
+
+- Dossier : chaque fichier `*.txt` / `*.md` au format TITRE / POINTS / VISUEL
+  est un deck ; ses images sont dans le dossier du même nom s'il existe
+  (`cours1.txt` -> `cours1/1 campus.jpg`, `cours1/2 amphi.png` ...).
+- Manifeste JSON : liste de {"input", "images" (optionnel), "output"
+  (optionnel), "engine" (optionnel)} ; chemins relatifs au manifeste.
+- Reprise : l'empreinte de chaque deck (texte, images, options) est notée
+  dans `<sortie>/.pptx_batch_state.json` ; un deck inchangé dont le .pptx
+  existe encore n'est pas régénéré (`--force` pour tout refaire).
+- Un résumé JSON (durées par deck) est écrit à la fin (`--summary`).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+STATE_FILE = ".pptx_batch_state.json"
+OUTLINE_EXTENSIONS = (".txt", ".md")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".webp")
+ENGINES = ("text", "web", "ai")
+
+
+# --- DÉCOUVERTE DES DECKS ---
+def _images_in(folder):
+    if not folder or not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                  if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def discover_decks(source, output_dir, engine="text"):
+    """Liste des decks à rendre : dicts {name, input, images, output, engine}."""
+    decks = []
+    if os.path.isdir(source):
+        for f in sorted(os.listdir(source)):
+            stem, ext = os.path.splitext(f)
+            if ext.lower() not in OUTLINE_EXTENSIONS:
+                continue
+            decks.append({
+                "name": stem,
+                "input": os.path.join(source, f),
+                "images": _images_in(os.path.join(source, stem)),
+                "output": os.path.join(output_dir, stem + ".pptx"),
+                "engine": engine,
+            })
+        return decks
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf-8") as f:
+        manifeste = json.load(f)
+    for entry in manifeste:
+        chemin = os.path.join(base, entry["input"])
+        stem = os.path.splitext(os.path.basename(chemin))[0]
+        images = entry.get("images")
+        if isinstance(images, str):
+            images = _images_in(os.path.join(base, images))
+        else:
+            images = [os.path.join(base, p) for p in images or []]
+        sortie = entry.get("output")
+        decks.append({
+            "name": entry.get("name", stem),
+            "input": chemin,
+            "images": images,
+            "output": os.path.join(base, sortie) if sortie else os.path.join(output_dir, stem + ".pptx"),
+            "engine": entry.get("engine", engine),
+        })
+    return decks
+
+
+def fingerprint(deck, options):
+    """Empreinte d'un deck : contenu du texte, images (nom, taille, date) et options.
+
+    Les images ne sont pas relues : une modification change leur taille ou
+    leur date, ce qui suffit pour décider de régénérer.
+    """
+    h = hashlib.sha256()
+    with open(deck["input"], "rb") as f:
+        for bloc in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloc)
+    for chemin in deck["images"]:
+        st = os.stat(chemin)
+        h.update(f"{os.path.basename(chemin)}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+    h.update(json.dumps({"engine": deck["engine"], **options}, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+# --- RENDU (PROCESSUS DE TRAVAIL) ---
+def render_deck(deck, options):
+    """Rend un deck ; exécuté dans un processus du pool. Retourne ses mesures."""
+    import backend_engines as engine
+    from slide_parser import parse_slides
+
+    mesures = {"name": deck["name"], "input": deck["input"], "output": deck["output"]}
+    t0 = time.perf_counter()
+    try:
+        with open(deck["input"], "rb") as f:
+            data, diagnostics = parse_slides(f)
+        mesures["slides"] = len(data)
+        mesures["diagnostics"] = len(diagnostics)
+        mesures["parse_seconds"] = round(time.perf_counter() - t0, 4)
+
+        # Écriture dans un fichier temporaire puis renommage : un .pptx présent
+        # est toujours complet, même si le lot est interrompu
+        os.makedirs(os.path.dirname(os.path.abspath(deck["output"])), exist_ok=True)
+        tmp = deck["output"] + ".part"
+        sauvegarde = {}
+        commun = {"output": tmp, "compresslevel": options["compresslevel"],
+                  "autofit": options.get("autofit", True), "save_callback": sauvegarde.update}
+        t1 = time.perf_counter()
+        if deck["engine"] == "web":
+            resultat = engine.generate_web_images(data, **commun)
+        elif deck["engine"] == "ai":
+            resultat = engine.generate_local_ai(data, per_slide_images=True, image_files=deck["images"],
+                                                profile=options["profile"],
+                                                normalize_images=options["normalize"],
+                                                image_dpi=options["dpi"],
+                                                report_callback=lambda r: None, **commun)
+        else:
+            resultat = engine.generate_text_only(data, image_files=deck["images"],
+                                                 normalize_images=options["normalize"],
+                                                 image_dpi=options["dpi"], slide_cache=False,
+                                                 report_callback=lambda r: None, **commun)
+        if resultat is None:
+            raise RuntimeError("moteur indisponible (pipeline IA non chargé ?)")
+        os.replace(tmp, deck["output"])
+        mesures["render_seconds"] = round(time.perf_counter() - t1, 4)
+        mesures["bytes"] = sauvegarde.get("octets")
+        mesures["status"] = "ok"
+    except Exception as e:
+        if os.path.exists(deck["output"] + ".part"):
+            os.remove(deck["output"] + ".part")
+        mesures["status"] = "error"
+        mesures["error"] = f"{type(e).__name__}: {e}"
+    mesures["seconds"] = round(time.perf_counter() - t0, 4)
+    return mesures
+
+
+# --- ÉTAT DE REPRISE ---
+def _load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path, state):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def run_batch(decks, options, jobs=None, force=False, state_path=None, progress=print):
+    """Rend `decks` avec au plus `jobs` processus ; retourne le résumé (dict)."""
+    t0 = time.perf_counter()
+    state = {} if state_path is None else _load_state(state_path)
+    resultats = []
+    a_rendre = []
+    for deck in decks:
+        try:
+            empreinte = fingerprint(deck, options)
+        except OSError as e:
+            resultats.append({"name": deck["name"], "input": deck["input"], "output": deck["output"],
+                              "status": "error", "error": f"{type(e).__name__}: {e}", "seconds": 0.0})
+            continue
+        cle = os.path.abspath(deck["output"])
+        if not force and state.get(cle) == empreinte and os.path.exists(deck["output"]):
+            resultats.append({"name": deck["name"], "input": deck["input"], "output": deck["output"],
+                              "status": "skipped", "seconds": 0.0})
+            continue
+        a_rendre.append((deck, cle, empreinte))
+
+    # Un seul modèle Stable Diffusion tient en mémoire : les decks IA passent
+    # par un processus unique, les autres se partagent `jobs` processus
+    groupes = [
+        ([d for d in a_rendre if d[0]["engine"] != "ai"], jobs),
+        ([d for d in a_rendre if d[0]["engine"] == "ai"], 1),
+    ]
+    total = len(a_rendre)
+    faits = 0
+    for groupe, workers in groupes:
+        if not groupe:
+            continue
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(groupe))) as pool:
+            futures = {pool.submit(render_deck, deck, options): (cle, empreinte)
+                       for deck, cle, empreinte in groupe}
+            for future in as_completed(futures):
+                mesures = future.result()
+                cle, empreinte = futures[future]
+                faits += 1
+                resultats.append(mesures)
+                if mesures["status"] == "ok":
+                    state[cle] = empreinte
+                    if state_path is not None:
+                        _save_state(state_path, state)
+                    progress(f"[{faits}/{total}] {mesures['name']} : {mesures['slides']} slides "
+                             f"en {mesures['seconds']:.2f}s")
+                else:
+                    state.pop(cle, None)
+                    progress(f"[{faits}/{total}] {mesures['name']} : ERREUR {mesures['error']}")
+
+    ordre = {d["output"]: i for i, d in enumerate(decks)}
+    resultats.sort(key=lambda m: ordre.get(m["output"], len(ordre)))
+    compte = {s: sum(1 for m in resultats if m["status"] == s) for s in ("ok", "skipped", "error")}
+    return {
+        "jobs": jobs or os.cpu_count() or 1,
+        "options": options,
+        "total_seconds": round(time.perf_counter() - t0, 4),
+        **compte,
+        "decks": resultats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère des présentations .pptx en lot.")
+    parser.add_argument("source", help="dossier de fichiers .txt/.md, ou manifeste .json")
+    parser.add_argument("-o", "--output-dir", default="sorties_pptx", help="dossier de sortie")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="nombre maximal de decks rendus en parallèle (défaut : nombre de cœurs)")
+    parser.add_argument("--engine", choices=ENGINES, default="text", help="moteur par défaut")
+    parser.add_argument("--force", action="store_true", help="régénère même les decks inchangés")
+    parser.add_argument("--summary", default=None,
+                        help="résumé JSON (défaut : <sortie>/batch_summary.json, '-' pour stdout)")
+    parser.add_argument("--no-normalize", action="store_true", help="images embarquées telles quelles")
+    parser.add_argument("--no-autofit", action="store_true",
+                        help="ni réduction de police ni découpage des slides trop chargées")
+    parser.add_argument("--dpi", type=int, default=150, help="résolution cible des images")
+    parser.add_argument("--compresslevel", type=int, default=6, help="compression zip (0-9)")
+    parser.add_argument("--profile", default="final", help="profil IA (final, draft)")
+    args = parser.parse_args(argv)
+
+    decks = discover_decks(args.source, args.output_dir, args.engine)
+    if not decks:
+        print(f"Aucun deck trouvé dans {args.source}")
+        return 1
+    options = {"normalize": not args.no_normalize, "dpi": args.dpi,
+               "compresslevel": args.compresslevel, "profile": args.profile,
+               "autofit": not args.no_autofit}
+    # Avec `--summary -`, stdout est réservé au JSON : la progression passe sur stderr
+    progress = (lambda m: print(m, file=sys.stderr)) if args.summary == "-" else print
+    resume = run_batch(decks, options, jobs=args.jobs, force=args.force,
+                       state_path=os.path.join(args.output_dir, STATE_FILE), progress=progress)
+
+    texte = json.dumps(resume, indent=2, ensure_ascii=False)
+    if args.summary == "-":
+        print(texte)
+    else:
+        chemin = args.summary or os.path.join(args.output_dir, "batch_summary.json")
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+        with open(chemin, "w", encoding="utf-8") as f:
+            f.write(texte)
+        print(f"{resume['ok']} générés, {resume['skipped']} inchangés, {resume['error']} en erreur "
+              f"en {resume['total_seconds']:.1f}s -> {chemin}")
+    return 1 if resume["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,532 @@
+"""
+Benchmarks des moteurs de génération
+------------------------------------
+Decks synthétiques (nombre de slides, longueur des puces, taille des images
+variables) passés dans chaque étape :
+
+- parse_input_text (slide_parser),
+- add_slide_layout (chemin python-pptx) et SlideStamper.add_slide,
+- generate_text_only (sans / avec images, cache de slides, lots parallèles),
+- generate_web_images contre un serveur d'images local qui injecte de la latence,
+  puis contre des réponses hostiles (HTML, corps sans fin, Content-Length
+  énorme, bombe de pixels) : seules les vraies images doivent être gardées,
+- generate_local_ai avec un pipeline factice (batch 1 vs 4) ; `--real-ai`
+  ajoute les vrais backends (AI_BACKENDS) si torch et diffusers sont installés.
+
+Chaque cas tourne dans un processus neuf : durée (médiane des répétitions),
+slides/s, pic de mémoire (RSS) et taille du .pptx. Les résultats sont comparés
+à une référence enregistrée ; toute dégradation au-delà de la tolérance est
+signalée (code de sortie 1). Un cas en erreur (exception, vérification
+échouée) donne aussi le code de sortie 1, avec ou sans référence.
+
+    python bench_engines.py --save-baseline        # enregistre la référence
+    python bench_engines.py                        # compare à la référence
+    python bench_engines.py --only text,web --repeats 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import multiprocessing
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+# Tolérances par défaut avant de signaler une régression (fraction de la référence)
+TOLERANCES = {"seconds": 0.15, "peak_rss_mb": 0.20, "output_bytes": 0.02}
+# En dessous de cet écart absolu, une durée est considérée comme du bruit
+MIN_DELTA_SECONDS = 0.005
+
+
+# --- DONNÉES SYNTHÉTIQUES ---
+def synthetic_slides(n_slides, bullets=4, bullet_words=8, visuel=""):
+    mots = ("marché", "stratégie", "client", "croissance", "analyse", "innovation", "coût", "réseau")
+    return [{
+        "titre": f"Slide {i} - {mots[i % len(mots)].capitalize()}",
+        "points": [" ".join(mots[(i + j + k) % len(mots)] for k in range(bullet_words)) for j in range(bullets)],
+        "visuel": visuel.format(i=i) if visuel else "",
+    } for i in range(1, n_slides + 1)]
+
+
+def synthetic_outline(n_slides, bullet_words=8):
+    lignes = []
+    for s in synthetic_slides(n_slides, bullet_words=bullet_words):
+        lignes.append(f"TITRE: {s['titre']}")
+        lignes.append("POINTS:")
+        lignes.extend(f"- {p}" for p in s["points"])
+        lignes.append(f"VISUEL: illustration {s['titre']}\n")
+    return "\n".join(lignes)
+
+
+def synthetic_jpeg(width, height, seed=0):
+    """JPEG bruité (se compresse comme une photo, pas comme un aplat)."""
+    from PIL import Image
+
+    bruit = Image.effect_noise((width, height), 48 + seed % 16).convert("RGB")
+    teinte = Image.new("RGB", (width, height), (seed * 37 % 255, 110, 160))
+    buf = BytesIO()
+    Image.blend(bruit, teinte, 0.5).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def synthetic_uploads(n_images, width, height):
+    """Fichiers en mémoire nommés comme des uploads ("1 bench.jpg", ...)."""
+    uploads = []
+    for i in range(1, n_images + 1):
+        f = BytesIO(synthetic_jpeg(width, height, seed=i))
+        f.name = f"{i} bench.jpg"
+        uploads.append(f)
+    return uploads
+
+
+# --- CAS DE MESURE ---
+# Chaque cas prépare ses données (hors chronométrage) puis retourne une
+# fonction run() -> (slides, octets du .pptx ou None, mesures supplémentaires)
+
+def case_parse(n_slides, bullet_words):
+    import slide_parser
+
+    texte = synthetic_outline(n_slides, bullet_words)
+
+    def run():
+        slide_parser._memo.clear()   # on mesure le parsing, pas la mémoïsation
+        return len(slide_parser.parse_input_text(texte)), None, {"input_bytes": len(texte.encode("utf-8"))}
+    return run
+
+
+def case_add_slide(n_slides, bullet_words, stamper):
+    import backend_engines as engine
+
+    data = synthetic_slides(n_slides, bullet_words=bullet_words)
+
+    def run():
+        pres = engine.init_presentation("Bench", "add_slide")
+        if stamper:
+            ajouter = engine.SlideStamper(pres).add_slide
+        else:
+            ajouter = lambda titre, points: engine.add_slide_layout(pres, titre, points)
+        for s in data:
+            ajouter(s["titre"], s["points"])
+        sortie, _ = engine.save_presentation(pres)
+        return n_slides, len(sortie.getvalue()), {}
+    return run
+
+
+def case_text(n_slides, n_images=0, image_size=(1600, 1200), processes=1, incremental=False):
+    import backend_engines as engine
+    from image_cache import SlideRenderCache
+
+    data = synthetic_slides(n_slides)
+    uploads = synthetic_uploads(n_images, *image_size)
+    cache = SlideRenderCache() if incremental else False
+    if incremental:
+        # Cache rempli au préalable : chaque run modifie une seule slide
+        engine.generate_text_only(data, image_files=uploads, slide_cache=cache, report_callback=lambda r: None)
+    compteur = [0]
+
+    def run():
+        if incremental:
+            compteur[0] += 1
+            i = compteur[0] % n_slides
+            data[i] = dict(data[i], points=data[i]["points"] + [f"modification {compteur[0]}"])
+        sortie = engine.generate_text_only(data, image_files=uploads, processes=processes,
+                                           slide_cache=cache, report_callback=lambda r: None)
+        return n_slides, len(sortie.getvalue()), {}
+    return run
+
+
+class _LatencyImageServer:
+    """Serveur HTTP local : renvoie la même image après `latency_ms` de délai."""
+
+    def __init__(self, image, latency_ms):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        serveur = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(serveur.latency_ms / 1000)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(serveur.image)))
+                self.end_headers()
+                self.wfile.write(serveur.image)
+
+            def log_message(self, *args):
+                pass
+
+        self.image = image
+        self.latency_ms = latency_ms
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+
+def _png_bomb(width=60000, height=60000):
+    """PNG de quelques centaines d'octets annonçant width x height pixels."""
+    import struct
+    import zlib
+
+    def chunk(nom, data):
+        return struct.pack(">I", len(data)) + nom + data + struct.pack(">I", zlib.crc32(nom + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"\0" * 1024))
+            + chunk(b"IEND", b""))
+
+
+class _HostileImageServer:
+    """Serveur HTTP local : une vraie image sur /ok/..., des réponses hostiles ailleurs."""
+
+    KINDS = ("ok", "html", "fake_jpeg", "huge_length", "endless", "bomb")
+    # Hors KINDS (trop lent pour le bench, refusé au bout de `max_seconds`) :
+    # testé dans tests/test_web_hostile.py avec un `max_seconds` court
+    SLOW = "slow"
+
+    def __init__(self, image):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        bombe = _png_bomb()
+
+        class Handler(BaseHTTPRequestHandler):
+            def _envoyer(self, corps, content_type, longueur=None):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(corps) if longueur is None else longueur))
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def do_GET(self):
+                kind = self.path.split("/")[1]
+                try:
+                    if kind == "ok":
+                        self._envoyer(image, "image/jpeg")
+                    elif kind == "html":
+                        self._envoyer(b"<html><body>Not found</body></html>" * 50, "text/html")
+                    elif kind == "fake_jpeg":
+                        self._envoyer(b"<html>" + b"x" * 100_000, "image/jpeg")
+                    elif kind == "huge_length":
+                        self._envoyer(image[:4096], "image/jpeg", longueur=10 ** 10)
+                    elif kind == "endless":
+                        # Vrai début de JPEG, puis un flux sans fin ni Content-Length
+                        self.send_response(200)
+                        self.send_header("Content-Type", "image/jpeg")
+                        self.end_headers()
+                        self.wfile.write(image[:4096])
+                        while True:
+                            self.wfile.write(b"\0" * 65536)
+                    elif kind == "bomb":
+                        self._envoyer(bombe, "image/png")
+                    elif kind == "slow":
+                        # Serveur qui goutte : un octet toutes les 50 ms, sans fin
+                        self.send_response(200)
+                        self.send_header("Content-Type", "image/jpeg")
+                        self.end_headers()
+                        self.wfile.write(image[:1024])
+                        while True:
+                            self.wfile.write(b"\0")
+                            self.wfile.flush()
+                            time.sleep(0.05)
+                    else:
+                        self.send_error(404)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+
+def case_web_hostile(n_slides, image_size=(1200, 900)):
+    import backend_engines as engine
+
+    serveur = _HostileImageServer(synthetic_jpeg(*image_size))
+    compteur = [0]
+
+    def run():
+        compteur[0] += 1
+        kinds = _HostileImageServer.KINDS
+        data = synthetic_slides(n_slides)
+        for i, s in enumerate(data):
+            s["visuel"] = f"{serveur.url}/{kinds[i % len(kinds)]}/{compteur[0]}/{i}"
+        contenus = engine.fetch_web_images([s["visuel"] for s in data], cache=False)
+        gardees = sum(1 for c in contenus if c is not None)
+        attendues = sum(1 for s in data if "/ok/" in s["visuel"])
+        if gardees != attendues:
+            raise AssertionError(f"{gardees} images gardées, {attendues} attendues")
+        sortie = engine.generate_web_images(data)
+        return n_slides, len(sortie.getvalue()), {"images_kept": gardees}
+    return run
+
+
+def case_web(n_slides, latency_ms, image_size=(1200, 900)):
+    import backend_engines as engine
+
+    serveur = _LatencyImageServer(synthetic_jpeg(*image_size), latency_ms)
+    compteur = [0]
+
+    def run():
+        # URLs nouvelles à chaque run : on mesure le téléchargement, pas le cache
+        compteur[0] += 1
+        data = synthetic_slides(n_slides, visuel=f"{serveur.url}/img/{compteur[0]}/{{i}}.jpg")
+        sortie = engine.generate_web_images(data)
+        return n_slides, len(sortie.getvalue()), {"latency_ms": latency_ms}
+    return run
+
+
+class StubPipeline:
+    """Pipeline factice : coût fixe par appel et par image à chaque pas, images bruitées."""
+
+    def __init__(self, ms_per_call_step=4.0, ms_per_image_step=2.0):
+        self.ms_per_call_step = ms_per_call_step
+        self.ms_per_image_step = ms_per_image_step
+        self.scheduler = types.SimpleNamespace(config={})
+
+    def __call__(self, prompt, num_inference_steps, generator, width, height):
+        from PIL import Image
+
+        prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+        time.sleep(num_inference_steps * (self.ms_per_call_step + self.ms_per_image_step * len(prompts)) / 1000)
+        images = [Image.effect_noise((width, height), 40).convert("RGB") for _ in prompts]
+        return types.SimpleNamespace(images=images)
+
+
+def _torch_or_shim():
+    """torch si installé ; sinon un module minimal (Generator) suffisant pour le pipeline factice."""
+    try:
+        import torch
+        return "torch"
+    except ImportError:
+        shim = types.ModuleType("torch")
+
+        class Generator:
+            def __init__(self, device="cpu"):
+                self.device = device
+
+            def manual_seed(self, seed):
+                self.seed = seed
+                return self
+
+        shim.Generator = Generator
+        sys.modules["torch"] = shim
+        return "stub"
+
+
+def case_ai_stub(n_slides, batch_size, num_steps=20, size=256):
+    import backend_engines as engine
+
+    torch_mode = _torch_or_shim()
+    engine._pipe_cache, engine._pipe_backend, engine._pipe_requested = StubPipeline(), "default", engine.AI_BACKEND
+    compteur = [0]
+
+    def run():
+        compteur[0] += 1
+        data = synthetic_slides(n_slides, visuel=f"prompt {compteur[0]} slide {{i}}")
+        sortie = engine.generate_local_ai(data, num_steps=num_steps, per_slide_images=True, cache=False,
+                                          width=size, height=size, batch_size=batch_size)
+        return n_slides, len(sortie.getvalue()), {"images": n_slides, "torch": torch_mode}
+    return run
+
+
+def case_ai_real(backend, n_images=4, num_steps=10, size=256):
+    import backend_engines as engine
+
+    # Backend réellement chargé (un backend accéléré en échec retombe sur "default")
+    pipe, charge = engine._get_ai_pipeline(backend)
+    if pipe is None:
+        raise RuntimeError("pipeline IA indisponible")
+    engine.render_ai_images(["warm-up"], num_steps=2, width=size, height=size, pipe=pipe)
+    compteur = [0]
+
+    def run():
+        compteur[0] += 1
+        prompts = [f"photo d'un campus, variante {compteur[0]}-{i}" for i in range(n_images)]
+        engine.render_ai_images(prompts, num_steps=num_steps, width=size, height=size, pipe=pipe)
+        return n_images, None, {"images": n_images, "backend": charge}
+    return run
+
+
+CASES = {
+    "parse/1k_short": (case_parse, {"n_slides": 1000, "bullet_words": 4}),
+    "parse/10k_long": (case_parse, {"n_slides": 10000, "bullet_words": 30}),
+    "add_slide/layout_500": (case_add_slide, {"n_slides": 500, "bullet_words": 8, "stamper": False}),
+    "add_slide/stamper_500": (case_add_slide, {"n_slides": 500, "bullet_words": 8, "stamper": True}),
+    "add_slide/stamper_5000": (case_add_slide, {"n_slides": 5000, "bullet_words": 8, "stamper": True}),
+    "text/200_no_images": (case_text, {"n_slides": 200}),
+    "text/200_20_small_images": (case_text, {"n_slides": 200, "n_images": 20, "image_size": (800, 600)}),
+    "text/200_20_large_images": (case_text, {"n_slides": 200, "n_images": 20, "image_size": (4000, 3000)}),
+    "text/2000_processes_2": (case_text, {"n_slides": 2000, "processes": 2}),
+    "text/2000_incremental": (case_text, {"n_slides": 2000, "n_images": 20, "incremental": True}),
+    "web/50_latency_50ms": (case_web, {"n_slides": 50, "latency_ms": 50}),
+    "web/50_latency_300ms": (case_web, {"n_slides": 50, "latency_ms": 300}),
+    "web/60_hostile_payloads": (case_web_hostile, {"n_slides": 60}),
+    "ai_stub/24_batch_1": (case_ai_stub, {"n_slides": 24, "batch_size": 1}),
+    "ai_stub/24_batch_4": (case_ai_stub, {"n_slides": 24, "batch_size": 4}),
+}
+
+
+def real_ai_cases():
+    from backend_engines import AI_BACKENDS
+    return {f"ai_real/{backend}": (case_ai_real, {"backend": backend}) for backend in AI_BACKENDS}
+
+
+# --- EXÉCUTION ---
+def execute_case(name, fn, params, repeats):
+    """Exécute un cas dans le processus courant (appelé dans un processus neuf)."""
+    # Caches disque isolés : un run ne profite jamais du précédent benchmark
+    os.environ["PPTX_CACHE_DIR"] = tempfile.mkdtemp(prefix="pptx_bench_")
+    import backend_engines as engine
+
+    run = fn(**params)
+    run()   # chauffe : imports, premiers allocations
+    durees = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        slides, octets, extra = run()
+        durees.append(time.perf_counter() - t0)
+    secondes = statistics.median(durees)
+    resultat = {
+        "seconds": round(secondes, 4),
+        "min_seconds": round(min(durees), 4),
+        "slides": slides,
+        "slides_per_s": round(slides / secondes, 1) if secondes else None,
+        "peak_rss_mb": round(engine._peak_rss_mb() or 0, 1),
+        "output_bytes": octets,
+    }
+    if "images" in extra:
+        resultat["images_per_min"] = round(extra.pop("images") / secondes * 60, 1)
+        resultat["seconds_per_image"] = round(secondes * 60 / resultat["images_per_min"], 3)
+    resultat.update(extra)
+    return resultat
+
+
+def run_cases(cases, repeats=3, progress=print):
+    resultats = {}
+    contexte = multiprocessing.get_context("spawn")
+    for name, (fn, params) in cases.items():
+        # Processus neuf par cas : le pic RSS mesuré est celui du cas seul
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexte) as pool:
+            try:
+                resultats[name] = pool.submit(execute_case, name, fn, params, repeats).result()
+            except Exception as e:
+                resultats[name] = {"error": f"{type(e).__name__}: {e}"}
+        progress(_ligne(name, resultats[name]))
+    return resultats
+
+
+# --- RÉFÉRENCE ET RÉGRESSIONS ---
+def machine_info():
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count()}
+
+
+def compare(resultats, baseline, tolerances=TOLERANCES):
+    """Liste des régressions (cas, métrique, référence, mesure, ratio)."""
+    regressions = []
+    reference = baseline.get("cases", {})
+    for name, r in resultats.items():
+        b = reference.get(name)
+        if not b or "error" in r or "error" in b:
+            continue
+        for metrique, tolerance in tolerances.items():
+            avant, apres = b.get(metrique), r.get(metrique)
+            if metrique == "seconds" and apres is not None and avant is not None \
+                    and apres - avant < MIN_DELTA_SECONDS:
+                continue
+            if avant and apres and apres > avant * (1 + tolerance):
+                regressions.append({"case": name, "metric": metrique, "baseline": avant,
+                                    "current": apres, "ratio": round(apres / avant, 3)})
+    return regressions
+
+
+def _ligne(name, r):
+    if "error" in r:
+        return f"{name:<28} ERREUR {r['error']}"
+    taille = f"{r['output_bytes'] / 1e6:7.2f} Mo" if r.get("output_bytes") else "      -   "
+    vitesse = f"{r['slides_per_s']:>9} sl/s" if r.get("slides_per_s") is not None else ""
+    extra = f"  {r['images_per_min']} img/min" if "images_per_min" in r else ""
+    return f"{name:<28} {r['seconds']:8.3f}s {vitesse}  {r['peak_rss_mb']:7.1f} Mo RSS  {taille}{extra}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks des moteurs de génération.")
+    parser.add_argument("--only", default="", help="filtre(s) sur le nom des cas, séparés par des virgules")
+    parser.add_argument("--repeats", type=int, default=3, help="répétitions par cas (médiane)")
+    parser.add_argument("--real-ai", action="store_true", help="ajoute les vrais backends IA (lent)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="fichier de référence JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="enregistre les mesures comme référence")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"tolérance sur la durée (défaut {TOLERANCES['seconds']:.0%}%)")
+    parser.add_argument("--json", default=None, help="écrit aussi les résultats bruts dans ce fichier")
+    args = parser.parse_args(argv)
+
+    cases = dict(CASES)
+    if args.real_ai:
+        cases.update(real_ai_cases())
+    filtres = [f for f in args.only.split(",") if f]
+    if filtres:
+        cases = {n: c for n, c in cases.items() if any(f in n for f in filtres)}
+
+    print(f"{len(cases)} cas, {args.repeats} répétition(s) ; {machine_info()}")
+    resultats = run_cases(cases, args.repeats)
+    rapport = {"machine": machine_info(), "repeats": args.repeats, "cases": resultats}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2)
+    erreurs = [n for n, r in resultats.items() if "error" in r]
+    if erreurs:
+        print(f"ÉCHEC : {len(erreurs)} cas en erreur ({', '.join(erreurs)})")
+
+    if args.save_baseline:
+        # On complète la référence existante : un run filtré n'efface pas les autres cas
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError):
+            baseline = {"cases": {}}
+        baseline["machine"] = machine_info()
+        baseline["cases"].update({n: r for n, r in resultats.items() if "error" not in r})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Référence enregistrée : {args.baseline}")
+        return 1 if erreurs else 0
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        print(f"Pas de référence ({args.baseline}) : lancer avec --save-baseline pour en créer une.")
+        return 1 if erreurs else 0
+
+    if baseline.get("machine", {}).get("cpus") != os.cpu_count():
+        print("Attention : référence mesurée sur une autre machine, comparaison indicative.")
+    tolerances = dict(TOLERANCES)
+    if args.tolerance is not None:
+        tolerances["seconds"] = args.tolerance
+    regressions = compare(resultats, baseline, tolerances)
+    for r in regressions:
+        print(f"RÉGRESSION {r['case']} : {r['metric']} {r['baseline']} -> {r['current']} (x{r['ratio']})")
+    if not regressions and not erreurs:
+        print("Aucune régression par rapport à la référence.")
+    return 1 if regressions or erreurs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
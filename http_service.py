@@ -0,0 +1,380 @@
+"""
+Service HTTP local de génération (asyncio / aiohttp)
+----------------------------------------------------
+Permet aux autres systèmes internes d'obtenir un .pptx sans passer par
+l'interface Streamlit.
+
+    python http_service.py --port 8765
+
+- `POST /generate/{text|web|ai}` :
+  - JSON : {"slides": [{"titre", "points", "visuel"}, ...], "options": {...}}
+  - ou multipart : champ `slides` (même JSON) ou `outline` (texte TITRE /
+    POINTS / VISUEL), champ `options` (JSON), et des fichiers `images`
+    nommés "1 campus.jpg", "2 amphi.png" ... (mapping par numéro).
+  Réponse : le .pptx, diffusé par blocs depuis un fichier temporaire.
+- `GET /health` : charge de chaque moteur.
+
+Le travail CPU ne tourne jamais dans la boucle asyncio : texte et web sur un
+pool de processus, IA sur un thread unique (un seul modèle en mémoire).
+Contrôle d'admission : au-delà de `limite + file` requêtes en cours pour un
+moteur, la réponse est immédiatement HTTP 429 avec la profondeur de file et
+un en-tête Retry-After. Si un processus du pool meurt (mémoire, crash
+natif), la requête reçoit HTTP 503 et le pool est remplacé pour les suivantes.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from aiohttp import web
+
+PPTX_MIME = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+CHUNK_SIZE = 256 * 1024
+MAX_BODY_BYTES = 256 * 1024 * 1024
+
+# Options transmises aux moteurs ; toute autre clé est refusée (400)
+ENGINE_OPTIONS = {
+    "text": {"normalize_images", "image_dpi", "autofit", "compresslevel", "store_media"},
+    "web": {"max_workers", "deadline", "autofit", "compresslevel", "store_media"},
+    "ai": {"num_steps", "seed", "width", "height", "profile", "per_slide_images", "batch_size",
+           "image_format", "normalize_images", "image_dpi", "autofit", "compresslevel", "store_media"},
+}
+DEFAULT_LIMITS = {"text": os.cpu_count() or 1, "web": 4, "ai": 1}
+DEFAULT_QUEUES = {"text": 32, "web": 16, "ai": 4}
+
+
+# --- RENDU (HORS BOUCLE ASYNCIO) ---
+def render_to_file(engine_name, slides, images, options, path):
+    """Rend le deck dans `path` ; exécuté dans un processus ou un thread de travail.
+
+    `images` : liste de (nom, octets), convertie en fichiers en mémoire nommés
+    comme des uploads. Retourne le rapport de sauvegarde, ou None si le moteur
+    n'a rien produit (pipeline IA indisponible).
+    """
+    import backend_engines as engine
+
+    fichiers = []
+    for nom, data in images:
+        f = BytesIO(data)
+        f.name = nom
+        fichiers.append(f)
+    rapport = {}
+    commun = dict(options, output=path, save_callback=rapport.update)
+    if engine_name == "web":
+        resultat = engine.generate_web_images(slides, **commun)
+    elif engine_name == "ai":
+        resultat = engine.generate_local_ai(slides, image_files=fichiers, report_callback=lambda r: None, **commun)
+    else:
+        resultat = engine.generate_text_only(slides, image_files=fichiers, slide_cache=False,
+                                             report_callback=lambda r: None, **commun)
+    return rapport if resultat is not None else None
+
+
+# --- ADMISSION ---
+class EngineGate:
+    """Compte les requêtes d'un moteur et refuse celles qui dépassent la file."""
+
+    def __init__(self, limit, max_queue):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.served = 0
+        self.rejected = 0
+        self.avg_seconds = None     # moyenne glissante de la durée de rendu
+
+    @property
+    def running(self):
+        return min(self.in_flight, self.limit)
+
+    @property
+    def waiting(self):
+        return max(0, self.in_flight - self.limit)
+
+    def full(self):
+        return self.in_flight >= self.limit + self.max_queue
+
+    def retry_after(self):
+        """Estimation (secondes) du temps avant qu'une place se libère."""
+        moyenne = self.avg_seconds or 1.0
+        return max(1, round(moyenne * (self.waiting + 1) / self.limit))
+
+    def record(self, secondes):
+        self.served += 1
+        self.avg_seconds = secondes if self.avg_seconds is None else 0.8 * self.avg_seconds + 0.2 * secondes
+
+    def state(self):
+        return {"running": self.running, "waiting": self.waiting, "limit": self.limit,
+                "max_queue": self.max_queue, "served": self.served, "rejected": self.rejected,
+                "avg_seconds": round(self.avg_seconds, 3) if self.avg_seconds is not None else None}
+
+
+# --- LECTURE DE LA REQUÊTE ---
+def _json_error(status, message, **extra):
+    return web.json_response({"error": message, **extra}, status=status)
+
+
+def _entier(mini, maxi, multiple=1):
+    def convertir(v):
+        if isinstance(v, str) and v.strip().lstrip("-").isdigit():
+            v = int(v)
+        elif isinstance(v, float) and v.is_integer():
+            v = int(v)
+        if isinstance(v, bool) or not isinstance(v, int):
+            raise ValueError("entier attendu")
+        if not mini <= v <= maxi or v % multiple:
+            raise ValueError(f"entier de {mini} à {maxi}" + (f", multiple de {multiple}" if multiple > 1 else ""))
+        return v
+    return convertir
+
+
+def _reel(mini, maxi):
+    def convertir(v):
+        if isinstance(v, bool) or not isinstance(v, (int, float, str)):
+            raise ValueError("nombre attendu")
+        v = float(v)
+        if not mini <= v <= maxi:
+            raise ValueError(f"nombre de {mini} à {maxi}")
+        return v
+    return convertir
+
+
+def _booleen(v):
+    if isinstance(v, bool):
+        return v
+    if v in (0, 1):
+        return bool(v)
+    if isinstance(v, str) and v.lower() in ("true", "false"):
+        return v.lower() == "true"
+    raise ValueError("booléen attendu")
+
+
+def _choix(*valeurs):
+    def convertir(v):
+        if v not in valeurs:
+            raise ValueError(f"attendu : {', '.join(map(str, valeurs))}")
+        return v
+    return convertir
+
+
+def _entier_ou_auto(mini, maxi):
+    entier = _entier(mini, maxi)
+    return lambda v: v if v == "auto" else entier(v)
+
+
+# Type et bornes de chaque option : une valeur invalide est refusée (400) au
+# lieu d'échouer dans le moteur (500). Profils : backend_engines.AI_PROFILES.
+OPTION_TYPES = {
+    "normalize_images": _booleen,
+    "image_dpi": _entier(36, 600),
+    "autofit": _booleen,
+    "compresslevel": _entier(0, 9),
+    "store_media": _booleen,
+    "max_workers": _entier(1, 64),
+    "deadline": _reel(0.1, 600),
+    "num_steps": _entier(1, 150),
+    "seed": _entier(0, 2 ** 63 - 1),
+    "width": _entier(64, 2048, multiple=8),
+    "height": _entier(64, 2048, multiple=8),
+    "profile": _choix("final", "draft"),
+    "per_slide_images": _booleen,
+    "batch_size": _entier_ou_auto(1, 64),
+    "image_format": _choix("auto", "png", "jpeg"),
+}
+
+
+def _check_options(options, engine_name):
+    """Options du moteur `engine_name`, converties dans leur type ; ValueError si invalides."""
+    options = options or {}
+    if not isinstance(options, dict):
+        raise ValueError("'options' doit être un objet JSON")
+    inconnues = set(options) - ENGINE_OPTIONS[engine_name]
+    if inconnues:
+        raise ValueError(f"options inconnues pour '{engine_name}' : {', '.join(sorted(inconnues))}")
+    propres = {}
+    for nom, valeur in options.items():
+        try:
+            propres[nom] = OPTION_TYPES[nom](valeur)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"option '{nom}' invalide ({valeur!r}) : {e}") from None
+    return propres
+
+
+def _check_slides(slides):
+    if not isinstance(slides, list) or not slides:
+        raise ValueError("'slides' doit être une liste non vide")
+    propres = []
+    for i, s in enumerate(slides, 1):
+        if not isinstance(s, dict) or not isinstance(s.get("titre"), str):
+            raise ValueError(f"slide {i} : 'titre' (texte) obligatoire")
+        points = s.get("points", [])
+        if not isinstance(points, list) or not all(isinstance(p, str) for p in points):
+            raise ValueError(f"slide {i} : 'points' doit être une liste de textes")
+        propres.append({"titre": s["titre"], "points": points, "visuel": str(s.get("visuel") or "")})
+    return propres
+
+
+async def read_request(request, engine_name):
+    """(slides, images, options) depuis un corps JSON ou multipart ; ValueError si invalide."""
+    images = []
+    if request.content_type.startswith("multipart/"):
+        slides = options = None
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == "images" and part.filename:
+                images.append((part.filename, await part.read()))
+            elif part.name == "slides":
+                slides = json.loads(await part.text())
+            elif part.name == "outline":
+                from slide_parser import parse_slides
+                slides, _ = parse_slides(await part.text())
+            elif part.name == "options":
+                options = json.loads(await part.text())
+    else:
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise ValueError("corps JSON attendu : {\"slides\": [...], \"options\": {...}}")
+        slides, options = body.get("slides"), body.get("options")
+
+    return _check_slides(slides), images, _check_options(options, engine_name)
+
+
+# --- ROUTES ---
+async def handle_generate(request):
+    app = request.app
+    engine_name = request.match_info["engine"]
+    if engine_name not in ENGINE_OPTIONS:
+        return _json_error(404, f"moteur inconnu : {engine_name}", engines=sorted(ENGINE_OPTIONS))
+
+    gate = app["gates"][engine_name]
+    # Refus immédiat plutôt qu'une file sans fin : le client sait quand revenir
+    if gate.full():
+        gate.rejected += 1
+        retry = gate.retry_after()
+        return web.json_response({"error": "file pleine, réessayer plus tard", "engine": engine_name,
+                                  "retry_after": retry, **gate.state()},
+                                 status=429, headers={"Retry-After": str(retry)})
+
+    gate.in_flight += 1
+    try:
+        t_recu = time.perf_counter()
+        try:
+            slides, images, options = await read_request(request, engine_name)
+        except (ValueError, json.JSONDecodeError) as e:
+            return _json_error(400, str(e))
+
+        fd, path = tempfile.mkstemp(suffix=".pptx", prefix="pptx_service_")
+        os.close(fd)
+        try:
+            loop = asyncio.get_running_loop()
+            t0 = time.perf_counter()
+            executor = app["executors"][engine_name]
+            try:
+                rapport = await loop.run_in_executor(executor, render_to_file,
+                                                     engine_name, slides, images, options, path)
+            except BrokenProcessPool as e:
+                print(f"Pool {engine_name} cassé ({e}) : remplacé par un pool neuf")
+                _remplacer_executor(app, engine_name, executor)
+                return web.json_response({"error": f"moteur '{engine_name}' redémarré, réessayer"},
+                                         status=503, headers={"Retry-After": "1"})
+            except Exception as e:
+                print(f"Erreur génération {engine_name} : {e}")
+                return _json_error(500, f"{type(e).__name__}: {e}")
+            secondes = time.perf_counter() - t0
+            gate.record(secondes)
+            if rapport is None:
+                return _json_error(503, f"moteur '{engine_name}' indisponible")
+            return await stream_file(request, path, {
+                "X-Slides": str(len(slides)),
+                "X-Render-Seconds": f"{secondes:.3f}",
+                "X-Total-Seconds": f"{time.perf_counter() - t_recu:.3f}",
+            })
+        finally:
+            os.remove(path)
+    finally:
+        gate.in_flight -= 1
+
+
+async def stream_file(request, path, headers):
+    """Diffuse `path` par blocs : le .pptx n'est jamais entièrement en mémoire."""
+    loop = asyncio.get_running_loop()
+    response = web.StreamResponse(headers={
+        "Content-Type": PPTX_MIME,
+        "Content-Disposition": 'attachment; filename="Presentation.pptx"',
+        **headers,
+    })
+    response.content_length = os.path.getsize(path)
+    await response.prepare(request)
+    with open(path, "rb") as f:
+        while True:
+            bloc = await loop.run_in_executor(None, f.read, CHUNK_SIZE)
+            if not bloc:
+                break
+            await response.write(bloc)
+    await response.write_eof()
+    return response
+
+
+async def handle_health(request):
+    return web.json_response({name: gate.state() for name, gate in request.app["gates"].items()})
+
+
+# --- APPLICATION ---
+def _nouvel_executor(engine_name, limit):
+    # Texte et web : processus (le GIL ne bloque ni la boucle ni les autres
+    # rendus) ; IA : un thread, pour garder le modèle chargé entre les requêtes
+    if engine_name == "ai":
+        return ThreadPoolExecutor(max_workers=limit, thread_name_prefix="service-ai")
+    return ProcessPoolExecutor(max_workers=limit)
+
+
+def _remplacer_executor(app, engine_name, casse):
+    """Remplace le pool `casse` (une seule fois si plusieurs requêtes échouent ensemble)."""
+    if app["executors"][engine_name] is casse:
+        app["executors"][engine_name] = _nouvel_executor(engine_name, app["limits"][engine_name])
+    casse.shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(limits=None, queues=None):
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    queues = dict(DEFAULT_QUEUES, **(queues or {}))
+    app = web.Application(client_max_size=MAX_BODY_BYTES)
+    app["limits"] = limits
+    app["gates"] = {name: EngineGate(limits[name], queues[name]) for name in ENGINE_OPTIONS}
+
+    async def demarrer(app):
+        app["executors"] = {name: _nouvel_executor(name, limits[name]) for name in ENGINE_OPTIONS}
+
+    async def arreter(app):
+        for executor in app["executors"].values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    app.on_startup.append(demarrer)
+    app.on_cleanup.append(arreter)
+    app.router.add_post("/generate/{engine}", handle_generate)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service HTTP local de génération de .pptx.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for name in ENGINE_OPTIONS:
+        parser.add_argument(f"--{name}-workers", type=int, default=DEFAULT_LIMITS[name],
+                            help=f"rendus '{name}' simultanés")
+        parser.add_argument(f"--{name}-queue", type=int, default=DEFAULT_QUEUES[name],
+                            help=f"requêtes '{name}' en attente avant HTTP 429")
+    args = parser.parse_args(argv)
+    limits = {name: getattr(args, f"{name}_workers") for name in ENGINE_OPTIONS}
+    queues = {name: getattr(args, f"{name}_queue") for name in ENGINE_OPTIONS}
+    web.run_app(create_app(limits, queues), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
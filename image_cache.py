@@ -0,0 +1,423 @@
+"""
+Cache disque des images (téléchargées ou générées)
+--------------------------------------------------
+- Contenu adressé par SHA-256 : deux clés qui pointent vers les mêmes octets
+  partagent un seul fichier sur le disque (déduplication).
+- Index JSON clé -> {sha, size, atime, meta}, persistant entre les runs.
+- Répertoire partageable entre processus (batch_cli -j, pool du service
+  HTTP) : l'index est écrit par `flush` (une fois par deck), après avoir été
+  relu et fusionné sous verrou de fichier, et les fichiers orphelins (absents
+  de l'index) sont supprimés.
+- Taille bornée : éviction LRU (clés les moins récemment utilisées) dès que
+  le total des fichiers dépasse `max_bytes`.
+- Compteurs hits / misses pour mesurer l'efficacité du cache.
+- SlideRenderCache : variante en mémoire pour les slides déjà rendues
+  (XML + image), utilisée pour les reconstructions incrémentales.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PPTX_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "pptx_creator"),
+)
+
+# Un blob absent de l'index depuis plus longtemps que ce délai est orphelin
+# (processus interrompu entre l'écriture du blob et celle de l'index)
+ORPHAN_GRACE_SECONDS = 3600
+
+
+class DiskCache:
+    """Cache clé -> octets, adressé par contenu, avec éviction LRU."""
+
+    def __init__(self, root, max_bytes=500 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.index_path = os.path.join(root, "index.json")
+        self.lock_path = os.path.join(root, "index.lock")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._added = set()      # clés écrites par ce processus depuis le dernier flush
+        self._removed = set()    # clés oubliées par ce processus depuis le dernier flush
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        with self._file_lock():
+            self._index = self._load_index()
+            self._sweep_orphans()
+
+    # --- Index ---
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @contextmanager
+    def _file_lock(self):
+        """Verrou exclusif sur le répertoire, partagé avec les autres processus."""
+        try:
+            import fcntl
+        except ImportError:
+            # Windows : pas de verrou inter-processus, la fusion reste faite
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _merge(self, disque):
+        """Index du disque (autres processus) + changements de ce processus.
+
+        Pour une clé connue des deux côtés, l'entrée la plus récemment
+        utilisée gagne ; une clé absente du disque n'est gardée que si ce
+        processus l'a écrite (sinon un autre processus l'a évincée).
+        """
+        fusion = {}
+        for key, entry in disque.items():
+            if key in self._removed:
+                continue
+            mienne = self._index.get(key)
+            if mienne is not None and (key in self._added or mienne["atime"] > entry["atime"]):
+                entry = mienne
+            fusion[key] = entry
+        for key in self._added:
+            if key in self._index and key not in fusion:
+                fusion[key] = self._index[key]
+        return fusion
+
+    def flush(self):
+        """Fusionne l'index avec celui du disque, applique l'éviction et l'écrit (atomique)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            with self._file_lock():
+                self._index = self._merge(self._load_index())
+                self._evict()
+                tmp = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._index, f)
+                os.replace(tmp, self.index_path)
+            self._dirty = False
+            self._added.clear()
+            self._removed.clear()
+
+    def _sweep_orphans(self):
+        """Supprime les blobs qu'aucune clé de l'index ne référence (hors blobs récents)."""
+        connus = {e["sha"] for e in self._index.values()}
+        limite = time.time() - ORPHAN_GRACE_SECONDS
+        for dirpath, _, fichiers in os.walk(self.blobs_dir):
+            for nom in fichiers:
+                if nom in connus:
+                    continue
+                path = os.path.join(dirpath, nom)
+                try:
+                    if os.path.getmtime(path) < limite:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _blob_path(self, sha):
+        return os.path.join(self.blobs_dir, sha[:2], sha)
+
+    # --- Lecture / écriture ---
+    def lookup(self, key):
+        """Entrée d'index (dict) pour `key`, sans lire le contenu ni compter."""
+        with self._lock:
+            entry = self._index.get(key)
+            return dict(entry) if entry else None
+
+    def get(self, key):
+        """Retourne les octets associés à `key` (ou None) et met à jour le LRU."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["atime"] = time.time()
+            self._dirty = True
+            path = self._blob_path(entry["sha"])
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            # Fichier supprimé à la main ou évincé par un autre processus : on oublie l'entrée
+            with self._lock:
+                if self._index.pop(key, None) is not None:
+                    self._removed.add(key)
+                    self._added.discard(key)
+                    self._dirty = True
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data, meta=None):
+        """Enregistre `data` sous `key`.
+
+        L'index n'est écrit (et l'éviction appliquée) qu'au prochain `flush`,
+        fait par les moteurs une fois par deck.
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # pid + thread : les identifiants de thread se répètent entre processus forkés
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        with self._lock:
+            self._index[key] = {"sha": sha, "size": len(data), "atime": time.time(), "meta": meta or {}}
+            self._added.add(key)
+            self._removed.discard(key)
+            self._dirty = True
+
+    def update_meta(self, key, **meta):
+        """Met à jour les métadonnées d'une entrée existante (ex. revalidation)."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None:
+                entry["meta"].update(meta)
+                entry["atime"] = time.time()
+                self._dirty = True
+
+    # --- Éviction LRU ---
+    def _total_bytes(self):
+        return sum({e["sha"]: e["size"] for e in self._index.values()}.values())
+
+    def _evict(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._index, key=lambda k: self._index[k]["atime"]):
+            if total <= self.max_bytes:
+                break
+            entry = self._index.pop(key)
+            self._removed.add(key)
+            self._added.discard(key)
+            # Le fichier n'est supprimé que s'il n'est plus référencé par aucune clé
+            if all(e["sha"] != entry["sha"] for e in self._index.values()):
+                total -= entry["size"]
+                try:
+                    os.remove(self._blob_path(entry["sha"]))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": self._total_bytes(),
+            }
+
+
+class WebImageCache(DiskCache):
+    """Cache des images web, indexé par URL, avec revalidation HTTP.
+
+    Une entrée vérifiée il y a moins de `max_age` secondes est servie sans
+    aucun accès réseau. Au-delà, elle est revalidée par requête conditionnelle
+    (If-None-Match / If-Modified-Since) : une réponse 304 réutilise le
+    contenu en cache.
+    """
+
+    def __init__(self, root=None, max_bytes=500 * 1024 * 1024, max_age=24 * 3600):
+        super().__init__(root or os.path.join(DEFAULT_CACHE_DIR, "web"), max_bytes)
+        self.max_age = max_age
+        self.revalidations = 0
+
+    def get_fresh(self, url):
+        """Contenu en cache encore frais pour `url`, sinon None (sans réseau)."""
+        entry = self.lookup(url)
+        if entry is None or time.time() - entry["meta"].get("checked", 0) > self.max_age:
+            return None
+        return self.get(url)
+
+    def fetch(self, session, url, timeout=5, max_bytes=None, cancel=None):
+        """Télécharge `url` via `session` en passant par le cache.
+
+        `session` peut être une requests.Session ou le module `requests`.
+        Le téléchargement est borné et validé par web_download.download_image
+        (`max_bytes`) : seules des images valides entrent dans le cache.
+        `cancel` (threading.Event) : levé par l'appelant qui n'attend plus le
+        résultat (deadline) ; plus rien n'est alors écrit dans le cache.
+        Retourne les octets de l'image, ou None si indisponible.
+        """
+        from web_download import WEB_IMAGE_MAX_BYTES, download_image
+
+        data = self.get_fresh(url)
+        if data is not None:
+            return data
+
+        entry = self.lookup(url)
+        headers = {}
+        if entry is not None:
+            if entry["meta"].get("etag"):
+                headers["If-None-Match"] = entry["meta"]["etag"]
+            if entry["meta"].get("last_modified"):
+                headers["If-Modified-Since"] = entry["meta"]["last_modified"]
+
+        r = download_image(session, url, timeout=timeout, headers=headers,
+                           max_bytes=max_bytes or WEB_IMAGE_MAX_BYTES)
+        if r.status is None:
+            # Réseau indisponible : mieux vaut une image périmée que pas d'image
+            if entry is not None:
+                return self.get(url)
+            r = None
+
+        if r is not None and r.status == 304 and entry is not None:
+            data = self.get(url)
+            if data is not None:
+                with self._lock:
+                    self.revalidations += 1
+                if cancel is None or not cancel.is_set():
+                    self.update_meta(url, checked=time.time())
+                return data
+        with self._lock:
+            self.misses += 1
+        if r is not None and r.data is not None:
+            if cancel is not None and cancel.is_set():
+                return r.data
+            try:
+                self.put(url, r.data, meta={
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                    "checked": time.time(),
+                })
+            except OSError as e:
+                # Disque plein ou cache illisible : l'image téléchargée sert quand même
+                print(f"Cache web : image non enregistrée ({type(e).__name__}: {e})")
+            return r.data
+        return None
+
+    def stats(self):
+        s = super().stats()
+        s["revalidations"] = self.revalidations
+        return s
+
+
+class AIImageCache(DiskCache):
+    """Cache des images Stable Diffusion.
+
+    Clé = hash de (model_id, prompt, steps, seed, résolution) : la génération
+    étant déterministe pour une seed donnée, le résultat peut être réutilisé.
+    """
+
+    def __init__(self, root=None, max_bytes=1024 * 1024 * 1024):
+        super().__init__(root or os.path.join(DEFAULT_CACHE_DIR, "ai"), max_bytes)
+
+    @staticmethod
+    def key_for(model_id, prompt, steps, seed, width, height, **extra):
+        params = {"model": model_id, "prompt": prompt, "steps": steps,
+                  "seed": seed, "width": width, "height": height, **extra}
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SlideRenderCache:
+    """Cache mémoire des slides rendues, indexé par le hash de leur contenu.
+
+    Une entrée contient le XML de la slide et les octets de son image (déjà
+    normalisée) : c'est exactement ce que SlideStamper.add_built_slide sait
+    réassembler. Quand l'utilisateur corrige une puce et relance, seules les
+    slides modifiées sont reconstruites. Taille bornée, éviction LRU.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # clé -> (slide_xml, image ou None)
+        self._bytes = 0
+
+    @staticmethod
+    def key_for(titre, points, visuel, image_sha, **extra):
+        """Clé d'une slide : texte, visuel, SHA-256 de l'image source et réglages."""
+        params = {"titre": titre, "points": points, "visuel": visuel,
+                  "image": image_sha, **extra}
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _size(entry):
+        slide_xml, image = entry
+        return len(slide_xml) + (len(image) if image is not None else 0)
+
+    def get(self, key):
+        """(slide_xml, image) pour `key`, ou None ; met à jour le LRU."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, slide_xml, image=None):
+        entry = (slide_xml, image)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            self._entries[key] = entry
+            self._bytes += self._size(entry)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+_web_cache = None
+_ai_cache = None
+_slide_cache = None
+
+
+def get_web_cache():
+    """Cache web partagé par le processus (créé au premier appel)."""
+    global _web_cache
+    if _web_cache is None:
+        _web_cache = WebImageCache()
+    return _web_cache
+
+
+def get_ai_cache():
+    """Cache des images IA partagé par le processus (créé au premier appel)."""
+    global _ai_cache
+    if _ai_cache is None:
+        _ai_cache = AIImageCache()
+    return _ai_cache
+
+
+def get_slide_cache():
+    """Cache des slides rendues partagé par le processus (créé au premier appel)."""
+    global _slide_cache
+    if _slide_cache is None:
+        _slide_cache = SlideRenderCache()
+    return _slide_cache
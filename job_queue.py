@@ -0,0 +1,187 @@
+"""
+File de travaux de génération
+-----------------------------
+Les générations ne tournent plus dans le script Streamlit : elles sont
+soumises à une file partagée par tout le processus et exécutées en tâche de
+fond, ce qui libère la session de l'utilisateur.
+
+- Chaque travail a un identifiant (à garder dans l'URL pour se reconnecter).
+- Limites par moteur : un seul travail IA à la fois (un seul modèle en
+  mémoire), plusieurs travaux texte / web en parallèle.
+- Progression et annulation coopérative : le travail appelle
+  `job.report_progress(fraction, texte)`, qui lève JobCancelled dès que
+  l'annulation est demandée.
+- Un travail progressif publie des versions provisoires de son résultat
+  (`job.publish`), téléchargeables avant la fin.
+- Les résultats terminés sont conservés dans un stock borné (les plus
+  anciens sont oubliés en premier).
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# "ai_progressive" : le deck texte de chaque travail sort tout de suite, les
+# inférences restent sérialisées par backend_engines (un seul modèle en mémoire)
+DEFAULT_LIMITS = {"text": max(2, os.cpu_count() or 1), "web": 4, "ai": 1, "ai_progressive": 4}
+FINISHED = ("done", "error", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Levée dans le travail quand l'utilisateur a demandé l'annulation."""
+
+
+class Job:
+    """Un travail de génération et son état (lu par l'interface)."""
+
+    def __init__(self, engine, label=""):
+        self.id = uuid.uuid4().hex[:12]
+        self.engine = engine
+        self.label = label
+        self.status = "queued"      # queued, running, done, error, cancelled
+        self.progress = 0.0
+        self.message = "En attente..."
+        self.result = None
+        self.error = None
+        self.trace = None           # profiling.Tracer si le profilage est demandé
+        self.version = 0            # versions provisoires publiées (travail progressif)
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    def report_progress(self, fraction, message=None):
+        """Callback de progression à passer aux moteurs ; sert aussi de point d'annulation."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = max(0.0, min(1.0, float(fraction)))
+        if message:
+            self.message = message
+
+    def publish(self, result, message=None):
+        """Version provisoire du résultat, téléchargeable pendant que le travail continue."""
+        self.result = result
+        self.version += 1
+        if message:
+            self.message = message
+
+    def cancel(self):
+        """Demande l'annulation : immédiate si le travail attend encore, sinon au prochain report_progress."""
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self.status = "cancelled"
+            self.message = "Annulé"
+            self.finished = time.time()
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobQueue:
+    """File partagée : un pool de threads par moteur, stock borné des résultats."""
+
+    def __init__(self, limits=None, max_results=32):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.max_results = max_results
+        self._pools = {}
+        self._jobs = OrderedDict()   # id -> Job, du plus ancien au plus récent
+        self._lock = threading.Lock()
+
+    def _pool(self, engine):
+        if engine not in self._pools:
+            self._pools[engine] = ThreadPoolExecutor(max_workers=self.limits.get(engine, 1),
+                                                     thread_name_prefix=f"job-{engine}")
+        return self._pools[engine]
+
+    def submit(self, engine, target, label=""):
+        """Soumet `target(job)` sur le pool de `engine` ; retourne l'identifiant du travail.
+
+        `target` reçoit le Job et retourne le résultat (ex. le .pptx) ; il
+        doit transmettre `job.report_progress` au moteur pour la progression
+        et l'annulation.
+        """
+        job = Job(engine, label)
+        with self._lock:
+            self._jobs[job.id] = job
+            job._future = self._pool(engine).submit(self._run, job, target)
+            self._prune()
+        return job.id
+
+    def _run(self, job, target):
+        if job._cancel.is_set():
+            # Annulé alors que le pool démarrait le travail (future.cancel() arrivé trop tard)
+            job.status = "cancelled"
+            job.message = "Annulé"
+            job.finished = time.time()
+            with self._lock:
+                self._prune()
+            return
+        job.status = "running"
+        job.message = "Démarrage..."
+        job.started = time.time()
+        try:
+            job.result = target(job)
+        except JobCancelled:
+            job.status = "cancelled"
+            job.message = "Annulé"
+        except Exception as e:
+            print(f"Erreur travail {job.id} ({job.engine}) : {e}")
+            job.status = "error"
+            job.error = f"{type(e).__name__}: {e}"
+            job.message = "Erreur"
+        else:
+            job.status = "done"
+            job.progress = 1.0
+            job.message = "Terminé"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._prune()
+
+    def _prune(self):
+        """Oublie les travaux terminés les plus anciens au-delà de `max_results`."""
+        termines = [j for j in self._jobs.values() if j.done]
+        for job in termines[:max(0, len(termines) - self.max_results)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def jobs(self, ids=None):
+        """Travaux connus (ou seulement ceux de `ids`), du plus récent au plus ancien."""
+        with self._lock:
+            tous = list(self._jobs.values())
+        if ids is not None:
+            ids = set(ids)
+            tous = [j for j in tous if j.id in ids]
+        return tous[::-1]
+
+    def stats(self):
+        with self._lock:
+            tous = list(self._jobs.values())
+        return {s: sum(1 for j in tous if j.status == s)
+                for s in ("queued", "running", "done", "error", "cancelled")}
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            for job in self.jobs():
+                job.cancel()
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
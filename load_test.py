@@ -0,0 +1,131 @@
+"""
+Test de charge du service HTTP (http_service.py)
+------------------------------------------------
+Envoie des decks synthétiques en parallèle et mesure le débit et les
+latences (p50 / p95 / p99), ainsi que le nombre de refus HTTP 429.
+
+    python http_service.py --port 8765 &
+    python load_test.py --requests 200 --concurrency 16 --slides 40
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from io import BytesIO
+
+import aiohttp
+
+
+def synthetic_deck(n_slides, tag=0):
+    return [{"titre": f"Deck {tag} - slide {i}",
+             "points": [f"Point {j} de la slide {i}" for j in range(4)],
+             "visuel": ""} for i in range(1, n_slides + 1)]
+
+
+def synthetic_images(n_images, size=(1600, 1200)):
+    """(nom, octets JPEG) pour les slides 1..n_images (Pillow requis)."""
+    from PIL import Image
+
+    images = []
+    for i in range(1, n_images + 1):
+        buf = BytesIO()
+        Image.new("RGB", size, (40 * i % 255, 120, 180)).save(buf, format="JPEG", quality=90)
+        images.append((f"{i} synthetique.jpg", buf.getvalue()))
+    return images
+
+
+def percentile(valeurs, p):
+    if not valeurs:
+        return None
+    valeurs = sorted(valeurs)
+    rang = min(len(valeurs) - 1, max(0, round(p / 100 * len(valeurs) + 0.5) - 1))
+    return valeurs[rang]
+
+
+async def _une_requete(session, url, slides, images, resultats):
+    t0 = time.perf_counter()
+    try:
+        if images:
+            form = aiohttp.FormData()
+            form.add_field("slides", json.dumps(slides), content_type="application/json")
+            for nom, data in images:
+                form.add_field("images", data, filename=nom, content_type="image/jpeg")
+            requete = session.post(url, data=form)
+        else:
+            requete = session.post(url, json={"slides": slides})
+        async with requete as r:
+            taille = 0
+            async for bloc in r.content.iter_chunked(256 * 1024):
+                taille += len(bloc)
+            statut = r.status
+    except aiohttp.ClientError as e:
+        statut, taille = f"erreur {type(e).__name__}", 0
+    resultats.append((statut, time.perf_counter() - t0, taille))
+
+
+async def run_load(url, n_requests, concurrency, n_slides, n_images=0):
+    images = synthetic_images(n_images) if n_images else []
+    resultats = []
+    file = asyncio.Queue()
+    for i in range(n_requests):
+        file.put_nowait(i)
+
+    async def client(session):
+        while True:
+            try:
+                i = file.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await _une_requete(session, url, synthetic_deck(n_slides, i), images, resultats)
+
+    timeout = aiohttp.ClientTimeout(total=None)
+    t0 = time.perf_counter()
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    duree = time.perf_counter() - t0
+
+    ok = [latence for statut, latence, _ in resultats if statut == 200]
+    return {
+        "url": url,
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "slides_per_deck": n_slides,
+        "images_per_deck": n_images,
+        "seconds": round(duree, 3),
+        "ok": len(ok),
+        "rejected_429": sum(1 for statut, _, _ in resultats if statut == 429),
+        "errors": sum(1 for statut, _, _ in resultats if statut not in (200, 429)),
+        "throughput_decks_per_s": round(len(ok) / duree, 2) if duree else None,
+        "throughput_slides_per_s": round(len(ok) * n_slides / duree, 1) if duree else None,
+        "mean_bytes": round(sum(t for s, _, t in resultats if s == 200) / len(ok)) if ok else None,
+        "latency_s": {f"p{p}": round(percentile(ok, p), 3) if ok else None for p in (50, 95, 99)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge du service de génération.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--engine", default="text", choices=("text", "web", "ai"))
+    parser.add_argument("--requests", type=int, default=100, help="nombre total de requêtes")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients simultanés")
+    parser.add_argument("--slides", type=int, default=30, help="slides par deck")
+    parser.add_argument("--images", type=int, default=0, help="images uploadées par deck")
+    parser.add_argument("--json", action="store_true", help="résultat brut en JSON")
+    args = parser.parse_args(argv)
+
+    url = f"{args.url.rstrip('/')}/generate/{args.engine}"
+    resume = asyncio.run(run_load(url, args.requests, args.concurrency, args.slides, args.images))
+    if args.json:
+        print(json.dumps(resume, indent=2))
+    else:
+        lat = resume["latency_s"]
+        print(f"{resume['ok']}/{resume['requests']} OK, {resume['rejected_429']} refus 429, "
+              f"{resume['errors']} erreurs en {resume['seconds']:.1f}s")
+        print(f"Débit : {resume['throughput_decks_per_s']} decks/s "
+              f"({resume['throughput_slides_per_s']} slides/s)")
+        print(f"Latence : p50 {lat['p50']}s, p95 {lat['p95']}s, p99 {lat['p99']}s")
+
+
+if __name__ == "__main__":
+    main()
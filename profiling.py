@@ -0,0 +1,160 @@
+"""
+Profilage par étapes
+--------------------
+Spans nommés autour des étapes de génération (parsing, lecture et
+normalisation des images, HTTP, inférence, encodage, assemblage, sauvegarde)
+et compteurs (hits de cache, octets), exportables au format Chrome trace
+(chrome://tracing ou https://ui.perfetto.dev).
+
+    with profiling.tracing() as trace:
+        engine.generate_text_only(data)
+    trace.save("trace.json")
+    print(trace.summary())
+
+Sans traçage actif, `span()` retourne un objet vide partagé et `count()` ne
+fait rien : le coût est celui d'un appel de fonction.
+La trace active est portée par le contexte (contextvars) : deux travaux
+tracés en même temps dans des threads différents (deux utilisateurs de
+l'app) ont chacun leurs propres événements. Les threads de travail des
+moteurs héritent de la trace de l'appelant via `submit` / `bind` ; les
+pools de processus ne sont pas tracés (on mesure l'attente côté appelant).
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Traces actives dans le contexte courant (tuple, remplacé en bloc)
+_tracers = contextvars.ContextVar("pptx_tracers", default=())
+
+
+class _NoSpan:
+    """Span vide, partagé, utilisé quand aucun traçage n'est actif."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    def __init__(self, tracers, name, args):
+        self.tracers = tracers
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter_ns()
+        for tracer in self.tracers:
+            tracer._record(self.name, self.t0, t1, self.args)
+        return False
+
+
+class Tracer:
+    """Événements et compteurs d'une trace."""
+
+    def __init__(self):
+        self.events = []    # (nom, début ns, fin ns, pid, tid, args)
+        self.counters = defaultdict(float)
+        self.t0 = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def _record(self, name, t0, t1, args):
+        self.events.append((name, t0, t1, os.getpid(), threading.get_native_id(), args))
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def summary(self):
+        """Par étape : nombre, durée totale et maximale (secondes), triées par durée totale."""
+        stats = {}
+        for name, t0, t1, *_ in self.events:
+            s = stats.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            duree = (t1 - t0) / 1e9
+            s["count"] += 1
+            s["total_s"] += duree
+            s["max_s"] = max(s["max_s"], duree)
+        return dict(sorted(stats.items(), key=lambda kv: -kv[1]["total_s"]))
+
+    def to_chrome(self):
+        """Trace au format Chrome trace-event (événements complets "X", en µs)."""
+        events = [{
+            "name": name, "cat": name.split(".")[0], "ph": "X",
+            "ts": (t0 - self.t0) / 1000, "dur": (t1 - t0) / 1000,
+            "pid": pid, "tid": tid, **({"args": args} if args else {}),
+        } for name, t0, t1, pid, tid, args in self.events]
+        fin = max((e["ts"] + e["dur"] for e in events), default=0)
+        events += [{"name": name, "ph": "C", "ts": fin, "pid": os.getpid(), "args": {"value": value}}
+                   for name, value in sorted(self.counters.items())]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": dict(self.counters)}
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome(), f)
+        return path
+
+
+@contextmanager
+def tracing(tracer=None):
+    """Active une trace pour la durée du bloc (contexte courant) ; retourne le Tracer."""
+    tracer = tracer or Tracer()
+    jeton = _tracers.set(_tracers.get() + (tracer,))
+    try:
+        yield tracer
+    finally:
+        _tracers.reset(jeton)
+
+
+def enabled():
+    return bool(_tracers.get())
+
+
+def span(name, **args):
+    """Context manager mesurant l'étape `name` (arguments affichés dans la trace)."""
+    tracers = _tracers.get()
+    if not tracers:
+        return _NO_SPAN
+    return _Span(tracers, name, args)
+
+
+def count(name, value=1):
+    """Ajoute `value` au compteur `name` des traces actives."""
+    for tracer in _tracers.get():
+        tracer.count(name, value)
+
+
+def bind(fn):
+    """`fn` à exécuter dans un autre thread avec le contexte (la trace) de l'appelant."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit(fn, ...) dans une copie du contexte courant (un contexte par tâche)."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def traced(name):
+    """Décorateur : chaque appel de la fonction est un span `name`."""
+    def decorateur(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _tracers.get():
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorateur
@@ -0,0 +1,139 @@
+"""
+Lecture du texte TITRE / POINTS / VISUEL
+----------------------------------------
+- `iter_slides` : tokenizer ligne à ligne qui produit les slides au fur et à
+  mesure (générateur). Accepte une chaîne ou un fichier ouvert (texte ou
+  binaire UTF-8) : un export de plusieurs Mo n'est jamais chargé en entier.
+- Les lignes non reconnues ne sont plus perdues en silence : elles sont
+  signalées dans `diagnostics` avec leur numéro de ligne.
+- `parse_slides` : mémoïsé par hash du texte, pour que les reruns Streamlit
+  (déclenchés par n'importe quel widget) ne reparsent pas le même contenu.
+"""
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict, namedtuple
+
+import profiling
+
+Diagnostic = namedtuple("Diagnostic", "ligne message texte")
+Diagnostic.__str__ = lambda d: f"ligne {d.ligne} : {d.message} ({d.texte[:60]!r})"
+
+_PUCES = ("-", "•")
+_MEMO_MAX = 16
+_memo = OrderedDict()   # sha256 du texte -> (slides, diagnostics)
+_memo_lock = threading.Lock()
+
+
+def _lignes(source):
+    """Itère sur les lignes de `source` (str, octets, fichier texte ou binaire)."""
+    if isinstance(source, str):
+        yield from io.StringIO(source)
+    elif isinstance(source, (bytes, bytearray)):
+        yield from io.TextIOWrapper(io.BytesIO(source), encoding="utf-8-sig", errors="replace")
+    elif isinstance(source, io.TextIOBase):
+        yield from source
+    else:
+        # Fichier binaire (upload Streamlit, open(..., "rb")) : décodage à la
+        # volée, puis on rend le fichier à l'appelant sans le fermer
+        texte = io.TextIOWrapper(source, encoding="utf-8-sig", errors="replace")
+        try:
+            yield from texte
+        finally:
+            texte.detach()
+
+
+def _apres_marqueur(line, marqueur):
+    return line[len(marqueur):].strip()
+
+
+def iter_slides(source, diagnostics=None):
+    """Génère les slides {"titre", "points", "visuel"} de `source`, dans l'ordre.
+
+    Chaque slide est produite dès que la suivante commence (ou en fin de
+    texte). `diagnostics` (liste) reçoit un Diagnostic pour chaque ligne
+    ignorée ou incohérente.
+    """
+    def signaler(numero, message, texte):
+        if diagnostics is not None:
+            diagnostics.append(Diagnostic(numero, message, texte))
+
+    current_slide = None
+    for numero, line in enumerate(_lignes(source), 1):
+        line = line.strip()
+        if not line:
+            continue
+        upper = line.upper()
+
+        if upper.startswith("TITRE:"):
+            if current_slide is not None:
+                yield current_slide
+            current_slide = {"titre": _apres_marqueur(line, "TITRE:"), "points": [], "visuel": ""}
+            if not current_slide["titre"]:
+                signaler(numero, "titre vide", line)
+
+        elif upper.startswith("POINTS:"):
+            # Juste un marqueur ; un point écrit sur la même ligne est conservé
+            reste = _apres_marqueur(line, "POINTS:")
+            if current_slide is None:
+                signaler(numero, "POINTS avant le premier TITRE", line)
+            elif reste:
+                current_slide["points"].append(reste.lstrip("-• ").strip())
+
+        elif line.startswith(_PUCES):
+            if current_slide is None:
+                signaler(numero, "point avant le premier TITRE", line)
+            else:
+                current_slide["points"].append(line.lstrip("-• ").strip())
+
+        elif upper.startswith("VISUEL:"):
+            # Peut être une URL ou un Prompt selon le mode
+            if current_slide is None:
+                signaler(numero, "VISUEL avant le premier TITRE", line)
+            else:
+                if current_slide["visuel"]:
+                    signaler(numero, "second VISUEL pour la même slide (remplace le premier)", line)
+                current_slide["visuel"] = _apres_marqueur(line, "VISUEL:")
+
+        else:
+            signaler(numero, "ligne non reconnue (ni TITRE, ni POINTS, ni puce, ni VISUEL)", line)
+
+    if current_slide is not None:
+        yield current_slide
+
+
+def parse_slides(source):
+    """Retourne (slides, diagnostics) pour `source`.
+
+    Pour une chaîne, le résultat est mémoïsé par SHA-256 du texte (les
+    `_MEMO_MAX` derniers textes). Les listes retournées sont des copies mais
+    les dicts de slides sont partagés avec le cache : les traiter en lecture
+    seule (c'est le cas de tous les moteurs).
+    """
+    if not isinstance(source, str):
+        diagnostics = []
+        with profiling.span("parse", source="fichier"):
+            return list(iter_slides(source, diagnostics)), diagnostics
+
+    cle = hashlib.sha256(source.encode("utf-8", "surrogatepass")).hexdigest()
+    with _memo_lock:
+        resultat = _memo.get(cle)
+        if resultat is not None:
+            _memo.move_to_end(cle)
+    profiling.count("parse.memo_hits" if resultat is not None else "parse.memo_misses")
+    if resultat is None:
+        diagnostics = []
+        with profiling.span("parse", chars=len(source)):
+            resultat = (list(iter_slides(source, diagnostics)), diagnostics)
+        with _memo_lock:
+            _memo[cle] = resultat
+            while len(_memo) > _MEMO_MAX:
+                _memo.popitem(last=False)
+    slides, diagnostics = resultat
+    return list(slides), list(diagnostics)
+
+
+def parse_input_text(raw_text):
+    """Transforme le texte copié-collé en structure de données"""
+    return parse_slides(raw_text)[0]
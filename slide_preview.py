@@ -0,0 +1,191 @@
+"""
+Aperçu des slides sans générer le .pptx
+---------------------------------------
+Vignettes PNG dessinées avec Pillow directement depuis les slides parsées,
+avec la géométrie d'add_slide_layout (zones de texte, tailles de police
+choisies par text_fit, emplacement de l'image) : l'utilisateur voit le
+résultat, et les débordements, pendant qu'il corrige son texte.
+
+- `DeckPreview(data_slides, image_files)` applique le même ajustement que les
+  moteurs (fit_deck) ; `thumbnail(i)` ne dessine que la slide demandée.
+- Les vignettes sont mises en cache (mémoire, LRU borné) par hash du contenu
+  de la slide et de son image : corriger une puce ne redessine qu'une slide.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+import profiling
+from backend_engines import (IMAGE_LEFT_IN, IMAGE_TOP_IN, IMAGE_WIDTH_IN, TAILLE_POINTS, TAILLE_TITRE,
+                             ImageSourceIndex, fit_deck)
+
+# Géométrie de la présentation par défaut de python-pptx (4:3) et d'add_slide_layout (pouces)
+SLIDE_WIDTH_IN = 10
+SLIDE_HEIGHT_IN = 7.5
+TITLE_BOX_IN = (0.5, 0.4, 9, 1)
+BODY_LEFT_IN, BODY_TOP_IN, BODY_HEIGHT_IN = 0.5, 1.5, 5
+BODY_WIDTH_IN = {True: 5, False: 9}
+INSET_X_IN, INSET_Y_IN = 0.1, 0.05
+LINE_SPACING = 1.2
+FIRST_PARAGRAPH_PT = 18     # paragraphe vide initial de la zone de texte
+
+THUMB_WIDTH = 480
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Arial si disponible, sinon une police aux métriques proches
+_FONTS = {
+    False: ("arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf"),
+    True: ("arialbd.ttf", "Arial Bold.ttf", "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf"),
+}
+
+_cache = OrderedDict()      # hash du contenu -> PNG
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+# Largeur (en em) de cette phrase en Arial normal / gras : une police de
+# remplacement plus large est réduite pour couper les lignes comme PowerPoint
+_ECHANTILLON = "Les puces du texte : analyse, croissance et innovation 2024"
+_ECHANTILLON_ARIAL_EM = {False: 26.459, True: 28.345}
+
+
+@lru_cache(maxsize=64)
+def _font(bold, px):
+    for nom in _FONTS[bold]:
+        try:
+            font = ImageFont.truetype(nom, px)
+            break
+        except OSError:
+            continue
+    else:
+        font = ImageFont.load_default(px)
+    echelle = _ECHANTILLON_ARIAL_EM[bold] * px / max(1, font.getlength(_ECHANTILLON))
+    if abs(echelle - 1) > 0.02:
+        font = font.font_variant(size=max(1, round(px * echelle)))
+    return font
+
+
+def _wrap(texte, font, largeur_px):
+    """Lignes de `texte` après retour à la ligne au mot (comme word_wrap de PowerPoint)."""
+    lignes, courante = [], ""
+    for mot in texte.split():
+        essai = f"{courante} {mot}" if courante else mot
+        if not courante or font.getlength(essai) <= largeur_px:
+            courante = essai
+        else:
+            lignes.append(courante)
+            courante = mot
+    lignes.append(courante)
+    return lignes
+
+
+def render_thumbnail(slide, image=None, width=THUMB_WIDTH):
+    """Vignette PNG (octets) d'une slide `{"titre", "points", ["taille", "taille_titre"]}`.
+
+    `image` : octets de l'image de la slide (placée comme dans add_slide_layout).
+    """
+    px = width / SLIDE_WIDTH_IN                     # pixels par pouce
+    pt = px / 72                                    # pixels par point
+    im = Image.new("RGB", (width, round(SLIDE_HEIGHT_IN * px)), "white")
+    dessin = ImageDraw.Draw(im)
+
+    # Titre
+    x, y, w, _ = TITLE_BOX_IN
+    taille_titre = slide.get("taille_titre") or TAILLE_TITRE
+    font = _font(True, max(1, round(taille_titre * pt)))
+    haut = (y + INSET_Y_IN) * px
+    for ligne in _wrap(slide["titre"], font, (w - 2 * INSET_X_IN) * px):
+        dessin.text(((x + INSET_X_IN) * px, haut), ligne, fill="black", font=font)
+        haut += taille_titre * LINE_SPACING * pt
+
+    # Image (droite), hauteur selon ses proportions
+    avec_image = False
+    if image is not None:
+        try:
+            with Image.open(BytesIO(image)) as source:
+                source.draft("RGB", (round(IMAGE_WIDTH_IN * px), round(SLIDE_HEIGHT_IN * px)))
+                source = ImageOps.exif_transpose(source).convert("RGB")
+                larg = round(IMAGE_WIDTH_IN * px)
+                vignette = source.resize((larg, max(1, round(source.height * larg / source.width))))
+            im.paste(vignette, (round(IMAGE_LEFT_IN * px), round(IMAGE_TOP_IN * px)))
+            avec_image = True
+        except Exception as e:
+            print(f"Aperçu : image illisible ({e})")
+
+    # Puces
+    taille = slide.get("taille") or TAILLE_POINTS
+    font = _font(False, max(1, round(taille * pt)))
+    largeur = (BODY_WIDTH_IN[avec_image] - 2 * INSET_X_IN) * px
+    haut = (BODY_TOP_IN + INSET_Y_IN) * px + FIRST_PARAGRAPH_PT * LINE_SPACING * pt
+    for point in slide["points"]:
+        for ligne in _wrap(f"• {point}", font, largeur):
+            dessin.text(((BODY_LEFT_IN + INSET_X_IN) * px, haut), ligne, fill="black", font=font)
+            haut += taille * LINE_SPACING * pt
+        haut += taille * 14 / TAILLE_POINTS * pt
+
+    # Débordement : le bas de la zone de texte est signalé en rouge
+    bas = (BODY_TOP_IN + BODY_HEIGHT_IN) * px
+    if haut - taille * 14 / TAILLE_POINTS * pt > bas + 1:
+        dessin.line([(BODY_LEFT_IN * px, bas), ((BODY_LEFT_IN + BODY_WIDTH_IN[avec_image]) * px, bas)],
+                    fill="red", width=2)
+
+    dessin.rectangle([0, 0, im.width - 1, im.height - 1], outline="#cccccc")
+    buf = BytesIO()
+    im.save(buf, format="PNG", optimize=False)
+    return buf.getvalue()
+
+
+def _cache_get(cle):
+    with _cache_lock:
+        png = _cache.get(cle)
+        if png is not None:
+            _cache.move_to_end(cle)
+        return png
+
+
+def _cache_put(cle, png):
+    global _cache_bytes
+    with _cache_lock:
+        if cle in _cache:
+            return
+        _cache[cle] = png
+        _cache_bytes += len(png)
+        while _cache_bytes > CACHE_MAX_BYTES and len(_cache) > 1:
+            _, ancien = _cache.popitem(last=False)
+            _cache_bytes -= len(ancien)
+
+
+class DeckPreview:
+    """Aperçu d'un deck : mêmes slides (ajustées, découpées) que la génération."""
+
+    def __init__(self, data_slides, image_files=None, autofit=True):
+        index = ImageSourceIndex(image_files)
+        self.slides, origines = fit_deck(data_slides, [n in index for n in range(1, len(data_slides) + 1)],
+                                         autofit)
+        self.index = index.remap(origines) if origines != list(range(1, len(self.slides) + 1)) else index
+
+    def __len__(self):
+        return len(self.slides)
+
+    def thumbnail(self, i, width=THUMB_WIDTH):
+        """PNG de la slide i (0 = première slide de contenu), depuis le cache si possible."""
+        s = self.slides[i]
+        image_sha = self.index.digest(i + 1) if i + 1 in self.index else None
+        cle = hashlib.sha256(json.dumps(
+            [s["titre"], s["points"], s.get("taille"), s.get("taille_titre"), image_sha, width]
+        ).encode("utf-8")).hexdigest()
+        png = _cache_get(cle)
+        if png is not None:
+            profiling.count("preview.cache_hits")
+            return png
+        profiling.count("preview.cache_misses")
+        with profiling.span("preview.render", slide=i + 1):
+            png = render_thumbnail(s, self.index.read(i + 1) if image_sha else None, width)
+        _cache_put(cle, png)
+        return png
@@ -0,0 +1,8 @@
+"""Les modules du projet sont à la racine du dépôt (pas de package)."""
+
+import os
+import sys
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RACINE not in sys.path:
+    sys.path.insert(0, RACINE)
@@ -0,0 +1,70 @@
+"""
+Cache des images IA et backend chargé
+-------------------------------------
+Un backend accéléré qui échoue au chargement retombe sur "default" : les
+images produites sont rangées sous la clé du backend réellement chargé, pas
+sous celle du backend demandé.
+"""
+
+import sys
+import types
+
+import pytest
+
+import backend_engines as engine
+from image_cache import AIImageCache
+
+
+class _Generator:
+    def __init__(self, device="cpu"):
+        self.device = device
+
+    def manual_seed(self, seed):
+        return self
+
+
+class _Pipeline:
+    def __init__(self):
+        self.appels = 0
+
+    def __call__(self, prompts, num_inference_steps, generator, width, height):
+        from PIL import Image
+
+        self.appels += 1
+        return types.SimpleNamespace(images=[Image.new("RGB", (width, height), (10, 20, 30)) for _ in prompts])
+
+
+@pytest.fixture
+def repli_bf16(monkeypatch):
+    """Pipeline chargé pour AI_BACKEND="bf16", mais par le chargeur par défaut."""
+    pipe = _Pipeline()
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(Generator=_Generator))
+    monkeypatch.setattr(engine, "AI_BACKEND", "bf16")
+    monkeypatch.setattr(engine, "_pipe_cache", pipe)
+    monkeypatch.setattr(engine, "_pipe_backend", "default")
+    monkeypatch.setattr(engine, "_pipe_requested", "bf16")
+    monkeypatch.setattr(engine, "AI_IDLE_TIMEOUT", 0)
+    return pipe
+
+
+def test_cle_du_backend_charge(tmp_path, repli_bf16):
+    cache = AIImageCache(str(tmp_path))
+    engine.generate_ai_batch(["un campus"], num_steps=2, width=64, height=64, cache=cache)
+
+    cle = lambda **extra: cache.key_for(engine.AI_MODEL_ID, "un campus", 2, 0, 64, 64, **extra)
+    assert cache.lookup(cle()) is not None
+    assert cache.lookup(cle(backend="bf16")) is None
+
+    # Relecture : même pipeline (repli) chargé, l'image sort du cache
+    engine.generate_ai_batch(["un campus"], num_steps=2, width=64, height=64, cache=cache)
+    assert repli_bf16.appels == 1
+
+
+def test_deck_ia_cle_du_backend_charge(tmp_path, repli_bf16):
+    cache = AIImageCache(str(tmp_path))
+    data = [{"titre": "Slide", "points": ["point"], "visuel": "un campus"}]
+    engine.generate_local_ai(data, num_steps=2, width=64, height=64, cache=cache, image_format="png")
+
+    cle = cache.key_for(engine.AI_MODEL_ID, "un campus", 2, 0, 64, 64)
+    assert cache.lookup(cle) is not None
+    assert AIImageCache(str(tmp_path))._load_index().keys() == {cle}
@@ -0,0 +1,70 @@
+"""
+Déchargement pour inactivité
+----------------------------
+Le pipeline obtenu pour une génération est réservé dès son chargement :
+le déchargement pour inactivité ne peut pas le retirer avant la fin de
+l'inférence.
+"""
+
+import sys
+import threading
+import types
+
+import pytest
+
+import backend_engines as engine
+
+
+class _Generator:
+    def __init__(self, device="cpu"):
+        self.device = device
+
+    def manual_seed(self, seed):
+        return self
+
+
+def _dechargement_concurrent():
+    # Le thread de déchargement, comme s'il se réveillait à ce moment
+    fil = threading.Thread(target=engine._unload_if_idle)
+    fil.start()
+    fil.join()
+
+
+class _Pipeline:
+    def __call__(self, prompts, num_inference_steps, generator, width, height):
+        from PIL import Image
+
+        _dechargement_concurrent()
+        self.encore_charge = engine._pipe_cache is self
+        return types.SimpleNamespace(images=[Image.new("RGB", (width, height)) for _ in prompts])
+
+
+@pytest.fixture
+def pipe(monkeypatch):
+    pipe = _Pipeline()
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(Generator=_Generator))
+    monkeypatch.setattr(engine, "_pipe_cache", pipe)
+    monkeypatch.setattr(engine, "_pipe_backend", "default")
+    monkeypatch.setattr(engine, "_pipe_requested", engine.AI_BACKEND)
+    monkeypatch.setattr(engine, "_pipe_users", 0)
+    # Toujours « inactif » pour le déchargement, sans lancer le vrai thread
+    monkeypatch.setattr(engine, "AI_IDLE_TIMEOUT", -1)
+    monkeypatch.setattr(engine, "_start_idle_reaper", lambda: None)
+    monkeypatch.setattr(engine, "unload_ai_pipeline", lambda: setattr(engine, "_pipe_cache", None))
+    return pipe
+
+
+def test_reserve_des_le_chargement(pipe):
+    with engine._ai_pipeline() as (obtenu, backend):
+        assert obtenu is pipe and backend == "default"
+        _dechargement_concurrent()
+        assert engine._pipe_cache is pipe
+    _dechargement_concurrent()
+    assert engine._pipe_cache is None
+
+
+def test_pas_de_dechargement_pendant_l_inference(pipe):
+    images = engine.render_ai_images(["un campus"], num_steps=1, width=64, height=64)
+    assert len(images) == 1
+    assert pipe.encore_charge
+    assert engine._pipe_users == 0
@@ -0,0 +1,57 @@
+"""
+Scheduler par travail
+---------------------
+Brouillon et version finale tournent en parallèle sur le même pipeline
+(job_queue "ai_progressive") : chaque inférence doit voir, du début à la
+fin, le scheduler de son propre profil.
+"""
+
+import sys
+import threading
+import time
+import types
+
+import backend_engines as engine
+
+
+class _Generator:
+    def __init__(self, device="cpu"):
+        self.device = device
+
+    def manual_seed(self, seed):
+        return self
+
+
+class _Pipeline:
+    """Note le scheduler vu au début et à la fin de chaque appel."""
+
+    def __init__(self):
+        self.scheduler = "origine"
+        self._pptx_schedulers = {None: "origine", "dpmsolver++": "dpm"}
+        self.vus = []
+
+    def __call__(self, prompts, num_inference_steps, generator, width, height):
+        debut = self.scheduler
+        time.sleep(0.02)
+        self.vus.append((prompts[0], debut, self.scheduler))
+        return types.SimpleNamespace(images=[None for _ in prompts])
+
+
+def test_scheduler_stable_pendant_inference(monkeypatch):
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(Generator=_Generator))
+    pipe = _Pipeline()
+
+    def travail(scheduler):
+        for _ in range(5):
+            engine.render_ai_images([scheduler or "final"], num_steps=1, pipe=pipe, scheduler=scheduler)
+
+    fils = [threading.Thread(target=travail, args=(s,)) for s in (None, "dpmsolver++") for _ in range(2)]
+    for fil in fils:
+        fil.start()
+    for fil in fils:
+        fil.join()
+
+    attendu = {"final": "origine", "dpmsolver++": "dpm"}
+    assert len(pipe.vus) == 20
+    for prompt, debut, fin in pipe.vus:
+        assert debut == fin == attendu[prompt]
@@ -0,0 +1,92 @@
+"""
+Service HTTP : validation des options
+-------------------------------------
+Une option mal typée ou hors bornes est refusée en 400 avant d'atteindre
+le moteur (qui répondrait 500).
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import backend_engines as engine
+import http_service
+from http_service import OPTION_TYPES, _check_options
+
+SLIDES = [{"titre": "Titre", "points": ["un", "deux"]}]
+
+
+def test_toutes_les_options_ont_un_type():
+    assert set(OPTION_TYPES) == set().union(*http_service.ENGINE_OPTIONS.values())
+    for profil in engine.AI_PROFILES:
+        assert OPTION_TYPES["profile"](profil) == profil
+
+
+def test_conversion():
+    options = _check_options({"compresslevel": "9", "image_dpi": 150.0, "autofit": "false"}, "text")
+    assert options == {"compresslevel": 9, "image_dpi": 150, "autofit": False}
+    assert _check_options({"batch_size": "auto", "width": 256}, "ai") == {"batch_size": "auto", "width": 256}
+    assert _check_options(None, "web") == {}
+
+
+@pytest.mark.parametrize("engine_name, options", [
+    ("text", {"compresslevel": "abc"}),
+    ("text", {"compresslevel": 12}),
+    ("text", {"image_dpi": True}),
+    ("text", {"image_dpi": [150]}),
+    ("text", {"autofit": "peut-être"}),
+    ("web", {"deadline": "bientôt"}),
+    ("ai", {"width": 500}),
+    ("ai", {"profile": "turbo"}),
+    ("ai", {"batch_size": 0}),
+    ("text", {"num_steps": 10}),
+])
+def test_options_invalides(engine_name, options):
+    with pytest.raises(ValueError):
+        _check_options(options, engine_name)
+
+
+def _poster(engine_name, corps):
+    async def scenario():
+        async with TestClient(TestServer(http_service.create_app())) as client:
+            r = await client.post(f"/generate/{engine_name}", json=corps)
+            return r.status, await r.read()
+    return asyncio.run(scenario())
+
+
+def test_400_au_lieu_de_500():
+    status, corps = _poster("text", {"slides": SLIDES, "options": {"compresslevel": "abc"}})
+    assert status == 400
+    assert b"compresslevel" in corps
+
+
+def test_options_converties_transmises_au_moteur():
+    status, corps = _poster("text", {"slides": SLIDES, "options": {"compresslevel": "1", "image_dpi": "96"}})
+    assert status == 200
+    assert corps[:2] == b"PK"
+
+
+def test_pool_casse_remplace():
+    import os
+    import signal
+
+    async def scenario():
+        app = http_service.create_app(limits={"text": 1})
+        async with TestClient(TestServer(app)) as client:
+            corps = {"slides": SLIDES}
+            statuts = [(await client.post("/generate/text", json=corps)).status]
+            # Processus du pool tué (OOM, segfault) : le pool est cassé
+            casse = app["executors"]["text"]
+            for pid in list(casse._processes):
+                os.kill(pid, signal.SIGKILL)
+            for _ in range(3):
+                statuts.append((await client.post("/generate/text", json=corps)).status)
+            return statuts, casse is not app["executors"]["text"]
+
+    statuts, remplace = asyncio.run(scenario())
+    assert statuts == [200, 503, 200, 200]
+    assert remplace
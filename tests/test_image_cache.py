@@ -0,0 +1,162 @@
+"""
+Cache disque des images
+-----------------------
+Échecs d'écriture (le deck est livré quand même) et partage d'un même
+répertoire de cache entre plusieurs processus.
+"""
+
+import os
+from io import BytesIO
+
+from PIL import Image
+
+import backend_engines as engine
+from image_cache import WebImageCache
+
+
+def _png(n):
+    buf = BytesIO()
+    Image.new("RGB", (16 + n, 16), (n * 50 % 256, 0, 0)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _Reponse:
+    def __init__(self, data):
+        self.status_code = 200
+        self.headers = {"Content-Type": "image/png", "Content-Length": str(len(data))}
+        self.raw = None
+        self._data = data
+
+    def iter_content(self, taille):
+        return [self._data[i:i + taille] for i in range(0, len(self._data), taille)]
+
+    def close(self):
+        pass
+
+
+class _Session:
+    """Session factice : l'URL ".../<n>" renvoie _png(n)."""
+
+    def get(self, url, **kwargs):
+        return _Reponse(_png(int(url.rsplit("/", 1)[1])))
+
+
+def _casser_blobs(cache):
+    # Un fichier à la place du répertoire des blobs : toute écriture échoue
+    os.rename(cache.blobs_dir, cache.blobs_dir + ".old")
+    with open(cache.blobs_dir, "w") as f:
+        f.write("pas un répertoire")
+
+
+def test_ecriture_impossible_image_gardee(tmp_path):
+    cache = WebImageCache(str(tmp_path))
+    _casser_blobs(cache)
+    assert cache.fetch(_Session(), "http://exemple.test/3") == _png(3)
+
+
+def test_ecriture_impossible_deck_complet(tmp_path, monkeypatch):
+    cache = WebImageCache(str(tmp_path))
+    _casser_blobs(cache)
+    monkeypatch.setattr(engine, "_fetch_one", _fetch_avec(_Session()))
+    urls = [f"http://exemple.test/{n}" for n in range(4)]
+    assert engine.fetch_web_images(urls, cache=cache) == [_png(n) for n in range(4)]
+
+
+def test_erreur_inattendue_isolee_par_url(tmp_path, monkeypatch):
+    class Cassee(WebImageCache):
+        def fetch(self, session, url, **kwargs):
+            if url.endswith("/1"):
+                raise RuntimeError("panne")
+            return super().fetch(session, url, **kwargs)
+
+    monkeypatch.setattr(engine, "_fetch_one", _fetch_avec(_Session()))
+    urls = [f"http://exemple.test/{n}" for n in range(3)]
+    assert engine.fetch_web_images(urls, cache=Cassee(str(tmp_path))) == [_png(0), None, _png(2)]
+
+
+def _fetch_avec(session):
+    # Même _fetch_one, mais avec la session factice au lieu de la Session requests
+    fetch_one = engine._fetch_one
+
+    def _fetch_one(_session, url, timeout, cache=None, max_bytes=None, arret=None):
+        return fetch_one(session, url, timeout, cache, max_bytes, arret)
+    return _fetch_one
+
+
+# --- Répertoire partagé entre processus ---
+def _blobs(cache):
+    return sorted(nom for _, _, fichiers in os.walk(cache.blobs_dir) for nom in fichiers)
+
+
+def test_deux_instances_meme_repertoire(tmp_path):
+    a = WebImageCache(str(tmp_path))
+    b = WebImageCache(str(tmp_path))
+    a.put("k1", _png(1))
+    b.put("k2", _png(2))
+    a.put("k3", _png(3))
+    a.flush()
+    b.flush()
+
+    relu = WebImageCache(str(tmp_path))
+    assert sorted(relu._load_index()) == ["k1", "k2", "k3"]
+    assert relu.get("k1") == _png(1) and relu.get("k2") == _png(2)
+    assert len(_blobs(relu)) == 3
+
+
+def test_eviction_compte_les_entrees_des_autres(tmp_path):
+    taille = len(_png(1))
+    a = WebImageCache(str(tmp_path), max_bytes=2 * taille + 10)
+    b = WebImageCache(str(tmp_path), max_bytes=2 * taille + 10)
+    for cache, cle, data in ((a, "k1", _png(1)), (b, "k2", _png(1) + b"\0"), (a, "k3", _png(1) + b"\0\0")):
+        cache.put(cle, data)
+        cache.flush()               # k1, la plus ancienne, est évincée au dernier flush
+
+    index = WebImageCache(str(tmp_path))._load_index()
+    assert sorted(index) == ["k2", "k3"]
+    assert len(_blobs(a)) == 2
+    assert b.get("k1") is None      # b oublie l'entrée dont le blob a disparu
+
+
+def test_blobs_orphelins_supprimes(tmp_path):
+    cache = WebImageCache(str(tmp_path))
+    cache.put("k1", _png(1))
+    cache.flush()
+    orphelin = os.path.join(cache.blobs_dir, "ab", "ab" + "0" * 62)
+    recent = os.path.join(cache.blobs_dir, "cd", "cd" + "0" * 62)
+    for path in (orphelin, recent):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x")
+    os.utime(orphelin, (1, 1))
+
+    WebImageCache(str(tmp_path))
+    assert not os.path.exists(orphelin)
+    assert os.path.exists(recent)    # peut-être en cours d'écriture par un autre processus
+    assert len(_blobs(cache)) == 2
+
+
+def test_index_ecrit_au_flush_seulement(tmp_path):
+    cache = WebImageCache(str(tmp_path))
+    for n in range(5):
+        cache.put(f"k{n}", _png(n))
+    assert not os.path.exists(cache.index_path)
+    cache.flush()
+    assert sorted(WebImageCache(str(tmp_path))._load_index()) == [f"k{n}" for n in range(5)]
+
+
+def _remplir(args):
+    root, debut = args
+    cache = WebImageCache(root)
+    for n in range(debut, debut + 10):
+        cache.put(f"k{n}", _png(n) + n.to_bytes(2, "big"))
+    cache.flush()
+
+
+def test_processus_concurrents(tmp_path):
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(_remplir, [(str(tmp_path), d) for d in (0, 10, 20, 30)]))
+    cache = WebImageCache(str(tmp_path))
+    assert sorted(cache._load_index()) == sorted(f"k{n}" for n in range(40))
+    assert len(_blobs(cache)) == 40
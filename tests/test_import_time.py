@@ -0,0 +1,42 @@
+"""
+Import de backend_engines (mode Texte Seul)
+-------------------------------------------
+Mesuré dans un processus neuf : aucune dépendance lourde ne doit être
+importée, et l'import doit rester dans le budget (PPTX_IMPORT_BUDGET_S,
+1,5 s par défaut, large devant les ~0,15 s mesurées).
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from conftest import RACINE
+
+IMPORT_BUDGET_S = float(os.environ.get("PPTX_IMPORT_BUDGET_S", 1.5))
+
+_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import backend_engines
+duree = time.perf_counter() - t0
+print(json.dumps({"secondes": duree, "modules": sorted(sys.modules)}))
+"""
+
+
+def _importer():
+    sortie = subprocess.run([sys.executable, "-c", _SCRIPT], cwd=RACINE, capture_output=True,
+                            text=True, check=True, timeout=60)
+    return json.loads(sortie.stdout.strip().splitlines()[-1])
+
+
+def test_import_sans_dependances_lourdes():
+    modules = set(_importer()["modules"])
+    for lourd in ("torch", "diffusers", "requests"):
+        assert lourd not in modules, f"{lourd} importé par backend_engines"
+
+
+def test_import_dans_le_budget():
+    # Meilleur de 3 essais : un seul processus lent (disque froid) ne fait pas échouer
+    meilleur = min(_importer()["secondes"] for _ in range(3))
+    assert meilleur < IMPORT_BUDGET_S, f"import en {meilleur:.2f}s (budget {IMPORT_BUDGET_S}s)"
@@ -0,0 +1,39 @@
+"""
+File de travaux
+---------------
+Un travail annulé au moment où le pool le démarre (future.cancel() trop
+tard) doit finir « cancelled », pas rester « queued ».
+"""
+
+import threading
+
+from job_queue import Job, JobQueue
+
+
+def test_annulation_perdue_par_future_cancel():
+    file = JobQueue()
+    job = Job("text")
+    file._jobs[job.id] = job
+    job._cancel.set()        # cancel() demandé, mais le Future était déjà parti
+
+    appels = []
+    file._run(job, appels.append)
+
+    assert appels == []
+    assert job.status == "cancelled" and job.done
+    assert job.finished is not None
+    assert job.message == "Annulé"
+
+
+def test_annulation_en_attente():
+    file = JobQueue(limits={"text": 1})
+    libere = threading.Event()
+    premier = file.submit("text", lambda job: libere.wait(5))
+    second = file.submit("text", lambda job: "résultat")
+    file.cancel(second)
+    libere.set()
+    file.shutdown(cancel=False)
+
+    assert file.get(premier).status == "done"
+    assert file.get(second).status == "cancelled"
+    assert file.get(second).finished is not None
@@ -0,0 +1,51 @@
+"""
+Profilage : une trace par travail
+---------------------------------
+Deux travaux tracés en même temps ne voient que leurs propres événements,
+y compris ceux des threads de travail des moteurs.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import backend_engines as engine
+import profiling
+
+
+def _travail(nom, pret, resultats):
+    with profiling.tracing() as trace:
+        pret.wait()
+        with profiling.span(f"{nom}.etape"):
+            profiling.count(f"{nom}.compteur")
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            profiling.submit(pool, profiling.count, f"{nom}.pool").result()
+        fil = threading.Thread(target=profiling.bind(lambda: profiling.count(f"{nom}.thread")))
+        fil.start()
+        fil.join()
+    resultats[nom] = trace
+
+
+def test_traces_concurrentes_separees():
+    pret = threading.Barrier(2)
+    resultats = {}
+    fils = [threading.Thread(target=_travail, args=(nom, pret, resultats)) for nom in ("a", "b")]
+    for fil in fils:
+        fil.start()
+    for fil in fils:
+        fil.join()
+
+    for nom, autre in (("a", "b"), ("b", "a")):
+        trace = resultats[nom]
+        assert list(trace.summary()) == [f"{nom}.etape"]
+        assert set(trace.counters) == {f"{nom}.compteur", f"{nom}.pool", f"{nom}.thread"}
+        assert not any(c.startswith(autre) for c in trace.counters)
+    assert not profiling.enabled()
+
+
+def test_spans_des_threads_du_moteur():
+    data = [{"titre": f"Slide {i}", "points": ["point"], "visuel": f"http://127.0.0.1:9/{i}.png"}
+            for i in range(3)]
+    with profiling.tracing() as trace:
+        engine.fetch_web_images([s["visuel"] for s in data], cache=False, timeout=1, deadline=5)
+    # Un span par URL, exécuté dans les threads du pool de téléchargement
+    assert trace.summary()["web.fetch"]["count"] == 3
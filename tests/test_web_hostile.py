@@ -0,0 +1,67 @@
+"""
+Téléchargements hostiles
+------------------------
+Le serveur hostile du bench (bench_engines._HostileImageServer) sert des
+réponses trop grosses, sans fin, lentes, mal étiquetées ou des bombes de
+décompression : elles doivent être refusées, les vraies images gardées.
+"""
+
+import io
+import time
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+import backend_engines as engine
+from bench_engines import _HostileImageServer, synthetic_jpeg
+from web_download import download_image
+
+IMAGE = synthetic_jpeg(640, 480)
+
+
+@pytest.fixture(scope="module")
+def serveur():
+    serveur = _HostileImageServer(IMAGE)
+    yield serveur
+    serveur.httpd.shutdown()
+
+
+@pytest.mark.parametrize("kind, motif", [
+    ("huge_length", "annoncés"),
+    ("endless", "octets"),
+    ("html", ""),
+    ("fake_jpeg", ""),
+    ("bomb", "pixels"),
+])
+def test_reponses_hostiles_refusees(serveur, kind, motif):
+    resultat = download_image(requests, f"{serveur.url}/{kind}/1", timeout=2, max_bytes=1024 * 1024)
+    assert resultat.data is None
+    assert resultat.reason and motif in resultat.reason
+
+
+def test_serveur_lent_interrompu(serveur):
+    t0 = time.monotonic()
+    resultat = download_image(requests, f"{serveur.url}/{serveur.SLOW}/1", timeout=2, max_seconds=0.5)
+    assert resultat.data is None
+    assert "0.5s" in resultat.reason
+    assert time.monotonic() - t0 < 3
+
+
+def test_image_valide_gardee(serveur):
+    from PIL import Image
+
+    resultat = download_image(requests, f"{serveur.url}/ok/1", timeout=2)
+    assert resultat.data == IMAGE
+    assert Image.open(io.BytesIO(resultat.data)).size == (640, 480)
+
+
+def test_fetch_web_images_ne_garde_que_les_images(serveur):
+    kinds = _HostileImageServer.KINDS
+    urls = [f"{serveur.url}/{kind}/{i}" for i, kind in enumerate(kinds * 2)]
+    contenus = engine.fetch_web_images(urls, cache=False, timeout=2, deadline=20)
+    for url, contenu in zip(urls, contenus):
+        if "/ok/" in url:
+            assert contenu == IMAGE, url
+        else:
+            assert contenu is None, url
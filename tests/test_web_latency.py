@@ -0,0 +1,114 @@
+"""
+Téléchargement parallèle des images web
+---------------------------------------
+Serveur HTTP local à délai réglable par URL (/<délai ms>/<n>.png, /fail/<n>) :
+le deck respecte la deadline globale, garde l'ordre des slides, et les URLs
+en retard ou en erreur donnent des slides texte seul.
+"""
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+import backend_engines as engine
+import image_cache
+
+
+def _png(n):
+    """PNG distinct pour chaque n (l'ordre des résultats est vérifiable)."""
+    buf = BytesIO()
+    Image.new("RGB", (32 + n, 24), (n * 40 % 256, 90, 160)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="module")
+def serveur():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            _, delai, nom = self.path.split("/")
+            try:
+                if delai == "fail":
+                    self.send_error(500)
+                    return
+                time.sleep(int(delai) / 1000)
+                corps = _png(int(nom.split(".")[0]))
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _urls(base):
+    # Rapides (dans le désordre d'arrivée), une en erreur, une bien après la deadline
+    return [f"{base}/300/0.png", f"{base}/50/1.png", f"{base}/fail/2", f"{base}/10/3.png",
+            f"{base}/5000/4.png", "pas une url", f"{base}/150/6.png"]
+
+
+def test_deadline_ordre_et_echecs(serveur):
+    t0 = time.perf_counter()
+    contenus = engine.fetch_web_images(_urls(serveur), max_workers=8, timeout=10, deadline=1.0, cache=False)
+    duree = time.perf_counter() - t0
+
+    assert duree < 2.0, f"deadline de 1s dépassée ({duree:.2f}s)"
+    assert contenus[0] == _png(0) and contenus[1] == _png(1)
+    assert contenus[3] == _png(3) and contenus[6] == _png(6)
+    assert contenus[2] is None      # erreur HTTP
+    assert contenus[4] is None      # hors délai
+    assert contenus[5] is None      # pas une URL HTTP
+
+
+def test_parallelisme(serveur):
+    # 8 images à 300 ms : bien moins que 8 x 300 ms en séquentiel
+    urls = [f"{serveur}/300/{n}.png" for n in range(10, 18)]
+    t0 = time.perf_counter()
+    contenus = engine.fetch_web_images(urls, max_workers=8, deadline=5, cache=False)
+    assert time.perf_counter() - t0 < 1.5
+    assert contenus == [_png(n) for n in range(10, 18)]
+
+
+def test_deck_slides_texte_seul_pour_les_echecs(serveur, tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "_web_cache", image_cache.WebImageCache(str(tmp_path)))
+    data = [{"titre": f"Slide {i}", "points": [f"point {i}"], "visuel": url}
+            for i, url in enumerate(_urls(serveur))]
+
+    t0 = time.perf_counter()
+    sortie = engine.generate_web_images(data, deadline=1.0)
+    assert time.perf_counter() - t0 < 2.5
+
+    slides = list(Presentation(sortie).slides)[1:]
+    assert [s.shapes[0].text_frame.text for s in slides] == [f"Slide {i}" for i in range(len(data))]
+    avec_image = [any(sh.shape_type == MSO_SHAPE_TYPE.PICTURE for sh in s.shapes) for s in slides]
+    assert avec_image == [True, True, False, True, False, False, True]
+
+
+def test_hors_delai_rien_dans_le_cache(serveur, tmp_path):
+    cache = image_cache.WebImageCache(str(tmp_path))
+    urls = [f"{serveur}/10/20.png", f"{serveur}/1200/21.png"]
+    contenus = engine.fetch_web_images(urls, timeout=10, deadline=0.5, cache=cache)
+    assert contenus == [_png(20), None]
+
+    # Le téléchargement abandonné se termine après la deadline sans toucher au cache
+    time.sleep(1.5)
+    assert cache.lookup(urls[1]) is None
+    assert list(image_cache.WebImageCache(str(tmp_path))._load_index()) == [urls[0]]
+    assert sum(len(f) for _, _, f in os.walk(cache.blobs_dir)) == 1
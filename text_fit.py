@@ -0,0 +1,238 @@
+"""
+Mesure du texte et ajustement automatique
+-----------------------------------------
+Les zones de texte des slides ont une taille fixe (5 x 5 ou 9 x 5 pouces) :
+un texte trop long déborde de la slide. Ce module estime la hauteur du texte
+sans PowerPoint ni LibreOffice, à partir des largeurs de glyphes d'Arial
+(métriques publiques d'Helvetica, identiques pour Arial et Liberation Sans).
+
+- Toutes les puces d'un deck sont mesurées d'un coup avec NumPy : largeur de
+  chaque mot, puis retour à la ligne glouton calculé pour toutes les puces à
+  la fois (une itération par ligne, pas par mot).
+- fit_slides choisit pour chaque slide la plus grande taille de police qui
+  tient (16 pt par défaut, jusqu'à 12 pt), sinon découpe la slide en slides
+  "(suite)" ; le titre est réduit de la même façon (32 pt à 20 pt).
+"""
+
+import unicodedata
+
+import numpy as np
+
+# --- MÉTRIQUES ---
+# Largeurs d'avance en 1/1000 d'em, caractères 32 à 126
+_ASCII_REGULAR = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_ASCII_BOLD = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+# Caractères hors ASCII sans lettre de base (les lettres accentuées prennent
+# la largeur de leur lettre de base) : (normal, gras)
+_SPECIAUX = {
+    " ": (278, 278), "¡": (333, 333), "«": (556, 556), "»": (556, 556), "°": (400, 400),
+    "©": (737, 737), "®": (737, 737), "·": (278, 278), "×": (584, 584), "¿": (611, 611),
+    "Æ": (1000, 1000), "æ": (889, 889), "ß": (611, 611), "Ø": (778, 778), "ø": (611, 611),
+    "Œ": (1000, 1000), "œ": (944, 944), "€": (556, 556), "•": (350, 350), "–": (556, 556),
+    "—": (1000, 1000), "‘": (222, 278), "’": (222, 278), "“": (333, 500), "”": (333, 500),
+    "…": (1000, 1000),
+}
+TABLE_SIZE = 0x2200     # au-delà : largeur par défaut (pleine chasse pour les idéogrammes)
+DEFAULT_WIDTH = 556
+WIDE_WIDTH = 1000
+WIDE_FROM = 0x2E80
+
+
+def _glyph_table(ascii_widths, gras):
+    table = np.full(TABLE_SIZE, DEFAULT_WIDTH, dtype=np.float64)
+    table[32:127] = ascii_widths
+    for code in range(0xA0, 0x250):
+        base = unicodedata.normalize("NFD", chr(code))[0]
+        if " " <= base <= "~":
+            table[code] = ascii_widths[ord(base) - 32]
+    for c, largeurs in _SPECIAUX.items():
+        table[ord(c)] = largeurs[gras]
+    return table
+
+
+GLYPH_TABLES = {
+    "Arial": _glyph_table(_ASCII_REGULAR, 0),
+    "Arial Bold": _glyph_table(_ASCII_BOLD, 1),
+}
+
+# --- GÉOMÉTRIE (voir backend_engines._add_text_shapes) ---
+PT_PER_IN = 72
+INSET_X_PT = 0.1 * PT_PER_IN * 2         # marges internes gauche + droite d'une zone de texte
+INSET_Y_PT = 0.05 * PT_PER_IN * 2
+BODY_WIDTH_PT = {True: 5 * PT_PER_IN - INSET_X_PT, False: 9 * PT_PER_IN - INSET_X_PT}
+BODY_HEIGHT_PT = 5 * PT_PER_IN - INSET_Y_PT
+TITLE_WIDTH_PT = 9 * PT_PER_IN - INSET_X_PT
+TITLE_HEIGHT_PT = 1 * PT_PER_IN - INSET_Y_PT
+LINE_SPACING = 1.2                       # hauteur de ligne / taille de police
+FIRST_PARAGRAPH_PT = 18 * LINE_SPACING   # paragraphe vide initial de la zone (18 pt)
+SPACE_AFTER_RATIO = 14 / 16              # espace après chaque puce (14 pt à 16 pt)
+
+BODY_SIZES = (16, 15, 14, 13, 12)
+TITLE_SIZES = (32, 28, 24, 20)
+
+
+# --- MESURE ---
+class _Mots:
+    """Découpage en mots de tous les paragraphes d'un deck (tableaux NumPy)."""
+
+    def __init__(self, textes, police):
+        table = GLYPH_TABLES[police]
+        gros_texte = "\n".join(textes)
+        cps = np.frombuffer(gros_texte.encode("utf-32-le"), dtype=np.uint32)
+        largeurs = table[np.minimum(cps, TABLE_SIZE - 1)]
+        largeurs[cps >= TABLE_SIZE] = np.where(cps[cps >= TABLE_SIZE] >= WIDE_FROM, WIDE_WIDTH, DEFAULT_WIDTH)
+        separateur = (cps == 32) | (cps == 10)
+        largeurs[separateur] = 0
+
+        # Un mot commence sur un caractère non séparateur précédé d'un séparateur
+        precedent = np.concatenate(([True], separateur[:-1])) if len(cps) else np.zeros(0, bool)
+        debuts = np.flatnonzero(~separateur & precedent)
+        self.largeur = np.add.reduceat(largeurs, debuts) if len(debuts) else np.zeros(0)
+        self.espace = table[32]
+
+        # Paragraphe de chaque mot, et premier / dernier mot de chaque paragraphe
+        longueurs = np.fromiter((len(t) + 1 for t in textes), dtype=np.int64, count=len(textes))
+        debuts_para = np.concatenate(([0], np.cumsum(longueurs)[:-1]))
+        self.para = np.searchsorted(debuts_para, debuts, side="right") - 1
+        compte = np.bincount(self.para, minlength=len(textes))
+        self.premier = np.concatenate(([0], np.cumsum(compte)[:-1]))
+        self.dernier = self.premier + compte - 1
+        self.n_para = len(textes)
+
+    def lignes(self, taille, largeur_pt):
+        """Nombre de lignes de chaque paragraphe à `taille` pt dans `largeur_pt` (scalaire ou tableau)."""
+        largeur_pt = np.broadcast_to(np.asarray(largeur_pt, dtype=np.float64), (self.n_para,))
+        echelle = taille / 1000
+        mots_pt = self.largeur * echelle
+        espace_pt = self.espace * echelle
+        cumul = np.cumsum(mots_pt + espace_pt)
+
+        lignes = np.zeros(self.n_para, dtype=np.int64)
+        pos = self.premier.copy()
+        actifs = np.flatnonzero(self.dernier >= self.premier)
+        lignes[self.dernier < self.premier] = 1      # paragraphe vide : une ligne
+        # Retour à la ligne glouton, une ligne de tous les paragraphes par itération :
+        # le cumul global étant croissant, searchsorted donne le dernier mot qui tient
+        while len(actifs):
+            p = pos[actifs]
+            base = np.where(p > 0, cumul[np.maximum(p - 1, 0)], 0.0)
+            fin = np.searchsorted(cumul, base + largeur_pt[actifs] + espace_pt, side="right")
+            fin = np.clip(fin, p + 1, self.dernier[actifs] + 1)
+            lignes[actifs] += 1
+            pos[actifs] = fin
+            actifs = actifs[fin <= self.dernier[actifs]]
+
+        # Un mot plus large que la zone est coupé sur plusieurs lignes
+        trop_larges = mots_pt > largeur_pt[self.para]
+        if trop_larges.any():
+            extra = np.ceil(mots_pt[trop_larges] / largeur_pt[self.para][trop_larges]) - 1
+            lignes += np.bincount(self.para[trop_larges], weights=extra, minlength=self.n_para).astype(np.int64)
+        return lignes
+
+
+def measure_lines(textes, taille, largeur_pt, police="Arial"):
+    """Nombre de lignes occupées par chaque texte (retour à la ligne au mot)."""
+    if not textes:
+        return np.zeros(0, dtype=np.int64)
+    return _Mots(textes, police).lignes(taille, largeur_pt)
+
+
+# --- AJUSTEMENT ---
+def _hauteurs_corps(mots, avec_image_para, taille):
+    """Hauteur (pt) de chaque puce à `taille`."""
+    largeur = np.where(avec_image_para, BODY_WIDTH_PT[True], BODY_WIDTH_PT[False])
+    lignes = mots.lignes(taille, largeur)
+    return lignes * taille * LINE_SPACING + taille * SPACE_AFTER_RATIO
+
+
+def fit_slides(data_slides, avec_image=None, body_sizes=BODY_SIZES, title_sizes=TITLE_SIZES):
+    """Tailles de police adaptées, et découpage des slides qui débordent encore.
+
+    `avec_image[i]` : la slide i aura une image (zone de texte étroite).
+    Retourne (slides, origines) : nouvelles slides (copies avec "taille" et
+    "taille_titre" ; les slides de débordement ont "suite": True, un titre
+    "(suite)" et pas de visuel) et, pour chacune, le numéro (1..n) de la slide
+    d'origine.
+    """
+    n = len(data_slides)
+    if avec_image is None:
+        avec_image = [False] * n
+    avec_image = np.asarray(avec_image, dtype=bool)
+
+    textes = [f"• {p}" for s in data_slides for p in s["points"]]
+    proprietaire = np.repeat(np.arange(n), [len(s["points"]) for s in data_slides])
+    mots = _Mots(textes, "Arial")
+    avec_image_para = avec_image[proprietaire]
+
+    # Corps : première taille (la plus grande) pour laquelle toutes les puces tiennent
+    taille = np.zeros(n)
+    restantes = np.ones(n, dtype=bool)
+    hauteurs_defaut = None
+    for t in body_sizes:
+        hauteurs = _hauteurs_corps(mots, avec_image_para, t)
+        if hauteurs_defaut is None:
+            hauteurs_defaut = hauteurs
+        total = np.bincount(proprietaire, weights=hauteurs, minlength=n) + FIRST_PARAGRAPH_PT
+        tient = restantes & (total <= BODY_HEIGHT_PT)
+        taille[tient] = t
+        restantes &= ~tient
+
+    # Titre : plus grande taille dont les lignes tiennent dans la zone de titre
+    titres = [s["titre"] for s in data_slides]
+    mots_titres = _Mots(titres, "Arial Bold")
+    taille_titre = np.full(n, title_sizes[-1], dtype=np.float64)
+    a_placer = np.ones(n, dtype=bool)
+    for t in title_sizes:
+        tient = a_placer & (mots_titres.lignes(t, TITLE_WIDTH_PT) * t * LINE_SPACING <= TITLE_HEIGHT_PT)
+        taille_titre[tient] = t
+        a_placer &= ~tient
+
+    # Découpage : les puces des slides qui débordent même à la plus petite
+    # taille sont réparties sur plusieurs slides à la taille par défaut
+    sans_image = _hauteurs_corps(mots, np.zeros_like(avec_image_para), body_sizes[0])
+    debut_para = np.concatenate(([0], np.cumsum(np.bincount(proprietaire, minlength=n))[:-1]))
+    slides, origines = [], []
+    for i, s in enumerate(data_slides):
+        base = dict(s, taille_titre=int(taille_titre[i]))
+        if not restantes[i]:
+            slides.append(dict(base, taille=int(taille[i])))
+            origines.append(i + 1)
+            continue
+        # Morceaux de puces (indices globaux) tenant chacun à la taille par défaut
+        morceaux, courant, hauteur = [], [], FIRST_PARAGRAPH_PT
+        for j in range(debut_para[i], debut_para[i] + len(s["points"])):
+            h = hauteurs_defaut[j] if not morceaux else sans_image[j]
+            if courant and hauteur + h > BODY_HEIGHT_PT:
+                morceaux.append(courant)
+                courant, hauteur = [], FIRST_PARAGRAPH_PT
+                h = sans_image[j]
+            courant.append(j)
+            hauteur += h
+        morceaux.append(courant)
+        for m, indices in enumerate(morceaux):
+            points = [s["points"][j - debut_para[i]] for j in indices]
+            # Une puce seule trop longue pour la slide passe à la plus petite taille
+            h = (hauteurs_defaut if m == 0 else sans_image)[indices[0]] if indices else 0
+            t = body_sizes[-1] if len(indices) == 1 and FIRST_PARAGRAPH_PT + h > BODY_HEIGHT_PT else body_sizes[0]
+            if m == 0:
+                slides.append(dict(base, points=points, taille=t))
+            else:
+                slides.append(dict(base, titre=f"{s['titre']} (suite)", points=points, taille=t,
+                                   visuel="", suite=True))
+            origines.append(i + 1)
+    return slides, origines
+
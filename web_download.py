@@ -0,0 +1,161 @@
+"""
+Téléchargement borné des images web
+-----------------------------------
+Les URLs de VISUEL viennent d'un LLM : rien ne garantit qu'elles pointent
+vers une image raisonnable. Chaque téléchargement est donc :
+
+- refusé avant de lire le corps si le Content-Type annonce autre chose
+  qu'une image, ou si le Content-Length dépasse `max_bytes` ;
+- lu en flux (stream=True) et interrompu dès que `max_bytes` est dépassé
+  ou que la durée totale dépasse `max_seconds` (serveur qui goutte) ;
+- validé sur le premier bloc par ses octets magiques (formats acceptés par
+  python-pptx) ;
+- mesuré sur son seul en-tête (Image.open ne décode pas les pixels) :
+  les images de plus de `max_pixels` (bombes de décompression) sont refusées.
+
+La mémoire utilisée reste bornée à `max_bytes` par téléchargement en cours,
+quelles que soient les URLs.
+"""
+
+import time
+from collections import namedtuple
+from io import BytesIO
+
+import profiling
+
+WEB_IMAGE_MAX_BYTES = 15 * 1024 * 1024
+WEB_IMAGE_MAX_PIXELS = 40_000_000
+CHUNK_BYTES = 64 * 1024
+PROBE_MAX_BYTES = 256 * 1024    # en-tête introuvable au-delà : image refusée
+
+# Octets magiques des formats que python-pptx sait insérer
+_MAGIC = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+_TYPES_ACCEPTES = ("image/", "application/octet-stream", "binary/octet-stream")
+
+Download = namedtuple("Download", "status data headers reason")
+Download.__doc__ = """Résultat d'un téléchargement : `data` n'est renseigné que pour une image
+valide (statut 200) ; `reason` explique un refus (None sinon)."""
+
+
+class ImageRejected(Exception):
+    """Ressource refusée : pas une image, trop grande, ou trop lente."""
+
+
+def sniff_image(head):
+    """Format de l'image d'après ses premiers octets ("jpeg", "png", ...), ou None."""
+    for magic, fmt in _MAGIC:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def probe_dimensions(head):
+    """(largeur, hauteur) lues dans l'en-tête seul, ou None si l'en-tête est incomplet.
+
+    Lève ImageRejected pour une image que Pillow refuse d'ouvrir (bombe de décompression).
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(head)) as im:
+            return im.size
+    except Image.DecompressionBombError as e:
+        raise ImageRejected(f"dimensions hors norme ({e})") from None
+    except Exception:
+        return None
+
+
+def check_headers(headers, max_bytes=WEB_IMAGE_MAX_BYTES):
+    """Lève ImageRejected si les en-têtes HTTP suffisent à refuser la ressource."""
+    content_type = (headers.get("Content-Type") or "").split(";")[0].strip().lower()
+    if content_type and not content_type.startswith(_TYPES_ACCEPTES):
+        raise ImageRejected(f"Content-Type {content_type}")
+    longueur = headers.get("Content-Length")
+    if longueur and longueur.isdigit() and int(longueur) > max_bytes:
+        raise ImageRejected(f"{int(longueur)} octets annoncés (max {max_bytes})")
+
+
+def read_image_body(chunks, max_bytes=WEB_IMAGE_MAX_BYTES, max_pixels=WEB_IMAGE_MAX_PIXELS,
+                    max_seconds=None):
+    """Lit les blocs `chunks` d'une réponse en validant l'image au fil de l'eau.
+
+    Retourne les octets ; lève ImageRejected dès qu'une limite est franchie
+    (sans lire la suite du corps).
+    """
+    t0 = time.monotonic()
+    buf = bytearray()
+    dimensions = None
+    for bloc in chunks:
+        if not bloc:
+            continue
+        buf += bloc
+        if len(buf) > max_bytes:
+            raise ImageRejected(f"plus de {max_bytes} octets")
+        if max_seconds is not None and time.monotonic() - t0 > max_seconds:
+            raise ImageRejected(f"téléchargement de plus de {max_seconds}s")
+        if len(buf) - len(bloc) < 16 <= len(buf) and sniff_image(bytes(buf[:16])) is None:
+            raise ImageRejected("format non pris en charge ou pas une image (octets magiques)")
+        if dimensions is None and len(buf) >= 16:
+            dimensions = probe_dimensions(bytes(buf[:PROBE_MAX_BYTES]))
+            if dimensions is not None and dimensions[0] * dimensions[1] > max_pixels:
+                raise ImageRejected(f"image de {dimensions[0]}x{dimensions[1]} pixels")
+            if dimensions is None and len(buf) >= PROBE_MAX_BYTES:
+                raise ImageRejected("en-tête d'image illisible")
+    if len(buf) < 16 or sniff_image(bytes(buf[:16])) is None:
+        raise ImageRejected("format non pris en charge ou pas une image (octets magiques)")
+    if dimensions is None and probe_dimensions(bytes(buf)) is None:
+        raise ImageRejected("en-tête d'image illisible")
+    return bytes(buf)
+
+
+def _blocs(r):
+    """Blocs du corps dès leur arrivée (read1 d'urllib3 2) : un serveur qui envoie
+    goutte à goutte ne bloque pas la vérification de la durée."""
+    raw = r.raw
+    if not hasattr(raw, "read1"):
+        yield from r.iter_content(CHUNK_BYTES)
+        return
+    while True:
+        bloc = raw.read1(CHUNK_BYTES, decode_content=True)
+        if not bloc:
+            return
+        yield bloc
+
+
+def download_image(session, url, timeout=4, headers=None, max_bytes=WEB_IMAGE_MAX_BYTES,
+                   max_pixels=WEB_IMAGE_MAX_PIXELS, max_seconds=None):
+    """GET `url` en flux avec les validations du module ; ne lève pas d'exception.
+
+    `session` : requests.Session ou le module `requests`. `max_seconds` :
+    durée maximale du corps (par défaut 3 x `timeout`). Les statuts autres
+    que 200 (ex. 304 d'une revalidation) sont retournés sans corps.
+    """
+    if max_seconds is None:
+        max_seconds = 3 * timeout
+    try:
+        r = session.get(url, timeout=timeout, headers=headers or {}, stream=True)
+    except Exception as e:
+        return Download(None, None, {}, f"{type(e).__name__}")
+    try:
+        if r.status_code != 200:
+            return Download(r.status_code, None, r.headers, None)
+        check_headers(r.headers, max_bytes)
+        data = read_image_body(_blocs(r), max_bytes, max_pixels, max_seconds)
+        return Download(200, data, r.headers, None)
+    except ImageRejected as e:
+        profiling.count("web.rejected")
+        print(f"Image web refusée ({e}) : {url[:120]}")
+        return Download(r.status_code, None, r.headers, str(e))
+    except Exception as e:
+        return Download(r.status_code, None, r.headers, f"{type(e).__name__}")
+    finally:
+        # Libère la connexion sans lire le reste d'un corps refusé
+        r.close()